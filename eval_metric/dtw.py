@@ -0,0 +1,111 @@
+import math
+import numpy as np
+
+
+def euclidean_cost(a, b):
+    """逐点欧氏距离矩阵: a (B, n, d), b (B, m, d) -> (B, n, m)"""
+    diff = a[:, :, None, :] - b[:, None, :, :]
+    return np.sqrt(np.sum(diff * diff, axis=-1))
+
+
+def angle_cost(a, b):
+    """逐点角度差矩阵 (考虑圆周性): a (B, n), b (B, m) -> (B, n, m)"""
+    diff = np.abs(a[:, :, None] - b[:, None, :])
+    return np.minimum(diff, 2 * math.pi - diff)
+
+
+COSTS = {
+    "euclidean": euclidean_cost,
+    "angle": angle_cost,
+}
+
+
+def _pad(seqs, dims):
+    """不等长序列补齐为一个数组, 返回 (数组, 各序列长度)"""
+    lengths = np.array([len(seq) for seq in seqs])
+    shape = (len(seqs), lengths.max()) + ((dims,) if dims else ())
+    padded = np.zeros(shape, dtype=np.float64)
+    for i, seq in enumerate(seqs):
+        padded[i, :len(seq)] = seq
+    return padded, lengths
+
+
+def dtw_distances(seqs_a, seqs_b, cost="euclidean"):
+    """精确DTW距离, 一次处理多对序列
+
+    按反对角线推进: 同一条反对角线上的格子互不依赖, 每条反对角线对所有序列对做一次向量运算.
+    补齐部分只出现在各序列对终点之后, 不影响结果; 计算顺序固定, 结果可逐位复现.
+    """
+    dims = 0 if cost == "angle" else np.asarray(seqs_a[0]).shape[-1]
+    a, len_a = _pad(seqs_a, dims)
+    b, len_b = _pad(seqs_b, dims)
+    costs = COSTS[cost](a, b)
+
+    # 代价对称, 转置不改变结果; 让行数为较短的一边, 每条反对角线的数组更短
+    if costs.shape[1] > costs.shape[2]:
+        costs = costs.transpose(0, 2, 1)
+        len_a, len_b = len_b, len_a
+
+    num_pairs, n, m = costs.shape
+    # 按反对角线存储: skewed[k, :, i] 为格子 (i, k-i) 的代价 (行列从1开始), 其余为inf
+    # 第k条反对角线上 (i-1, j), (i, j-1) 在第k-1条上, (i-1, j-1) 在第k-2条上, 都只需切片
+    rows, cols = np.meshgrid(np.arange(1, n + 1), np.arange(1, m + 1), indexing='ij')
+    skewed = np.full((n + m + 1, num_pairs, n + 1), np.inf)
+    skewed[rows + cols, :, rows] = np.moveaxis(costs, 0, -1)
+
+    ends = len_a + len_b
+    distances = np.empty(num_pairs)
+    prev2 = np.full((num_pairs, n + 1), np.inf)
+    prev2[:, 0] = 0.0
+    prev1 = np.full((num_pairs, n + 1), np.inf)
+    for k in range(2, n + m + 1):
+        current = np.full((num_pairs, n + 1), np.inf)
+        best = np.minimum(np.minimum(prev1[:, :-1], prev1[:, 1:]), prev2[:, :-1])
+        current[:, 1:] = skewed[k, :, 1:] + best
+        done = np.flatnonzero(ends == k)
+        if len(done):
+            distances[done] = current[done, len_a[done]]
+        prev2, prev1 = prev1, current
+    return distances
+
+
+def path_lengths(seqs, cost="euclidean"):
+    """序列中相邻点距离之和 (参考路径长度L), 所有序列补齐后一次计算
+
+    沿序列按顺序累加, 取各序列终点处的累加值; 结果与补齐长度无关, 单独计算和成批计算逐位相同.
+    """
+    dims = 0 if cost == "angle" else np.asarray(seqs[0]).shape[-1]
+    padded, lengths = _pad(seqs, dims)
+    if padded.shape[1] < 2:
+        return np.zeros(len(seqs))
+    if cost == "angle":
+        diff = np.abs(np.diff(padded, axis=1))
+        steps = np.minimum(diff, 2 * math.pi - diff)
+    else:
+        steps = np.sqrt(np.sum(np.diff(padded, axis=1) ** 2, axis=-1))
+    totals = np.cumsum(steps, axis=1)
+    return np.where(lengths >= 2, totals[np.arange(len(seqs)), np.maximum(lengths - 2, 0)], 0.0)
+
+
+def ndtw_batch(seqs_a, seqs_b, alpha=1, cost="euclidean"):
+    """多对序列的nDTW = exp(-DTW / (alpha * L)), L 为参考序列 (seqs_b) 的路径长度
+
+    返回 (nDTW数组, L数组); 与原 calculate_ndtw 一致, L 最小取1e-5, 空序列的nDTW和L为0
+    """
+    values = np.zeros(len(seqs_a))
+    lengths = np.zeros(len(seqs_a))
+    valid = [i for i in range(len(seqs_a)) if len(seqs_a[i]) and len(seqs_b[i])]
+    if not valid:
+        return values, lengths
+
+    distances = dtw_distances([seqs_a[i] for i in valid], [seqs_b[i] for i in valid], cost)
+    valid_lengths = path_lengths([seqs_b[i] for i in valid], cost)
+    values[valid] = np.exp(-distances / (alpha * np.maximum(valid_lengths, 1e-5)))
+    lengths[valid] = np.maximum(valid_lengths, 1e-5)
+    return values, lengths
+
+
+def ndtw(seq_a, seq_b, alpha=1, cost="euclidean"):
+    """单对序列的nDTW, 返回 (nDTW值, 参考路径长度L)"""
+    values, lengths = ndtw_batch([seq_a], [seq_b], alpha, cost)
+    return float(values[0]), float(lengths[0])
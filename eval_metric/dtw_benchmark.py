@@ -0,0 +1,91 @@
+import math
+import time
+import numpy as np
+import vla_metric
+from dtw import dtw_distances, ndtw, ndtw_batch
+
+# 配置
+NUM_PAIRS = 300
+PRED_LENGTH = 15  # 与 vla_metric 中截取的预测轨迹长度一致
+GT_LENGTHS = (40, 160)  # gt 轨迹长度范围
+NUM_CHECK = 20  # 与逐格Python实现对比的序列对数
+SEED = 0
+
+
+def random_walk(rng, length):
+    """随机游走轨迹 [x, y, z, yaw]"""
+    steps = rng.normal(scale=[0.3, 0.05, 0.3, 0.2], size=(length, 4))
+    trajectory = np.cumsum(steps, axis=0)
+    trajectory[:, 3] = (trajectory[:, 3] + math.pi) % (2 * math.pi) - math.pi
+    return trajectory
+
+
+def reference_dtw(a, b, dist):
+    """逐格计算的精确DTW, 用于检查向量化实现"""
+    n, m = len(a), len(b)
+    acc = np.full((n + 1, m + 1), np.inf)
+    acc[0, 0] = 0.0
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            acc[i, j] = dist(a[i - 1], b[j - 1]) + min(acc[i - 1, j], acc[i, j - 1], acc[i - 1, j - 1])
+    return acc[n, m]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    rng = np.random.default_rng(SEED)
+    pairs = [(random_walk(rng, PRED_LENGTH), random_walk(rng, int(rng.integers(*GT_LENGTHS))))
+             for _ in range(NUM_PAIRS)]
+    pred_positions = [pred[:, :3] for pred, _ in pairs]
+    gt_positions = [gt[:, :3] for _, gt in pairs]
+    pred_angles = [pred[:, 3] for pred, _ in pairs]
+    gt_angles = [gt[:, 3] for _, gt in pairs]
+
+    # 原实现: fastdtw + Python回调
+    vla_metric.EXACT_DTW = False
+    fast, fast_time = timed(lambda: [
+        (vla_metric.calculate_ndtw(pa.tolist(), ga.tolist())[0],
+         vla_metric.calculate_ndtw(pb.tolist(), gb.tolist(), is_angle=True)[0])
+        for pa, ga, pb, gb in zip(pred_positions, gt_positions, pred_angles, gt_angles)])
+    fast = np.array(fast)
+
+    # 精确DTW: 逐对调用 (metric脚本中的用法) 与一次处理所有序列对
+    single, single_time = timed(lambda: [
+        (ndtw(pa, ga, vla_metric.ALPHA)[0], ndtw(pb, gb, vla_metric.ALPHA, "angle")[0])
+        for pa, ga, pb, gb in zip(pred_positions, gt_positions, pred_angles, gt_angles)])
+    single = np.array(single)
+
+    def run_batch():
+        positions, _ = ndtw_batch(pred_positions, gt_positions, vla_metric.ALPHA)
+        angles, _ = ndtw_batch(pred_angles, gt_angles, vla_metric.ALPHA, "angle")
+        return np.column_stack([positions, angles])
+    batch, batch_time = timed(run_batch)
+
+    # 正确性: 与逐格实现一致, 逐对与批量结果逐位相同, 重复运行结果逐位相同
+    euclidean = lambda x, y: math.sqrt(sum((xi - yi) ** 2 for xi, yi in zip(x, y)))
+    angle = lambda x, y: min(abs(x - y), 2 * math.pi - abs(x - y))
+    expected = np.array([reference_dtw(pred_positions[i], gt_positions[i], euclidean) for i in range(NUM_CHECK)])
+    exact = dtw_distances(pred_positions[:NUM_CHECK], gt_positions[:NUM_CHECK])
+    expected_ang = np.array([reference_dtw(pred_angles[i], gt_angles[i], angle) for i in range(NUM_CHECK)])
+    exact_ang = dtw_distances(pred_angles[:NUM_CHECK], gt_angles[:NUM_CHECK], "angle")
+
+    print(f"{NUM_PAIRS} 对轨迹 (预测 {PRED_LENGTH} 点, gt {GT_LENGTHS[0]}-{GT_LENGTHS[1]} 点), 位置 + 角度 nDTW")
+    print(f"{'method':<24} {'total_s':>9} {'ms/pair':>9} {'speedup':>8}")
+    for name, elapsed in [("fastdtw (原实现)", fast_time), ("exact, per pair", single_time),
+                          ("exact, batched", batch_time)]:
+        print(f"{name:<24} {elapsed:9.3f} {elapsed / NUM_PAIRS * 1000:9.3f} {fast_time / elapsed:7.1f}x")
+
+    print(f"\n与逐格实现的最大误差: 位置 {np.abs(exact - expected).max():.2e}, 角度 {np.abs(exact_ang - expected_ang).max():.2e}")
+    print(f"逐对与批量结果逐位相同: {np.array_equal(single, batch)}")
+    print(f"重复运行结果逐位相同: {np.array_equal(batch, run_batch())}")
+    print(f"fastdtw 与精确nDTW的差异: 最大 {np.abs(fast - batch).max():.4f}, "
+          f"平均 {np.abs(fast - batch).mean():.4f}, 不同的比例 {np.mean(~np.isclose(fast, batch)):.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import resource
+import multiprocessing
+import numpy as np
+
+# 配置
+# 用法: python metric_benchmark.py [episode数, 逗号分隔, 如 1000,10000,100000]
+EPISODE_COUNTS = [1000, 10000]
+BENCHMARK_DIR = "metric_benchmark_data"  # 合成数据集目录, 结束后删除
+EPISODES_PER_TRAJECTORY = 10  # 共用一个 posture.json 的episode数
+VLA_POINTS = 13  # 预测轨迹点数 (起点 + MAX_INFERENCE_STEPS 步)
+VLA_POSTURE_LENGTHS = (200, 400)  # posture.json 帧数范围
+VLA_GT_LENGTHS = (40, 160)  # vla_ins source 范围的帧数
+VLN_POINTS = 61
+VLN_GT_LENGTHS = (200, 600)  # VLN 的gt为整条轨迹
+NOISE = 0.1  # 预测位置噪声 (米), 角度噪声为其一半 (弧度)
+STOP_FRACTION = 0.5  # 预测轨迹中途开始原地悬停的episode比例
+STOP_JITTER = 0.01  # 悬停时的抖动, 小于停止判断阈值
+MAX_STEPS_FRACTION = 0.1  # VLN中 termination_reason 为 max_steps (不计入指标) 的比例
+NUM_CHECK = 200  # 逐个串行处理 (当前实现) 作为参考结果的episode数
+NDTW_LENGTHS = {"vla": (15, [40, 80, 160]), "vln": (60, [100, 200, 400, 800])}  # calculate_ndtw 计时: (预测长度, gt长度)
+NDTW_CALLS = 50
+SEED = 0
+
+# gt缓存默认值在导入 metric_runner 时确定, 需先设置
+os.environ.setdefault("UAV_EVAL_GT_CACHE", os.path.join(BENCHMARK_DIR, "gt_cache"))
+
+import metric_runner
+import vla_metric
+import vln_metric
+from metric_runner import list_trajectory_files, run_batches
+from trajectory_store import TrajectoryWriter, load_run, episode_file_name
+
+TASK_MODULES = {"vla": vla_metric, "vln": vln_metric}
+
+
+def random_walk(rng, length):
+    """gt位姿 [x, y, z, yaw(度)], 格式与 posture.json 相同; 水平方向有固定速度, 相邻采样点不会误判为停止"""
+    steps = rng.normal(loc=[0.1, 0.0, 0.1, 0.0], scale=[0.1, 0.01, 0.1, 3.0], size=(length, 4))
+    poses = np.cumsum(steps, axis=0)
+    poses[:, 3] = (poses[:, 3] + 180) % 360 - 180
+    return np.round(poses, 4)
+
+
+def predicted_trajectory(rng, gt, num_points, noise=NOISE, stop=False):
+    """沿gt (角度为度) 均匀取 num_points 个点并加噪声, 角度转为弧度; stop 时从中途某点开始原地悬停"""
+    pred = gt[np.linspace(0, len(gt) - 1, num_points).round().astype(int)].copy()
+    pred[:, 3] = np.radians(pred[:, 3])
+    pred += rng.normal(scale=[noise, noise / 10, noise, noise / 2], size=pred.shape)
+    if stop:
+        k = int(rng.integers(2, num_points - 1))
+        pred[k + 1:] = pred[k] + rng.normal(scale=STOP_JITTER, size=pred[k + 1:].shape)
+    pred[:, 3] = (pred[:, 3] + math.pi) % (2 * math.pi) - math.pi
+    return pred
+
+
+def write_dataset(root, task, num_episodes, rng):
+    """生成合成数据集: posture.json, vla_ins (VLA), 每个episode的json轨迹文件和同样内容的列式存储
+
+    返回 {episode_key: 是否悬停}
+    """
+    posture_base = os.path.join(root, "without_screenshot")
+    vla_ins_base = os.path.join(root, "vla_ins")
+    trajectories_dir = os.path.join(root, "trajectories")
+    os.makedirs(trajectories_dir, exist_ok=True)
+    writer = TrajectoryWriter(trajectories_dir, resume=False)
+
+    stops = {}
+    for t in range(0, num_episodes, EPISODES_PER_TRAJECTORY):
+        traj_dir = f"synth_{t % 7}/scene_{t // 70 % 100}/traj_{t}"
+        lengths = VLA_POSTURE_LENGTHS if task == "vla" else VLN_GT_LENGTHS
+        posture = random_walk(rng, int(rng.integers(*lengths)))
+        os.makedirs(os.path.join(posture_base, traj_dir))
+        with open(os.path.join(posture_base, traj_dir, "posture.json"), 'w') as f:
+            json.dump(posture.tolist(), f)
+        if task == "vla":
+            os.makedirs(os.path.join(vla_ins_base, traj_dir))
+
+        for j in range(1, min(EPISODES_PER_TRAJECTORY, num_episodes - t) + 1):
+            stop = bool(rng.random() < STOP_FRACTION)
+            trajectory_data = {"success": False, "steps": 0, "model_calls": 0}
+            if task == "vla":
+                episode_key = f"/{traj_dir}/vla_ins_{j}.json"
+                length = int(rng.integers(*VLA_GT_LENGTHS))
+                start = int(rng.integers(0, len(posture) - length))
+                with open(os.path.join(vla_ins_base, traj_dir, f"vla_ins_{j}.json"), 'w', encoding='gbk') as f:
+                    json.dump({"instruction": "synthetic", "source": [start + 1, start + length]}, f)
+                pred = predicted_trajectory(rng, posture[start:start + length], VLA_POINTS, stop=stop)
+                reason = "max_steps"
+            else:
+                episode_key = f"/{traj_dir}/instruction_{j}.json"
+                pred = predicted_trajectory(rng, posture, VLN_POINTS, stop=stop)
+                reason = "max_steps" if rng.random() < MAX_STEPS_FRACTION else "no_more_instructions"
+                trajectory_data["termination_reason"] = reason
+
+            trajectory_data.update(episode_key=episode_key, steps=len(pred) - 1, model_calls=len(pred) - 1,
+                                   trajectory=pred.tolist())
+            with open(os.path.join(trajectories_dir, episode_file_name(episode_key)), 'w') as f:
+                json.dump(trajectory_data, f, indent=2)
+            writer.append(episode_key, pred, False, len(pred) - 1, len(pred) - 1, reason)
+            stops[episode_key] = stop
+
+    writer.close()
+    return stops
+
+
+def measure(fn):
+    """在fork出的子进程中运行 fn, 返回 (结果, 耗时, 峰值内存增量MB, 工作进程峰值内存MB)
+
+    子进程从父进程的内存状态开始, 峰值内存增量为 fn 运行期间的最大RSS减去开始时的RSS.
+    """
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+
+    def target():
+        base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base
+        workers = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        sender.send((result, elapsed, peak / 1024, workers / 1024))
+
+    process = context.Process(target=target)
+    process.start()
+    output = receiver.recv()
+    process.join()
+    return output
+
+
+def by_episode(results):
+    return {(result.get("episode") or result.get("episode_key")): result for result in results if result}
+
+
+def compare(reference, results):
+    """与参考结果比较 (只比较参考结果中的episode): (缺少的episode数, 浮点字段最大差异, 非浮点字段不同的个数)"""
+    missing, max_diff, mismatches = 0, 0.0, 0
+    for episode_key, expected in reference.items():
+        actual = results.get(episode_key)
+        if actual is None:
+            missing += 1
+            continue
+        for name, value in expected.items():
+            if isinstance(value, float) and isinstance(actual[name], float):
+                max_diff = max(max_diff, abs(value - actual[name]))
+            elif value != actual[name]:
+                mismatches += 1
+    return missing, max_diff, mismatches
+
+
+def benchmark_ndtw(task, rng):
+    """calculate_ndtw 单次调用耗时 (毫秒) 随gt长度的变化, 精确DTW与fastdtw"""
+    module = TASK_MODULES[task]
+    pred_length, gt_lengths = NDTW_LENGTHS[task]
+    rows = []
+    for gt_length in gt_lengths:
+        pairs = [(random_walk(rng, pred_length)[:, :3].tolist(), random_walk(rng, gt_length)[:, :3].tolist())
+                 for _ in range(NDTW_CALLS)]
+        timings = []
+        for exact in (True, False):
+            module.EXACT_DTW = exact
+            start = time.perf_counter()
+            for pred, gt in pairs:
+                module.calculate_ndtw(pred, gt)
+            timings.append((time.perf_counter() - start) / NDTW_CALLS * 1000)
+        module.EXACT_DTW = True
+        rows.append((pred_length, gt_length, *timings))
+    return rows
+
+
+def benchmark_task(task, num_episodes, rng):
+    module = TASK_MODULES[task]
+    root = os.path.join(BENCHMARK_DIR, f"{task}_{num_episodes}")
+    shutil.rmtree(root, ignore_errors=True)
+
+    start = time.perf_counter()
+    stops = write_dataset(root, task, num_episodes, rng)
+    generate_time = time.perf_counter() - start
+    module.POSTURE_BASE = os.path.abspath(os.path.join(root, "without_screenshot"))
+    if task == "vla":
+        module.VLA_INS_BASE = os.path.abspath(os.path.join(root, "vla_ins"))
+
+    trajectories_dir = os.path.join(root, "trajectories")
+    files = list_trajectory_files(trajectories_dir)
+
+    def run_npz():
+        run = load_run(trajectories_dir)
+        mask = run["termination_reason"] == "no_more_instructions" if task == "vln" else None
+        return run_batches(module.process_trajectories, run.episodes(mask))
+
+    # 参考结果: 当前实现逐个串行处理json轨迹文件 (不使用gt缓存)
+    shutil.rmtree(metric_runner.GT_CACHE_DIR, ignore_errors=True)
+    check_files = files[:NUM_CHECK]
+    reference, reference_time, _, _ = measure(lambda: [module.process_episode(f) for f in check_files])
+    reference = by_episode(reference)
+
+    configs = [
+        ("json, cold gt cache", lambda: run_batches(module.process_episodes, files)),
+        ("json, warm gt cache", lambda: run_batches(module.process_episodes, files)),
+        ("npz, warm gt cache", run_npz),
+    ]
+    shutil.rmtree(metric_runner.GT_CACHE_DIR, ignore_errors=True)
+
+    print(f"\n== {task.upper()}: {num_episodes} 个episode, {len(files)} 个轨迹文件, "
+          f"{metric_runner.NUM_WORKERS} 个工作进程 (生成数据 {generate_time:.1f}s) ==")
+    print(f"{'pipeline':<22} {'total_s':>8} {'episodes/s':>11} {'ms/episode':>11} {'peak_MB':>8} {'workers_MB':>11}"
+          f" {'max_diff':>9} {'mismatch':>9}")
+    print(f"{'reference (serial)':<22} {reference_time:8.2f} {len(check_files) / reference_time:11.1f} "
+          f"{reference_time / len(check_files) * 1000:11.3f} {'':>8} {'':>11} {'':>9} {'':>9}")
+
+    results = None
+    for name, fn in configs:
+        results, elapsed, peak, workers = measure(fn)
+        results = by_episode(results)
+        missing, max_diff, mismatches = compare(reference, results)
+        print(f"{name:<22} {elapsed:8.2f} {len(results) / elapsed:11.1f} {elapsed / max(len(results), 1) * 1000:11.3f} "
+              f"{peak:8.1f} {workers:11.1f} {max_diff:9.2e} {mismatches + missing:9d}")
+
+    # 生成时已知的悬停: VLA 检测到停止的episode才有nDTW
+    if task == "vla":
+        stopped = np.array([stops['/' + key] for key in results])
+        detected = np.array([result["nDTW"] is not None for result in results.values()])
+        print(f"检测到停止: 悬停episode {detected[stopped].mean():.1%}, 未悬停episode {detected[~stopped].mean():.1%}")
+    values = {name: np.mean([float(result[name]) for result in results.values() if result[name] is not None])
+              for name in next(iter(results.values())) if name not in ("episode", "episode_key")}
+    print("指标均值: " + ", ".join(f"{name}={value:.4f}" for name, value in values.items()))
+
+    shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    counts = [int(count) for count in sys.argv[1].split(',')] if len(sys.argv) > 1 else EPISODE_COUNTS
+    rng = np.random.default_rng(SEED)
+
+    print("calculate_ndtw 单次调用耗时 (毫秒)")
+    print(f"{'task':<6} {'pred':>5} {'gt':>5} {'exact_ms':>9} {'fastdtw_ms':>11}")
+    for task in TASK_MODULES:
+        for pred_length, gt_length, exact_ms, fast_ms in benchmark_ndtw(task, rng):
+            print(f"{task:<6} {pred_length:5d} {gt_length:5d} {exact_ms:9.3f} {fast_ms:11.3f}")
+
+    for num_episodes in counts:
+        for task in TASK_MODULES:
+            benchmark_task(task, num_episodes, rng)
+    shutil.rmtree(BENCHMARK_DIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import os
+import hashlib
+import multiprocessing
+import numpy as np
+
+# 配置
+GT_CACHE_DIR = os.environ.get("UAV_EVAL_GT_CACHE", ".gt_cache")  # gt序列的磁盘缓存目录, 为空时不缓存
+NUM_WORKERS = int(os.environ.get("UAV_EVAL_METRIC_WORKERS", "0")) or os.cpu_count()
+CHUNK_SIZE = 16  # 每次分给工作进程的一批episode数
+SKIP_FILES = {"final_results.json"}  # 控制器写在轨迹目录中的汇总文件, 不是episode
+
+
+def file_mtimes(paths):
+    """各文件的mtime (纳秒), 文件不存在时为-1"""
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            mtimes.append(-1)
+    return np.array(mtimes, dtype=np.int64)
+
+
+def cached_ground_truth(key, source_paths, loader, cache_dir=GT_CACHE_DIR):
+    """读取gt序列 (N x 4, 角度为弧度), 结果缓存在磁盘上
+
+    缓存中记录 source_paths 的mtime, 任一源文件变化时调用 loader 重新读取.
+    """
+    if not cache_dir:
+        return np.asarray(loader(), dtype=np.float64)
+
+    mtimes = file_mtimes(source_paths)
+    cache_file = os.path.join(cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + ".npz")
+    try:
+        with np.load(cache_file) as cached:
+            if np.array_equal(cached["mtimes"], mtimes):
+                return cached["gt"]
+    except (OSError, KeyError, ValueError):
+        pass
+
+    gt = np.asarray(loader(), dtype=np.float64)
+    # 多个工作进程可能同时写同一个文件, 各自写临时文件再重命名
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, 'wb') as f:
+        np.savez(f, gt=gt, mtimes=mtimes)
+    os.replace(tmp_file, cache_file)
+    return gt
+
+
+def list_trajectory_files(trajectories_dir):
+    """目录下的所有轨迹文件 (跳过 SKIP_FILES), 按文件名排序, 结果顺序与运行环境无关"""
+    return [os.path.join(trajectories_dir, filename)
+            for filename in sorted(os.listdir(trajectories_dir))
+            if filename.endswith(".json") and filename not in SKIP_FILES]
+
+
+def run_batches(process_batch, items, num_workers=NUM_WORKERS, batch_size=CHUNK_SIZE):
+    """按 batch_size 分批, 用进程池处理所有轨迹, 结果按 items 的顺序返回 (处理失败的为None)
+
+    process_batch 接收一批 items, 返回等长的结果列表, 可以对整批做一次向量计算 (如nDTW).
+    """
+    batches = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+    if num_workers <= 1 or len(batches) <= 1:
+        batch_results = [process_batch(batch) for batch in batches]
+    else:
+        with multiprocessing.Pool(min(num_workers, len(batches))) as pool:
+            batch_results = pool.map(process_batch, batches)
+    return [result for results in batch_results for result in results]
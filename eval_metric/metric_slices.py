@@ -0,0 +1,187 @@
+import sys
+import csv
+import json
+import numpy as np
+
+# 配置
+# 用法: python metric_slices.py <evaluation_results.json> [测试集json] [对比的evaluation_results.json]
+NUM_RESAMPLES = 5000  # bootstrap重采样次数
+CONFIDENCE = 0.95
+SEED = 0
+MAX_BOOTSTRAP_ELEMENTS = 20_000_000  # 单次重采样数组的元素数上限, 超出时分块计算
+METRIC_COLUMNS = ["success", "SR", "OSR", "NE", "nDTW"]  # 结果中存在的指标都参与统计
+FACETS = ["all", "dataset", "group", "scene", "difficulty", "action_type"]
+SLICES_FILE = "metric_slices.csv"
+EPISODE_TABLE_FILE = "episode_table.csv"
+
+
+def normalize_key(episode_key):
+    return episode_key.strip('/')
+
+
+def load_table(results_file, test_file=None):
+    """evaluation_results_*.json (可选配合测试集json) -> 按列存储的episode表
+
+    episode键中的数据集组和场景拆成列; 测试集中的 difficulty / action_type 作为列
+    (action_type 为列表, 一个episode可以属于多个动作类型). 缺失的指标为NaN.
+    """
+    with open(results_file, 'r') as f:
+        rows = json.load(f)["per_episode_results"]
+
+    attributes = {}
+    if test_file:
+        with open(test_file, 'r') as f:
+            attributes = {normalize_key(key): value for key, value in json.load(f).items()}
+
+    episodes = [normalize_key(row.get("episode") or row.get("episode_key")) for row in rows]
+    groups = [episode.split('/')[0] for episode in episodes]
+    table = {
+        "episode": np.array(episodes, dtype=object),
+        "dataset": np.array([group.split('_')[0] for group in groups], dtype=object),
+        "group": np.array(groups, dtype=object),
+        "scene": np.array(['/'.join(episode.split('/')[:2]) for episode in episodes], dtype=object),
+    }
+
+    # 只有VLA测试集中的值是包含 difficulty / action_type 的字典
+    if any(isinstance(value, dict) for value in attributes.values()):
+        info = [attributes.get(episode) or {} for episode in episodes]
+        table["difficulty"] = np.array([item.get("difficulty", "unknown") for item in info], dtype=object)
+        # 元素为元组的一维object数组, 不能直接 np.array(列表)
+        table["action_type"] = np.empty(len(episodes), dtype=object)
+        table["action_type"][:] = [tuple(item.get("action_type", [])) for item in info]
+
+    for metric in METRIC_COLUMNS:
+        if any(metric in row for row in rows):
+            table[metric] = np.array([np.nan if row.get(metric) is None else float(row[metric]) for row in rows])
+    return table
+
+
+def metric_names(table):
+    return [metric for metric in METRIC_COLUMNS if metric in table]
+
+
+def facet_masks(table, facet):
+    """facet 的每个取值 -> 属于该取值的episode掩码"""
+    if facet == "all":
+        return {"all": np.ones(len(table["episode"]), dtype=bool)}
+    if facet not in table:
+        return {}
+
+    column = table[facet]
+    if facet == "action_type":
+        values = sorted({action for actions in column for action in actions})
+        return {value: np.array([value in actions for actions in column]) for value in values}
+    return {value: column == value for value in sorted(set(column))}
+
+
+def bootstrap_means(values, rng, num_resamples=NUM_RESAMPLES):
+    """重采样均值 (num_resamples,), 每块重采样是一次数组运算"""
+    n = len(values)
+    block = max(1, MAX_BOOTSTRAP_ELEMENTS // n)
+    means = []
+    for start in range(0, num_resamples, block):
+        size = min(block, num_resamples - start)
+        indices = rng.integers(0, n, size=(size, n))
+        means.append(values[indices].mean(axis=1))
+    return np.concatenate(means)
+
+
+def confidence_interval(resampled, confidence=CONFIDENCE):
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(resampled, [tail, 100 - tail])
+    return float(low), float(high)
+
+
+def slice_metrics(table, rng):
+    """每个 facet 取值上的各指标均值和bootstrap置信区间"""
+    rows = []
+    for facet in FACETS:
+        for value, mask in facet_masks(table, facet).items():
+            for metric in metric_names(table):
+                values = table[metric][mask]
+                values = values[~np.isnan(values)]
+                if len(values) == 0:
+                    continue
+                low, high = confidence_interval(bootstrap_means(values, rng))
+                rows.append({"facet": facet, "value": value, "metric": metric, "n": len(values),
+                             "mean": float(values.mean()), "ci_low": low, "ci_high": high})
+    return rows
+
+
+def compare_metrics(table, baseline, rng):
+    """两个结果在共同episode上的差异 (table - baseline), 配对bootstrap: 两边使用相同的重采样下标"""
+    baseline_index = {episode: i for i, episode in enumerate(baseline["episode"])}
+    common = np.array([episode in baseline_index for episode in table["episode"]])
+    matched = np.array([baseline_index.get(episode, -1) for episode in table["episode"]])
+
+    rows = []
+    for facet in FACETS:
+        for value, mask in facet_masks(table, facet).items():
+            for metric in metric_names(table):
+                if metric not in baseline:
+                    continue
+                selected = mask & common
+                current = table[metric][selected]
+                previous = baseline[metric][matched[selected]]
+                valid = ~np.isnan(current) & ~np.isnan(previous)
+                if not valid.any():
+                    continue
+                low, high = confidence_interval(bootstrap_means(current[valid] - previous[valid], rng))
+                rows.append({"facet": facet, "value": value, "metric": metric, "n": int(valid.sum()),
+                             "mean": float(current[valid].mean()), "baseline": float(previous[valid].mean()),
+                             "diff": float((current[valid] - previous[valid]).mean()),
+                             "ci_low": low, "ci_high": high})
+    return rows
+
+
+def write_csv(file_path, rows):
+    with open(file_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: round(v, 6) if isinstance(v, float) else v for k, v in row.items()})
+
+
+def write_episode_table(file_path, table):
+    columns = list(table.keys())
+    with open(file_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for i in range(len(table["episode"])):
+            writer.writerow(['|'.join(table[c][i]) if c == "action_type" else table[c][i] for c in columns])
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("用法: python metric_slices.py <evaluation_results.json> [测试集json] [对比的evaluation_results.json]")
+        return
+
+    results_file = sys.argv[1]
+    test_file = sys.argv[2] if len(sys.argv) > 2 and sys.argv[2] else None
+    baseline_file = sys.argv[3] if len(sys.argv) > 3 else None
+    rng = np.random.default_rng(SEED)
+
+    table = load_table(results_file, test_file)
+    write_episode_table(EPISODE_TABLE_FILE, table)
+
+    if baseline_file:
+        rows = compare_metrics(table, load_table(baseline_file, test_file), rng)
+        print(f"{'facet':<12} {'value':<28} {'metric':<8} {'n':>6} {'mean':>8} {'base':>8} {'diff':>8}   {int(CONFIDENCE * 100)}% CI")
+        for row in rows:
+            print(f"{row['facet']:<12} {str(row['value']):<28} {row['metric']:<8} {row['n']:>6} {row['mean']:8.4f} "
+                  f"{row['baseline']:8.4f} {row['diff']:+8.4f}   [{row['ci_low']:+.4f}, {row['ci_high']:+.4f}]")
+    else:
+        rows = slice_metrics(table, rng)
+        print(f"{'facet':<12} {'value':<28} {'metric':<8} {'n':>6} {'mean':>8}   {int(CONFIDENCE * 100)}% CI")
+        for row in rows:
+            print(f"{row['facet']:<12} {str(row['value']):<28} {row['metric']:<8} {row['n']:>6} {row['mean']:8.4f}   "
+                  f"[{row['ci_low']:.4f}, {row['ci_high']:.4f}]")
+
+    if rows:
+        write_csv(SLICES_FILE, rows)
+    print(f"\n按切片统计: {SLICES_FILE}, episode表: {EPISODE_TABLE_FILE} ({len(table['episode'])} 个episode, "
+          f"{NUM_RESAMPLES} 次bootstrap重采样)")
+
+
+if __name__ == "__main__":
+    main()
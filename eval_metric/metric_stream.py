@@ -0,0 +1,151 @@
+import os
+import sys
+import json
+import math
+import time
+import vla_metric
+import vln_metric
+from metric_runner import list_trajectory_files
+
+# 配置
+# 用法: python metric_stream.py [vla|vln] [轨迹目录], 评估运行期间持续统计, Ctrl+C 结束
+TRAJECTORIES_DIR = os.path.join("shared_folder", "trajectories")
+POLL_INTERVAL = 2.0  # 扫描轨迹目录的间隔 (秒)
+# 每个任务的指标 (process_episode 结果中的字段) 及其在汇总中的名称, 与 vla_metric / vln_metric 的 overall_metrics 一致
+TASK_METRICS = {
+    "vla": {"success": "success_rate", "nDTW": "average_nDTW"},
+    "vln": {"NE": "average_NE", "SR": "success_rate", "OSR": "online_success_rate", "nDTW": "average_nDTW"},
+}
+TASK_MODULES = {"vla": vla_metric, "vln": vln_metric}
+
+
+class RunningMetrics:
+    """各指标的运行统计 (个数, 和, 平方和), 加入或撤销一个episode都是O(1)"""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.count = {metric: 0 for metric in metrics}
+        self.sum = {metric: 0.0 for metric in metrics}
+        self.sum_sq = {metric: 0.0 for metric in metrics}
+
+    def add(self, values, sign=1):
+        for metric, value in values.items():
+            self.count[metric] += sign
+            self.sum[metric] += sign * value
+            self.sum_sq[metric] += sign * value * value
+
+    def remove(self, values):
+        self.add(values, sign=-1)
+
+    def summary(self):
+        summary = {}
+        for metric in self.metrics:
+            count = self.count[metric]
+            mean = self.sum[metric] / count if count else 0.0
+            variance = max(self.sum_sq[metric] / count - mean * mean, 0.0) if count else 0.0
+            summary[metric] = {"mean": mean, "std": math.sqrt(variance), "count": count}
+        return summary
+
+
+def episode_values(task, result):
+    """process_episode 结果中参与统计的指标值, 过滤规则与 vla_metric.main / vln_metric.main 相同"""
+    if task == "vla":
+        values = {"success": float(result["success"])}
+        if result["nDTW"] is not None and result["nDTW"] < 1:
+            values["nDTW"] = result["nDTW"]
+        return values
+    return {metric: float(result[metric]) for metric in TASK_METRICS["vln"]}
+
+
+class StreamingMetrics:
+    """按轨迹文件增量统计指标, 同一文件被重写时先撤销旧结果再加入新结果"""
+
+    def __init__(self, task):
+        self.task = task
+        self.process_episode = TASK_MODULES[task].process_episode
+        self.running = RunningMetrics(TASK_METRICS[task])
+        self.contributions = {}  # 文件路径 -> 该文件贡献的指标值 (无结果时为None)
+        self.mtimes = {}  # 文件路径 -> 已处理版本的mtime
+
+    def update(self, trajectory_file):
+        """处理一个新的或被重写的轨迹文件, 返回 process_episode 的结果"""
+        old_values = self.contributions.get(trajectory_file)
+        if old_values:
+            self.running.remove(old_values)
+
+        result = self.process_episode(trajectory_file)
+        values = episode_values(self.task, result) if result else None
+        if values:
+            self.running.add(values)
+        self.contributions[trajectory_file] = values
+        return result
+
+    def poll(self, trajectories_dir):
+        """处理目录中新出现或有变化的轨迹文件, 返回 [(文件, 结果)]"""
+        updates = []
+        for trajectory_file in list_trajectory_files(trajectories_dir):
+            try:
+                mtime = os.stat(trajectory_file).st_mtime_ns
+                if self.mtimes.get(trajectory_file) == mtime:
+                    continue
+                # 文件可能还在写入, 解析失败时下次再处理
+                with open(trajectory_file, 'rb') as f:
+                    json.loads(f.read())
+            except (OSError, ValueError):
+                continue
+
+            self.mtimes[trajectory_file] = mtime
+            updates.append((trajectory_file, self.update(trajectory_file)))
+        return updates
+
+    def summary(self):
+        running = self.running.summary()
+        names = TASK_METRICS[self.task]
+        num_results = sum(1 for values in self.contributions.values() if values)
+        return {
+            "task": self.task,
+            "updated": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "files_seen": len(self.contributions),
+            "overall_metrics": dict({names[metric]: running[metric]["mean"] for metric in names},
+                                    total_episodes=num_results),
+            "running": running,
+        }
+
+
+def write_json(file_path, data):
+    tmp_file = file_path + ".tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_file, file_path)
+
+
+def main():
+    task = sys.argv[1] if len(sys.argv) > 1 else "vla"
+    trajectories_dir = sys.argv[2] if len(sys.argv) > 2 else TRAJECTORIES_DIR
+    summary_file = f"live_metrics_{task}.json"
+    episodes_file = f"live_metrics_{task}_episodes.jsonl"
+
+    print(f"实时统计 {task} 指标: {trajectories_dir} -> {summary_file}")
+    stream = StreamingMetrics(task)
+    try:
+        with open(episodes_file, 'a') as episodes_log:
+            while True:
+                updates = stream.poll(trajectories_dir)
+                if updates:
+                    for trajectory_file, result in updates:
+                        episodes_log.write(json.dumps({"file": os.path.basename(trajectory_file), "result": result}) + "\n")
+                    episodes_log.flush()
+
+                    summary = stream.summary()
+                    write_json(summary_file, summary)
+                    metrics = ", ".join(f"{name}={value:.4f}" for name, value in summary["overall_metrics"].items()
+                                        if name != "total_episodes")
+                    print(f"[{summary['updated']}] {summary['overall_metrics']['total_episodes']} 个episode: {metrics}")
+                time.sleep(POLL_INTERVAL)
+
+    except KeyboardInterrupt:
+        print("实时统计停止")
+
+
+if __name__ == "__main__":
+    main()
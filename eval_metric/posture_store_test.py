@@ -0,0 +1,57 @@
+import json
+import os
+import numpy as np
+import posture_store
+import vla_metric
+
+EPISODE_KEY = "gibson_1/Anaheim/traj_3/vla_ins_1.json"
+
+
+def write_episode(base_dir, num_frames=40, seed=0):
+    """写一条轨迹的 posture.json 和 vla_ins 文件, 位姿带有完整的float64尾数"""
+    rng = np.random.default_rng(seed)
+    poses = np.cumsum(rng.normal(0, 0.3, (num_frames, 4)), axis=0)
+    poses[:, 3] = rng.uniform(-180, 180, num_frames)
+    traj_dir = os.path.join(base_dir, "without_screenshot", os.path.dirname(EPISODE_KEY))
+    vla_ins_dir = os.path.join(base_dir, "vla_ins", os.path.dirname(EPISODE_KEY))
+    os.makedirs(traj_dir)
+    os.makedirs(vla_ins_dir)
+    with open(os.path.join(traj_dir, "posture.json"), 'w') as f:
+        json.dump(poses.tolist(), f)
+    with open(os.path.join(base_dir, "vla_ins", EPISODE_KEY), 'w', encoding='gbk') as f:
+        json.dump({"source": [5, 20]}, f)
+    return os.path.join(traj_dir, "posture.json")
+
+
+def test_store_matches_json(tmp_path):
+    posture_path = write_episode(str(tmp_path))
+    store_dir = str(tmp_path / "store")
+    posture_store.pack_postures(str(tmp_path / "without_screenshot"), store_dir, str(tmp_path / "vla_ins"))
+
+    with open(posture_path, 'r') as f:
+        expected = posture_store.posture_rows(json.load(f))
+    poses = posture_store.PostureStore(store_dir).trajectory_of(posture_path)
+    assert poses.dtype == np.float64
+    assert np.array_equal(poses, expected)
+
+
+def test_metrics_identical_with_store(tmp_path, monkeypatch):
+    """同一个episode从JSON和从位姿存储读取gt, 指标逐位相同"""
+    write_episode(str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(vla_metric, "VLA_INS_BASE", str(tmp_path / "vla_ins"))
+    monkeypatch.setattr(vla_metric, "POSTURE_BASE", str(tmp_path / "without_screenshot"))
+    rng = np.random.default_rng(1)
+    trajectory = np.cumsum(rng.normal(0, 0.3, (12, 4)), axis=0).tolist()
+    trajectory += [trajectory[-1]] * 4  # 最后几步不动, 触发停止条件
+
+    monkeypatch.setattr(posture_store, "_stores", {})
+    from_json = vla_metric.process_trajectory((EPISODE_KEY, trajectory))
+
+    posture_store.pack_postures("without_screenshot", posture_store.POSTURE_STORE, "vla_ins")
+    monkeypatch.setattr(posture_store, "_stores", {})
+    from_store = vla_metric.process_trajectory((EPISODE_KEY, trajectory))
+
+    assert posture_store.open_store() is not None
+    assert from_json["nDTW"] is not None
+    assert from_store == from_json
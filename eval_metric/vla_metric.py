@@ -4,6 +4,10 @@ import math
 import numpy as np
 from scipy.spatial.distance import euclidean
 from fastdtw import fastdtw  # 需要安装fastdtw库：pip install fastdtw
+from posture_store import open_store, load_poses, POSTURE_STORE, INDEX_FILE
+from dtw import ndtw, ndtw_batch
+from metric_runner import cached_ground_truth, list_trajectory_files, run_batches
+from trajectory_store import load_run
 
 # 常量定义
 THRESHOLD_STOP_DIST = 0.15
@@ -11,6 +15,9 @@ THRESHOLD_STOP_ANGLE = math.pi / 12
 THRESHOLD_SUCCESS_DIST = 0.5
 THRESHOLD_SUCCESS_ANGLE = math.pi / 4
 ALPHA = 1  # NDTW参数
+EXACT_DTW = True  # 使用精确DTW (dtw.py), False 时使用原来的 fastdtw 近似
+VLA_INS_BASE = "/data1/liuy/test_pi0/vla_ins"
+POSTURE_BASE = "/data1/liuy/test_pi0/without_screenshot"
 
 
 def angle_difference(a, b):
@@ -30,12 +37,16 @@ def calculate_ndtw(seq_a, seq_b, is_angle=False):
     if len(seq_a) == 0 or len(seq_b) == 0:
         return 0.0, 0.0
 
+    if EXACT_DTW:
+        return ndtw(seq_a, seq_b, ALPHA, "angle" if is_angle else "euclidean")
+
     # 计算累积距离
     distance, _ = fastdtw(
         np.array(seq_a).reshape(-1, 1) if is_angle else np.array(seq_a),
         np.array(seq_b).reshape(-1, 1) if is_angle else np.array(seq_b),
         dist=angle_difference if is_angle else euclidean
     )
+    distance = float(np.squeeze(distance))  # 角度序列逐点距离为单元素数组, 累积距离也是数组
 
     # 计算参考路径长度L
     if is_angle:
@@ -52,46 +63,65 @@ def calculate_ndtw(seq_a, seq_b, is_angle=False):
     return ndtw_value, L
 
 
-def process_episode(trajectory_file):
-    """处理单个episode文件"""
+def load_ground_truth(episode_key):
+    """episode的gt序列: vla_ins 中 source 范围内的位姿 (角度为弧度), 结果缓存在磁盘上"""
+    scene_name, env_name, traj_folder, vla_file = episode_key.split('/')[:4]
+    vla_ins_path = f"{VLA_INS_BASE}/{scene_name}/{env_name}/{traj_folder}/{vla_file}"
+    posture_path = f"{POSTURE_BASE}/{scene_name}/{env_name}/{traj_folder}/posture.json"
+
+    def load():
+        # 获取source (优先从位姿存储中读取, 否则读取vla_ins文件)
+        store = open_store()
+        source = store.source(episode_key) if store is not None else None
+        if source is None:
+            with open(vla_ins_path, 'r', encoding='gbk') as f:
+                vla_data = json.load(f)
+            source = vla_data["source"]
+
+        # 提取gt序列 (0-based索引)
+        start_idx = source[0] - 1
+        end_idx = source[1] - 1
+        return load_poses(posture_path)[start_idx:end_idx + 1]
+
+    return cached_ground_truth(episode_key, [vla_ins_path, posture_path, os.path.join(POSTURE_STORE, INDEX_FILE)], load)
+
+
+def load_episode(trajectory_file):
+    """读取轨迹文件, 返回 (episode_key, 预测轨迹), 出错时返回None"""
     try:
         # 加载轨迹文件
         with open(trajectory_file, 'r', encoding='gbk') as f:
             traj_data = json.load(f)
+        return traj_data["episode_key"], traj_data["trajectory"]
+    except Exception as e:
+        print(f"Error processing {trajectory_file}: {str(e)}")
+        return None
 
-        # 获取episode_key和轨迹
-        episode_key = traj_data["episode_key"].lstrip('/')
-        trajectory = traj_data["trajectory"]
-
-        # 解析路径
-        parts = episode_key.split('/')
-        scene_name = parts[0]
-        env_name = parts[1]
-        traj_folder = parts[2]
-        vla_file = parts[3]
-
-        # 构建vla_ins文件路径
-        vla_ins_path = f"/data1/liuy/test_pi0/vla_ins/{scene_name}/{env_name}/{traj_folder}/{vla_file}"
-        with open(vla_ins_path, 'r', encoding='gbk') as f:
-            vla_data = json.load(f)
-        source = vla_data["source"]
-
-        # 构建posture文件路径
-        posture_path = f"/data1/liuy/test_pi0/without_screenshot/{scene_name}/{env_name}/{traj_folder}/posture.json"
-        with open(posture_path, 'r') as f:
-            posture_data = json.load(f)
 
-        # 提取gt序列 (0-based索引)
-        start_idx = source[0] - 1
-        end_idx = source[1] - 1
-        gt_full_seq = posture_data[start_idx:end_idx + 1]
+def process_episode(trajectory_file):
+    """处理单个episode文件"""
+    return process_episodes([trajectory_file])[0]
+
 
-        # 转换角度为弧度
-        gt_seq = []
-        for point in gt_full_seq:
-            x, y, z, yaw_deg = point
-            yaw_rad = yaw_deg * math.pi / 180.0
-            gt_seq.append([x, y, z, yaw_rad])
+def process_episodes(trajectory_files):
+    """处理一批episode文件, 结果与 trajectory_files 一一对应 (处理失败的为None)"""
+    episodes = [load_episode(trajectory_file) for trajectory_file in trajectory_files]
+    valid = [i for i, episode in enumerate(episodes) if episode is not None]
+    results = [None] * len(episodes)
+    for i, result in zip(valid, process_trajectories([episodes[i] for i in valid])):
+        results[i] = result
+    return results
+
+
+def prepare_trajectory(episode):
+    """单个episode中除nDTW以外的部分: 返回 (结果, 预测序列, gt序列, 是否停止), 出错时返回None"""
+    try:
+        # 获取episode_key和轨迹
+        episode_key = episode[0].lstrip('/')
+        trajectory = episode[1]
+
+        # 加载gt序列 (角度已转换为弧度)
+        gt_seq = load_ground_truth(episode_key).tolist()
 
         # 处理预测轨迹 (跳过第0个点)
         pred_full_seq = trajectory[1:16]  # 取第1到15个点
@@ -128,58 +158,81 @@ def process_episode(trajectory_file):
         success = (final_dist < THRESHOLD_SUCCESS_DIST and
                    final_angle_diff < THRESHOLD_SUCCESS_ANGLE)
 
-        # 准备NDTW计算
-        pred_positions = [p[:3] for p in pred_seq]
-        pred_angles = [p[3] for p in pred_seq]
+        result = {
+            "episode": episode_key,
+            "success": success,
+            "nDTW": None,
+            "final_dist": final_dist,
+            "final_angle_diff": final_angle_diff
+        }
+        return result, pred_seq, gt_seq, stop_index is not None
+    except Exception as e:
+        print(f"Error processing {episode[0]}: {str(e)}")
+        return None
+
+
+def batch_ndtw(pred_seqs, gt_seqs):
+    """多对序列的 (位置nDTW, 位置L, 角度nDTW, 角度L); 精确DTW时所有序列对一次计算"""
+    pred_positions = [[p[:3] for p in seq] for seq in pred_seqs]
+    pred_angles = [[p[3] for p in seq] for seq in pred_seqs]
+    gt_positions = [[p[:3] for p in seq] for seq in gt_seqs]
+    gt_angles = [[p[3] for p in seq] for seq in gt_seqs]
 
-        gt_positions = [p[:3] for p in gt_seq]
-        gt_angles = [p[3] for p in gt_seq]
+    if EXACT_DTW:
+        nDTW_pos, L_pos = ndtw_batch(pred_positions, gt_positions, ALPHA)
+        nDTW_ang, L_ang = ndtw_batch(pred_angles, gt_angles, ALPHA, "angle")
+        return nDTW_pos.tolist(), L_pos.tolist(), nDTW_ang.tolist(), L_ang.tolist()
 
-        # 计算位置NDTW和参考长度
-        nDTW_pos, L_pos = calculate_ndtw(pred_positions, gt_positions)
+    positions = [calculate_ndtw(a, b) for a, b in zip(pred_positions, gt_positions)]
+    angles = [calculate_ndtw(a, b, is_angle=True) for a, b in zip(pred_angles, gt_angles)]
+    return [v for v, _ in positions], [L for _, L in positions], [v for v, _ in angles], [L for _, L in angles]
 
-        # 计算角度NDTW和参考长度
-        nDTW_ang, L_ang = calculate_ndtw(pred_angles, gt_angles, is_angle=True)
 
-        L_pos_adjusted = L_pos / 2.2
+def process_trajectory(episode):
+    """处理单个episode: (episode_key, 预测轨迹)"""
+    return process_trajectories([episode])[0]
+
+
+def process_trajectories(episodes):
+    """处理一批episode [(episode_key, 预测轨迹)], 结果与 episodes 一一对应 (处理失败的为None)
+
+    逐个计算停止点和成功判断后, 检测到停止的episode的nDTW一次批量计算 (未停止的episode不报告nDTW).
+    """
+    prepared = [prepare_trajectory(episode) for episode in episodes]
+    results = [entry[0] if entry is not None else None for entry in prepared]
+    stopped = [i for i, entry in enumerate(prepared) if entry is not None and entry[3]]
+    if not stopped:
+        return results
+
+    try:
+        nDTW_pos, L_pos, nDTW_ang, L_ang = batch_ndtw([prepared[i][1] for i in stopped],
+                                                      [prepared[i][2] for i in stopped])
+    except Exception as e:
+        if len(stopped) > 1:
+            # 逐个重新计算, 只有出错的episode结果为None
+            return [process_trajectory(episode) if i in stopped else results[i] for i, episode in enumerate(episodes)]
+        print(f"Error processing {episodes[stopped[0]][0]}: {str(e)}")
+        return [None if i in stopped else result for i, result in enumerate(results)]
+
+    for j, i in enumerate(stopped):
+        L_pos_adjusted = L_pos[j] / 2.2
 
         # 计算权重 (避免除零错误)
-        total_adjusted = L_pos_adjusted + L_ang
+        total_adjusted = L_pos_adjusted + L_ang[j]
         if total_adjusted > 0:
             weight_pos = L_pos_adjusted / total_adjusted
-            weight_ang = L_ang / total_adjusted
+            weight_ang = L_ang[j] / total_adjusted
         else:
             weight_pos = 0.5
             weight_ang = 0.5
 
         # 计算综合NDTW
-        nDTW_total = weight_pos * nDTW_pos + weight_ang * nDTW_ang
-        if stop_index is not None:
-            return {
-                "episode": episode_key,
-                "success": success,
-                "nDTW": nDTW_total,
-                "final_dist": final_dist,
-                "final_angle_diff": final_angle_diff
-            }
-        else:
-            return {
-                "episode": episode_key,
-                "success": success,
-                "nDTW": None,
-                "final_dist": final_dist,
-                "final_angle_diff": final_angle_diff
-            }
-    except Exception as e:
-        print(f"Error processing {trajectory_file}: {str(e)}")
-        return None
+        results[i]["nDTW"] = weight_pos * nDTW_pos[j] + weight_ang * nDTW_ang[j]
+    return results
 
 
-def main():
-    # 配置路径
-    trajectories_dir = "/data1/liuy/test_pi0/shared_folder/trajectories"
-    output_file = "evaluation_results_openvla.json"
-
+def main(trajectories_dir="/data1/liuy/test_pi0/shared_folder/trajectories",
+         output_file="evaluation_results_openvla.json"):
     # 收集所有结果
     all_results = []
     success_count = 0
@@ -187,26 +240,27 @@ def main():
     ndtw_count = 0
     total_nDTW = 0.0
 
-    # 遍历所有轨迹文件
-    for filename in os.listdir(trajectories_dir):
-        if filename.endswith(".json"):
-            filepath = os.path.join(trajectories_dir, filename)
-            result = process_episode(filepath)
-
-            if result:
-                all_results.append(result)
-                total_count += 1
-                if result["nDTW"] is not None and result["nDTW"]>1:
-                    result["nDTW"] = None
-                if result["nDTW"] is not None and result["nDTW"] < 1:
-                    ndtw_count += 1
-                    total_nDTW += result["nDTW"]
-                    # if result["nDTW"] >1:
-                    #     print(filepath)
-                # total_nDTW += result["nDTW"]
-
-                if result["success"]:
-                    success_count += 1
+    # 并行处理所有episode, 结果按轨迹文件名顺序合并; 有列式存储 (UAV_EVAL_TRAJECTORY_FORMAT=npz) 时一次读入整个运行
+    run = load_run(trajectories_dir)
+    if run is not None:
+        episode_results = run_batches(process_trajectories, run.episodes())
+    else:
+        episode_results = run_batches(process_episodes, list_trajectory_files(trajectories_dir))
+    for result in episode_results:
+        if result:
+            all_results.append(result)
+            total_count += 1
+            if result["nDTW"] is not None and result["nDTW"]>1:
+                result["nDTW"] = None
+            if result["nDTW"] is not None and result["nDTW"] < 1:
+                ndtw_count += 1
+                total_nDTW += result["nDTW"]
+                # if result["nDTW"] >1:
+                #     print(filepath)
+            # total_nDTW += result["nDTW"]
+
+            if result["success"]:
+                success_count += 1
 
     # 计算总体指标
     success_rate = success_count / total_count if total_count > 0 else 0.0
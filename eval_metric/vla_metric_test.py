@@ -0,0 +1,42 @@
+import functools
+import json
+import os
+import numpy as np
+import pytest
+import metric_runner
+import posture_store
+import vla_metric
+
+
+@pytest.mark.parametrize("num_workers", [1, 2])
+def test_main_skips_final_results(tmp_path, monkeypatch, num_workers):
+    """轨迹目录中有控制器写的 final_results.json 时, main 只统计episode文件"""
+    rng = np.random.default_rng(0)
+    trajectories_dir = tmp_path / "trajectories"
+    trajectories_dir.mkdir()
+    for i in range(2):
+        episode_key = f"gibson_1/Anaheim/traj_{i}/vla_ins_1.json"
+        traj_dir = tmp_path / "without_screenshot" / os.path.dirname(episode_key)
+        traj_dir.mkdir(parents=True)
+        (traj_dir / "posture.json").write_text(json.dumps(np.cumsum(rng.normal(0, 0.3, (20, 4)), axis=0).tolist()))
+        vla_ins_file = tmp_path / "vla_ins" / episode_key
+        vla_ins_file.parent.mkdir(parents=True)
+        vla_ins_file.write_text(json.dumps({"source": [1, 10]}))
+        trajectory = np.cumsum(rng.normal(0, 0.3, (16, 4)), axis=0).tolist()
+        (trajectories_dir / f"episode_{i}.json").write_text(
+            json.dumps({"episode_key": episode_key, "trajectory": trajectory}))
+    (trajectories_dir / "final_results.json").write_text(json.dumps([{"episode_key": "x", "success": False}]))
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(posture_store, "_stores", {})
+    monkeypatch.setattr(vla_metric, "VLA_INS_BASE", str(tmp_path / "vla_ins"))
+    monkeypatch.setattr(vla_metric, "POSTURE_BASE", str(tmp_path / "without_screenshot"))
+    monkeypatch.setattr(vla_metric, "run_batches",
+                        functools.partial(metric_runner.run_batches, num_workers=num_workers, batch_size=1))
+    vla_metric.main(str(trajectories_dir), "results.json")
+
+    with open(tmp_path / "results.json") as f:
+        results = json.load(f)
+    assert results["overall_metrics"]["total_episodes"] == 2
+    assert [r["episode"] for r in results["per_episode_results"]] == [
+        "gibson_1/Anaheim/traj_0/vla_ins_1.json", "gibson_1/Anaheim/traj_1/vla_ins_1.json"]
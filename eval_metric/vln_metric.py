@@ -4,11 +4,17 @@ import math
 import numpy as np
 from scipy.spatial.distance import euclidean
 from fastdtw import fastdtw
+from posture_store import load_poses, POSTURE_STORE, INDEX_FILE
+from dtw import ndtw, ndtw_batch
+from metric_runner import cached_ground_truth, list_trajectory_files, run_batches
+from trajectory_store import load_run
 
 # 常量定义
 THRESHOLD_SUCCESS_DIST = 2  # 成功距离阈值 (米)
 THRESHOLD_SUCCESS_ANGLE = math.pi*2   # 成功角度阈值 (弧度)
 ALPHA = 10  # nDTW参数
+EXACT_DTW = True  # 使用精确DTW (dtw.py), False 时使用原来的 fastdtw 近似
+POSTURE_BASE = "/data1/liuy/vln_pi0/without_screenshot"
 
 
 def angle_difference(a, b):
@@ -27,6 +33,9 @@ def calculate_ndtw(seq_a, seq_b):
     if len(seq_a) == 0 or len(seq_b) == 0:
         return 0.0, 0.0
 
+    if EXACT_DTW:
+        return ndtw(seq_a, seq_b, ALPHA)
+
     # 计算累积距离
     distance, _ = fastdtw(
         np.array(seq_a),
@@ -45,37 +54,60 @@ def calculate_ndtw(seq_a, seq_b):
     return ndtw_value, L
 
 
-def process_episode(json_path):
-    """处理单个episode文件"""
+def load_ground_truth(episode_key):
+    """episode的gt序列: 整条轨迹的位姿 (角度为弧度), 结果缓存在磁盘上"""
+    posture_path = os.path.join(POSTURE_BASE, os.path.dirname(episode_key), "posture.json")
+    return cached_ground_truth(episode_key, [posture_path, os.path.join(POSTURE_STORE, INDEX_FILE)],
+                               lambda: load_poses(posture_path))
+
+
+def load_episode(json_path):
+    """读取轨迹文件, 返回 (episode_key, 预测轨迹); 出错或终止原因不计入指标时返回None"""
     try:
         # 加载轨迹文件
         with open(json_path, 'r') as f:
             data = json.load(f)
+    except Exception as e:
+        print(f"处理文件 {json_path} 时出错: {str(e)}")
+        return None
+
+    # 检查终止原因
+    if data.get("termination_reason") != "no_more_instructions":
+        return None
+
+    try:
+        return data["episode_key"], data["trajectory"]
+    except KeyError as e:
+        print(f"处理文件 {json_path} 时出错: 缺少字段 {str(e)}")
+        return None
+
+
+def process_episode(json_path):
+    """处理单个episode文件"""
+    return process_episodes([json_path])[0]
+
 
-        # 检查终止原因
-        if data.get("termination_reason") != "no_more_instructions":
-            return None
+def process_episodes(json_paths):
+    """处理一批episode文件, 结果与 json_paths 一一对应 (处理失败或不计入指标的为None)"""
+    episodes = [load_episode(json_path) for json_path in json_paths]
+    valid = [i for i, episode in enumerate(episodes) if episode is not None]
+    results = [None] * len(episodes)
+    for i, result in zip(valid, process_trajectories([episodes[i] for i in valid])):
+        results[i] = result
+    return results
 
+
+def prepare_trajectory(episode):
+    """单个episode中除nDTW以外的部分: 返回 (结果, 预测位置序列, gt位置序列), 出错时返回None"""
+    try:
         # 获取episode_key和预测轨迹
-        episode_key = data["episode_key"].lstrip('/')
-        pred_trajectory = data["trajectory"]
-
-        # 构建posture文件路径
-        base_path = "/data1/liuy/vln_pi0/without_screenshot"
-        posture_path = os.path.join(base_path, os.path.dirname(episode_key), "posture.json")
-
-        # 加载目标轨迹
-        with open(posture_path, 'r') as f:
-            gt_full_seq = json.load(f)
-
-        # 转换角度为弧度并提取三维坐标
-        gt_seq = []
-        gt_positions = []
-        for point in gt_full_seq:
-            x, y, z, yaw_deg = point
-            yaw_rad = yaw_deg * math.pi / 180.0
-            gt_seq.append([x, y, z, yaw_rad])
-            gt_positions.append([x, y, z])  # 仅位置用于nDTW
+        episode_key = episode[0].lstrip('/')
+        pred_trajectory = episode[1]
+
+        # 加载目标轨迹 (角度已转换为弧度)
+        gt_poses = load_ground_truth(episode_key)
+        gt_seq = gt_poses.tolist()
+        gt_positions = gt_poses[:, :3].tolist()  # 仅位置用于nDTW
 
         # 获取目标终点
         gt_end = gt_seq[-1]
@@ -107,29 +139,62 @@ def process_episode(json_path):
                 osr = 1
                 break
 
-        # 计算nDTW（归一化动态时间规整）
-        nDTW, _ = calculate_ndtw(pred_positions, gt_positions)
-
-        return {
+        result = {
             "episode_key": episode_key,
             "NE": ne,
             "SR": sr,
             "OSR": osr,
-            "nDTW": nDTW,
+            "nDTW": None,
             "final_dist": final_dist,
             "final_angle_diff": final_angle_diff
         }
+        return result, pred_positions, gt_positions
 
     except Exception as e:
-        print(f"处理文件 {json_path} 时出错: {str(e)}")
+        print(f"处理 {episode[0]} 时出错: {str(e)}")
         return None
 
 
-def main():
-    # 配置路径
-    trajectories_dir = "/data1/liuy/vln_pi0/shared_folder/trajectories"
-    output_file = "evaluation_results_unseen.json"
+def batch_ndtw(pred_seqs, gt_seqs):
+    """多对位置序列的nDTW; 精确DTW时所有序列对一次计算"""
+    if EXACT_DTW:
+        return ndtw_batch(pred_seqs, gt_seqs, ALPHA)[0].tolist()
+    return [calculate_ndtw(a, b)[0] for a, b in zip(pred_seqs, gt_seqs)]
+
+
+def process_trajectory(episode):
+    """处理单个episode: (episode_key, 预测轨迹)"""
+    return process_trajectories([episode])[0]
+
+
+def process_trajectories(episodes):
+    """处理一批episode [(episode_key, 预测轨迹)], 结果与 episodes 一一对应 (处理失败的为None)
+
+    逐个计算NE/SR/OSR后, 整批的nDTW一次计算.
+    """
+    prepared = [prepare_trajectory(episode) for episode in episodes]
+    valid = [i for i, entry in enumerate(prepared) if entry is not None]
+    results = [entry[0] if entry is not None else None for entry in prepared]
+    if not valid:
+        return results
+
+    try:
+        # 计算nDTW（归一化动态时间规整）
+        values = batch_ndtw([prepared[i][1] for i in valid], [prepared[i][2] for i in valid])
+    except Exception as e:
+        if len(valid) > 1:
+            # 逐个重新计算, 只有出错的episode结果为None
+            return [process_trajectory(episode) if i in valid else None for i, episode in enumerate(episodes)]
+        print(f"处理 {episodes[valid[0]][0]} 时出错: {str(e)}")
+        return [None] * len(episodes)
+
+    for i, value in zip(valid, values):
+        results[i]["nDTW"] = value
+    return results
+
 
+def main(trajectories_dir="/data1/liuy/vln_pi0/shared_folder/trajectories",
+         output_file="evaluation_results_unseen.json"):
     # 收集所有结果
     all_results = []
     total_count = 0
@@ -139,22 +204,24 @@ def main():
     total_ne = 0.0
     total_ndtw = 0.0
 
-    # 遍历所有轨迹文件
-    for filename in os.listdir(trajectories_dir):
-        if filename.endswith(".json"):
-            filepath = os.path.join(trajectories_dir, filename)
-            result = process_episode(filepath)
-
-            if result:
-                all_results.append(result)
-                total_count += 1
-                valid_count += 1
-
-                # 更新统计数据
-                total_ne += result["NE"]
-                total_ndtw += result["nDTW"]
-                sr_count += result["SR"]
-                osr_count += result["OSR"]
+    # 并行处理所有episode, 结果按轨迹文件名顺序合并; 有列式存储 (UAV_EVAL_TRAJECTORY_FORMAT=npz) 时一次读入整个运行
+    run = load_run(trajectories_dir)
+    if run is not None:
+        episode_results = run_batches(process_trajectories,
+                                      run.episodes(run["termination_reason"] == "no_more_instructions"))
+    else:
+        episode_results = run_batches(process_episodes, list_trajectory_files(trajectories_dir))
+    for result in episode_results:
+        if result:
+            all_results.append(result)
+            total_count += 1
+            valid_count += 1
+
+            # 更新统计数据
+            total_ne += result["NE"]
+            total_ndtw += result["nDTW"]
+            sr_count += result["SR"]
+            osr_count += result["OSR"]
 
     # 计算总体指标
     avg_ne = total_ne / valid_count if valid_count > 0 else 0.0
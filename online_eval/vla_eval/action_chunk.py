@@ -0,0 +1,70 @@
+import os
+import numpy as np
+
+# 配置
+# 每次推理后执行的航点数 k (每k步重新推理一次); 0 为逐步模式, 每次推理只执行动作块的最后一个航点
+CHUNK_STEPS = int(os.environ.get("UAV_EVAL_CHUNK_STEPS", "0"))
+# 时间集成的衰减系数 m: 同一航点由所有覆盖它的动作块加权平均, 权重 exp(-m * i), i=0 为最早的动作块
+# 为空时不做时间集成, 只使用最新的动作块
+CHUNK_ENSEMBLE = os.environ.get("UAV_EVAL_CHUNK_ENSEMBLE", "")
+ACTION_HORIZON = 10  # 动作块长度, 与模型配置的 action_horizon 一致
+
+
+def chunk_mode():
+    return CHUNK_STEPS > 0
+
+
+def average_waypoints(waypoints, weights):
+    """航点 [x, y, z, yaw] 的加权平均, 朝向取圆周平均以处理角度回绕"""
+    waypoints = np.asarray(waypoints, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64) / np.sum(weights)
+    position = weights @ waypoints[:, :3]
+    yaw = np.arctan2(weights @ np.sin(waypoints[:, 3]), weights @ np.cos(waypoints[:, 3]))
+    return np.append(position, yaw)
+
+
+def step_grid(trajectory, horizon=ACTION_HORIZON):
+    """逐航点的轨迹按动作块长度抽样 (保留终点), 与逐步模式的轨迹粒度一致"""
+    if not trajectory:
+        return []
+    grid = trajectory[::horizon]
+    if (len(trajectory) - 1) % horizon:
+        grid.append(trajectory[-1])
+    return grid
+
+
+class ChunkExecutor:
+    """按动作块执行航点: 每个动作块执行前k个航点后重新推理, 可选对重叠的动作块做时间集成"""
+
+    def __init__(self, chunk_steps=CHUNK_STEPS, ensemble_decay=CHUNK_ENSEMBLE):
+        self.chunk_steps = chunk_steps
+        self.ensemble_decay = float(ensemble_decay) if ensemble_decay not in ("", None) else None
+        self.chunks = []  # [(起始航点序号, 航点数组)], 按推理顺序排列
+        self.step = 0  # 已执行的航点数
+        self.replan_step = 0  # 到达该航点序号时重新推理
+
+    def needs_replan(self):
+        return self.step >= self.replan_step
+
+    def add_chunk(self, waypoints):
+        """加入一个新的动作块, 从当前航点开始执行"""
+        waypoints = np.asarray(waypoints, dtype=np.float64)[:, :4]
+        self.chunks.append((self.step, waypoints))
+        self.replan_step = self.step + min(self.chunk_steps, len(waypoints))
+
+    def next_waypoint(self):
+        """下一个要执行的航点 [x, y, z, yaw]"""
+        # 丢弃已经不覆盖后续航点的动作块
+        self.chunks = [(start, waypoints) for start, waypoints in self.chunks
+                       if start + len(waypoints) > self.step]
+
+        if self.ensemble_decay is None:
+            start, waypoints = self.chunks[-1]
+            waypoint = waypoints[self.step - start]
+        else:
+            predictions = [waypoints[self.step - start] for start, waypoints in self.chunks]
+            weights = np.exp(-self.ensemble_decay * np.arange(len(predictions)))
+            waypoint = average_waypoints(predictions, weights)
+
+        self.step += 1
+        return waypoint.tolist()
@@ -0,0 +1,64 @@
+import os
+import sys
+import json
+import numpy as np
+
+# 配置
+# 用法: 每个k (UAV_EVAL_CHUNK_STEPS) 各运行一次评估, 把 final_results.json 复制到单独的位置, 然后
+#   python chunk_benchmark.py runs/step/final_results.json runs/k2/final_results.json runs/k5/ ...
+RESULTS_FILE = "final_results.json"
+DEFAULT_RESULTS = os.path.join("shared_folder", "trajectories", RESULTS_FILE)
+
+
+def load_results(path):
+    if os.path.isdir(path):
+        path = os.path.join(path, RESULTS_FILE)
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def run_label(results):
+    """按结果中记录的动作块配置命名, 没有记录的 (旧版本结果) 视为逐步模式"""
+    configs = {(result.get("chunk_steps", 0), result.get("chunk_ensemble", "")) for result in results.values()}
+    if len(configs) > 1:
+        return "mixed"
+    chunk_steps, chunk_ensemble = configs.pop()
+    if not chunk_steps:
+        return "step"
+    return f"k={chunk_steps}" + (f", m={chunk_ensemble}" if chunk_ensemble else "")
+
+
+def summarize(results):
+    """成功率与每个episode的模型调用次数 / 执行步数"""
+    success = np.array([bool(result.get("success")) for result in results.values()])
+    # 逐步模式的旧结果没有 model_calls, 每一步即一次推理
+    model_calls = np.array([result.get("model_calls", result.get("steps", 0)) for result in results.values()])
+    steps = np.array([result.get("steps", 0) for result in results.values()])
+    return {
+        "episodes": len(results),
+        "success_rate": success.mean(),
+        "calls_mean": model_calls.mean(),
+        "calls_p50": np.percentile(model_calls, 50),
+        "calls_p95": np.percentile(model_calls, 95),
+        "calls_success": model_calls[success].mean() if success.any() else float("nan"),
+        "steps_mean": steps.mean(),
+    }
+
+
+def main():
+    paths = sys.argv[1:] or [DEFAULT_RESULTS]
+    print(f"{'run':<36} {'config':<14} {'episodes':>8} {'success':>8} {'calls':>7} {'p50':>6} "
+          f"{'p95':>6} {'calls|ok':>9} {'steps':>7}")
+    for path in paths:
+        results = load_results(path)
+        if not results:
+            print(f"{path:<36} (空)")
+            continue
+        row = summarize(results)
+        print(f"{path:<36} {run_label(results):<14} {row['episodes']:>8} {row['success_rate']:>8.1%} "
+              f"{row['calls_mean']:>7.2f} {row['calls_p50']:>6.1f} {row['calls_p95']:>6.1f} "
+              f"{row['calls_success']:>9.2f} {row['steps_mean']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
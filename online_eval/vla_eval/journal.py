@@ -0,0 +1,102 @@
+import os
+import json
+import hashlib
+from model_config import MODEL_CONFIG, CHECKPOINT_DIR
+
+# 配置
+JOURNAL_FILE = "results_journal.jsonl"
+# 设为0时忽略并清空已有日志, 从头开始评测
+RESUME = os.environ.get("UAV_EVAL_RESUME", "1") == "1"
+
+
+def run_identity(task, test_file, **settings):
+    """评测运行的标识: 任务, 测试集文件 (路径和内容哈希), 模型配置和checkpoint, 以及其他影响结果的设置"""
+    with open(test_file, 'rb') as f:
+        test_file_sha1 = hashlib.sha1(f.read()).hexdigest()
+    identity = {
+        "task": task,
+        "test_file": os.path.abspath(test_file),
+        "test_file_sha1": test_file_sha1,
+        "model_config": MODEL_CONFIG,
+        "checkpoint": CHECKPOINT_DIR,
+        **settings
+    }
+    # 与从日志读回的标识比较, 先经过一次json转换 (如元组变为列表)
+    return json.loads(json.dumps(identity))
+
+
+class ResultJournal:
+    """已完成episode的追加式日志 (每行一个json)
+
+    第一行记录评测运行的标识 (run_identity); 之后每个episode结束时追加一行并fsync,
+    进程被中断后重新启动时据此跳过已完成的episode. 已有日志的标识与本次运行不同时拒绝恢复,
+    以免把另一个模型或测试集的结果当作本次的结果.
+    """
+
+    def __init__(self, output_dir, identity, resume=RESUME):
+        self.path = os.path.join(output_dir, JOURNAL_FILE)
+        if not resume and os.path.exists(self.path):
+            os.remove(self.path)
+
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            self._write_line({"run": identity})
+            return
+
+        recorded = self._read_identity()
+        if recorded != identity:
+            raise ValueError(
+                f"结果日志 {self.path} 来自另一次评测运行, 不能恢复:\n"
+                f"  日志中: {json.dumps(recorded, ensure_ascii=False)}\n"
+                f"  本次:   {json.dumps(identity, ensure_ascii=False)}\n"
+                f"请换一个输出目录, 或设置 UAV_EVAL_RESUME=0 清空日志后重新评测")
+
+        # 上次中断时最后一行可能没有写完, 先补上换行, 避免与新追加的记录连在一起
+        with open(self.path, 'rb+') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+    def _read_identity(self):
+        """日志第一行记录的运行标识, 旧格式的日志没有标识, 返回None"""
+        with open(self.path, 'r') as f:
+            try:
+                header = json.loads(f.readline())
+            except json.JSONDecodeError:
+                return None
+        return header.get("run") if isinstance(header, dict) else None
+
+    def _write_line(self, entry):
+        line = json.dumps(entry) + "\n"
+        with open(self.path, 'a') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load(self):
+        """读取日志, 返回 {episode_key: 结果}; 中断时写了一半的最后一行被忽略"""
+        results = {}
+        if not os.path.exists(self.path):
+            return results
+
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "episode_key" in entry:
+                    results[entry["episode_key"]] = entry["result"]
+        return results
+
+    def append(self, episode_key, result):
+        """记录一个已完成的episode"""
+        self._write_line({"episode_key": episode_key, "result": result})
+
+
+def write_results(results_file, results, episode_keys):
+    """按测试集顺序写出已有结果 (先写临时文件再重命名, 不会留下不完整的json)"""
+    ordered = {episode_key: results[episode_key] for episode_key in episode_keys if episode_key in results}
+    tmp_file = results_file + ".tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(ordered, f, indent=2)
+    os.replace(tmp_file, results_file)
@@ -0,0 +1,43 @@
+import json
+import pytest
+from journal import ResultJournal, run_identity
+
+
+def make_identity(tmp_path, episodes, **settings):
+    test_file = tmp_path / "test_vla.json"
+    test_file.write_text(json.dumps(episodes))
+    return run_identity("vla", str(test_file), **settings)
+
+
+def test_resume_same_run(tmp_path):
+    identity = make_identity(tmp_path, {"a": {}, "b": {}}, chunk_steps=0)
+    journal = ResultJournal(str(tmp_path), identity, resume=True)
+    journal.append("a", {"success": True})
+
+    resumed = ResultJournal(str(tmp_path), identity, resume=True)
+    assert resumed.load() == {"a": {"success": True}}
+
+
+@pytest.mark.parametrize("change", ["test_file", "settings"])
+def test_refuse_resume_of_other_run(tmp_path, change):
+    """日志来自另一次运行 (测试集或设置不同) 时拒绝恢复, 不会沿用其结果; 关闭恢复后从头开始"""
+    identity = make_identity(tmp_path, {"a": {}, "b": {}}, chunk_steps=0)
+    ResultJournal(str(tmp_path), identity, resume=True).append("a", {"success": True})
+
+    if change == "test_file":
+        other = make_identity(tmp_path, {"a": {}, "c": {}}, chunk_steps=0)
+    else:
+        other = make_identity(tmp_path, {"a": {}, "b": {}}, chunk_steps=4)
+    with pytest.raises(ValueError, match="UAV_EVAL_RESUME=0"):
+        ResultJournal(str(tmp_path), other, resume=True)
+
+    fresh = ResultJournal(str(tmp_path), other, resume=False)
+    assert fresh.load() == {}
+    ResultJournal(str(tmp_path), other, resume=True)
+
+
+def test_refuse_journal_without_identity(tmp_path):
+    """旧格式的日志没有运行标识, 无法确认来自同一次运行, 同样拒绝恢复"""
+    (tmp_path / "results_journal.jsonl").write_text(json.dumps({"episode_key": "a", "result": {}}) + "\n")
+    with pytest.raises(ValueError):
+        ResultJournal(str(tmp_path), make_identity(tmp_path, {"a": {}}), resume=True)
@@ -0,0 +1,6 @@
+import os
+
+# 配置
+# 模型进程加载的训练配置和checkpoint; 控制器把它们记录在结果日志中, 换了模型时不会沿用上一次运行的结果
+MODEL_CONFIG = os.environ.get("UAV_EVAL_MODEL_CONFIG", "pi0_uav_low_mem_finetune")
+CHECKPOINT_DIR = os.environ.get("UAV_EVAL_CHECKPOINT", "/data1/liuy/pi0_ck/pi0_uav_low_mem_finetune/15k_2/29999")
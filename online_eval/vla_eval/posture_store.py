@@ -0,0 +1,136 @@
+import os
+import sys
+import json
+import numpy as np
+
+# 配置
+# 打包后的位姿存储目录 (poses.npy + index.json), 不存在时各加载函数回退到逐个读取 posture.json
+POSTURE_STORE = os.environ.get("UAV_EVAL_POSTURE_STORE", "posture_store")
+POSES_FILE = "poses.npy"
+INDEX_FILE = "index.json"
+
+_stores = {}
+
+
+def posture_rows(posture_data):
+    """posture.json 的内容 -> N x 4 数组 [x, y, z, yaw(弧度)], 缺少角度的帧按0处理"""
+    rows = np.zeros((len(posture_data), 4), dtype=np.float64)
+    for i, frame in enumerate(posture_data):
+        rows[i, :min(len(frame), 4)] = frame[:4]
+    rows[:, 3] = rows[:, 3] * np.pi / 180.0
+    return rows
+
+
+def pack_postures(posture_base, output_dir=POSTURE_STORE, vla_ins_base=None):
+    """将 posture_base 下所有 posture.json 打包为一个连续的 float64 数组 (与从JSON读取的数值逐位相同)
+
+    index.json 记录每条轨迹 (group/scene/traj) 在数组中的 [起始行, 行数];
+    给出 vla_ins_base 时同时记录每个 vla_ins_*.json 的 source 帧范围.
+    """
+    keys, chunks = [], []
+    for root, dirs, files in os.walk(posture_base):
+        dirs.sort()
+        if "posture.json" in files:
+            with open(os.path.join(root, "posture.json"), 'r') as f:
+                chunks.append(posture_rows(json.load(f)))
+            keys.append(os.path.relpath(root, posture_base).replace(os.sep, '/'))
+
+    trajectories = {}
+    offset = 0
+    for key, rows in zip(keys, chunks):
+        trajectories[key] = [offset, len(rows)]
+        offset += len(rows)
+    poses = np.concatenate(chunks) if chunks else np.zeros((0, 4), dtype=np.float64)
+
+    sources = {}
+    if vla_ins_base and os.path.isdir(vla_ins_base):
+        for root, dirs, files in os.walk(vla_ins_base):
+            dirs.sort()
+            for file_name in sorted(files):
+                if not (file_name.startswith("vla_ins") and file_name.endswith(".json")):
+                    continue
+                with open(os.path.join(root, file_name), 'r', encoding='gbk') as f:
+                    source = json.load(f).get("source")
+                if source is not None:
+                    key = os.path.relpath(os.path.join(root, file_name), vla_ins_base).replace(os.sep, '/')
+                    sources[key] = source
+
+    # 先写临时文件再重命名, 正在读取旧存储的进程不受影响
+    os.makedirs(output_dir, exist_ok=True)
+    poses_file = os.path.join(output_dir, POSES_FILE)
+    with open(poses_file + ".tmp", 'wb') as f:
+        np.save(f, poses)
+    os.replace(poses_file + ".tmp", poses_file)
+
+    index_file = os.path.join(output_dir, INDEX_FILE)
+    with open(index_file + ".tmp", 'w') as f:
+        json.dump({
+            "posture_base": os.path.abspath(posture_base),
+            "num_poses": len(poses),
+            "trajectories": trajectories,
+            "sources": sources
+        }, f)
+    os.replace(index_file + ".tmp", index_file)
+    return len(trajectories), len(poses), len(sources)
+
+
+class PostureStore:
+    """打包后的位姿存储, 数组以内存映射方式打开, 每条轨迹O(1)读取"""
+
+    def __init__(self, store_dir=POSTURE_STORE):
+        with open(os.path.join(store_dir, INDEX_FILE), 'r') as f:
+            index = json.load(f)
+        self.posture_base = index["posture_base"]
+        self.trajectories = index["trajectories"]
+        self.sources = index["sources"]
+        self.poses = np.load(os.path.join(store_dir, POSES_FILE), mmap_mode='r')
+        if self.poses.dtype != np.float64:
+            raise ValueError(f"位姿存储 {store_dir} 为 {self.poses.dtype}, 请重新运行 posture_store.py 打包为float64")
+
+    def trajectory(self, traj_key):
+        """轨迹 group/scene/traj 的全部位姿 (N x 4 只读视图), 不在存储中时返回None"""
+        entry = self.trajectories.get(traj_key.strip('/'))
+        if entry is None:
+            return None
+        offset, length = entry
+        return self.poses[offset:offset + length]
+
+    def trajectory_of(self, posture_path):
+        """按 posture.json 的路径查找轨迹 (路径需位于打包时的 posture_base 下)"""
+        traj_dir = os.path.relpath(os.path.dirname(os.path.abspath(posture_path)), self.posture_base)
+        if traj_dir.startswith(os.pardir):
+            return None
+        return self.trajectory(traj_dir.replace(os.sep, '/'))
+
+    def source(self, vla_ins_key):
+        """vla_ins 文件 (group/scene/traj/vla_ins_k.json) 的 source 帧范围, 没有记录时返回None"""
+        return self.sources.get(vla_ins_key.strip('/'))
+
+
+def open_store(store_dir=POSTURE_STORE):
+    """打开位姿存储 (每个进程只打开一次), 存储不存在时返回None"""
+    if store_dir not in _stores:
+        exists = os.path.exists(os.path.join(store_dir, INDEX_FILE))
+        _stores[store_dir] = PostureStore(store_dir) if exists else None
+    return _stores[store_dir]
+
+
+def load_poses(posture_path):
+    """读取一条轨迹的全部位姿 [x, y, z, yaw(弧度)], 优先从位姿存储中读取"""
+    store = open_store()
+    if store is not None:
+        poses = store.trajectory_of(posture_path)
+        if poses is not None:
+            return np.array(poses)
+
+    with open(posture_path, 'r') as f:
+        return posture_rows(json.load(f))
+
+
+if __name__ == "__main__":
+    # 用法: python posture_store.py [posture_base] [vla_ins_base] [output_dir]
+    posture_base = sys.argv[1] if len(sys.argv) > 1 else "./without_screenshot"
+    vla_ins_base = sys.argv[2] if len(sys.argv) > 2 else "./vla_ins"
+    output_dir = sys.argv[3] if len(sys.argv) > 3 else POSTURE_STORE
+    num_trajectories, num_poses, num_sources = pack_postures(posture_base, output_dir, vla_ins_base)
+    print(f"已打包 {num_trajectories} 条轨迹, {num_poses} 个位姿, {num_sources} 个source到 {output_dir}")
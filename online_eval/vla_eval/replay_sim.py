@@ -0,0 +1,201 @@
+import os
+import time
+import multiprocessing
+from collections import OrderedDict
+import numpy as np
+import cv2
+from scipy.spatial import cKDTree
+from transport import create_transport, sim_worker_name, NUM_SIM_WORKERS, POLL_INTERVAL
+from frame_buffer import FrameRing, SAVE_IMAGES
+import tracing
+from posture_store import load_poses
+
+# 配置 (数据集路径与控制器中的配置保持一致)
+SHARED_FOLDER = "shared_folder"
+IMAGE_STORAGE = os.path.join(SHARED_FOLDER, "images")
+INDOOR_UAV_BASE = "/data1/liux/Indoor_UAV"
+POSTURE_BASE = "./without_screenshot"
+# 帧来源: "dataset" 回放数据集中位姿最近的截图 (缺少数据时使用合成帧), "synthetic" 只使用合成帧
+REPLAY_SOURCE = os.environ.get("UAV_EVAL_REPLAY_SOURCE", "dataset")
+REPLAY_DELAY = float(os.environ.get("UAV_EVAL_REPLAY_DELAY", "0"))  # 每帧额外等待的时间 (秒), 用于模拟渲染耗时
+SYNTHETIC_FRAME_SHAPE = (720, 1280, 3)
+YAW_WEIGHT = 1.0  # 最近位姿查找中朝向 (单位圆上的cos/sin) 相对于位置 (米) 的权重
+TRAJECTORY_CACHE_SIZE = 32
+IMAGE_CACHE_SIZE = 64
+
+
+def pose_features(poses):
+    """位姿 [x, y, z, yaw(弧度)] -> KD树中的特征, 朝向映射到单位圆上以处理角度回绕"""
+    poses = np.atleast_2d(np.asarray(poses, dtype=np.float64))
+    yaw = poses[:, 3]
+    return np.column_stack([poses[:, :3], YAW_WEIGHT * np.cos(yaw), YAW_WEIGHT * np.sin(yaw)])
+
+
+def synthetic_frame(pose, shape=SYNTHETIC_FRAME_SHAPE):
+    """根据位姿生成的合成帧 (RGB), 同一位姿总是得到同一帧"""
+    pose = np.asarray(pose[:4], dtype=np.float64)
+    color = (np.abs(np.sin(pose[:3] * [1.3, 1.7, 2.9])) * 255).astype(np.uint8)
+    frame = np.empty(shape, dtype=np.uint8)
+    frame[:] = color
+
+    # 朝向用一条竖线表示
+    column = int((pose[3] % (2 * np.pi)) / (2 * np.pi) * (shape[1] - 1))
+    frame[:, column] = 255
+    return frame
+
+
+class TrajectoryIndex:
+    """一条轨迹的位姿KD树, 按位姿查询最近的截图"""
+
+    def __init__(self, posture_path, screenshots_dir):
+        self.tree = cKDTree(pose_features(load_poses(posture_path)))
+        self.screenshots_dir = screenshots_dir
+
+    def nearest_frame(self, pose):
+        """位姿最近的截图路径 (截图编号从1开始)"""
+        _, index = self.tree.query(pose_features(pose[:4])[0])
+        return os.path.join(self.screenshots_dir, f"{index + 1}.png")
+
+
+class ReplaySimulatorService:
+    """不依赖habitat的模拟器服务, 消息格式与 SimulatorService 相同
+
+    按位姿回放数据集中的截图 (每条轨迹预先建立KD树), 或返回合成帧.
+    用于在没有habitat和场景数据的机器上对控制器, 传输层和模型进行压测.
+    """
+
+    def __init__(self, name="sim", source=REPLAY_SOURCE):
+        self.source = source
+        self.trajectories = OrderedDict()  # 轨迹目录 -> TrajectoryIndex (无数据时为None)
+        self.images = OrderedDict()  # 截图路径 -> RGB图像 (LRU)
+        self.frame_ring = FrameRing(name)
+
+    def load_trajectory(self, episode_key):
+        """加载episode所在轨迹的位姿索引"""
+        parts = episode_key.rsplit('/', 1)[0].strip('/').split('/')
+        traj_dir = os.path.join(*parts[:3])
+        if traj_dir in self.trajectories:
+            self.trajectories.move_to_end(traj_dir)
+            return self.trajectories[traj_dir]
+
+        posture_path = os.path.join(POSTURE_BASE, traj_dir, "posture.json")
+        screenshots_dir = os.path.join(INDOOR_UAV_BASE, traj_dir, "screenshots")
+        index = None
+        if os.path.exists(posture_path) and os.path.isdir(screenshots_dir):
+            index = TrajectoryIndex(posture_path, screenshots_dir)
+        else:
+            print(f"警告: 缺少轨迹数据, 使用合成帧: {traj_dir}")
+
+        self.trajectories[traj_dir] = index
+        if len(self.trajectories) > TRAJECTORY_CACHE_SIZE:
+            self.trajectories.popitem(last=False)
+        return index
+
+    def load_image(self, image_path):
+        """读取截图 (RGB), 读取失败时返回None"""
+        if image_path in self.images:
+            self.images.move_to_end(image_path)
+            return self.images[image_path]
+
+        frame = cv2.imread(image_path)
+        if frame is None:
+            return None
+        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+        self.images[image_path] = frame
+        if len(self.images) > IMAGE_CACHE_SIZE:
+            self.images.popitem(last=False)
+        return frame
+
+    def render(self, episode_key, coords):
+        """返回位姿对应的帧 (RGB)"""
+        if self.source == "dataset":
+            index = self.load_trajectory(episode_key)
+            if index is not None:
+                frame = self.load_image(index.nearest_frame(coords))
+                if frame is not None:
+                    return frame
+        return synthetic_frame(coords)
+
+    def process_message(self, data):
+        """处理一条控制器消息, 返回需要回复给控制器的消息 (无回复时返回None)"""
+        try:
+            if data.get("action") == "terminate":
+                return None
+
+            episode_key = data.get("episode_key", "")
+            step = data.get("step")
+            coords = data.get("coordinates", [])
+            timestamp = time.time()
+
+            with tracing.span("sim.render", episode_key, step):
+                frame = self.render(episode_key, coords)
+                if REPLAY_DELAY > 0:
+                    time.sleep(REPLAY_DELAY)
+
+            with tracing.span("sim.frame_write", episode_key, step):
+                frame_handle = self.frame_ring.write(frame)
+
+            image_path = None
+            if SAVE_IMAGES:
+                os.makedirs(IMAGE_STORAGE, exist_ok=True)
+                safe_episode_key = episode_key.replace('/', '_').replace(':', '_').replace(' ', '_')
+                image_path = os.path.join(IMAGE_STORAGE, f"image_{safe_episode_key}_{timestamp}.png")
+                cv2.imwrite(image_path, frame[:, :, ::-1])
+
+            return {
+                "episode_key": episode_key,
+                "coordinates": coords,
+                "frame": frame_handle,
+                "image_path": image_path
+            }
+
+        except Exception as e:
+            print(f"处理消息出错: {str(e)}")
+            return None
+
+
+def run_worker(worker_id):
+    """运行一个回放模拟器工作进程, 端点名称与 sim_runner 相同"""
+    name = sim_worker_name(worker_id)
+    print(f"回放模拟器服务启动 ({name}, 帧来源: {REPLAY_SOURCE})...")
+    simulator = ReplaySimulatorService(name)
+    transport = create_transport(name)
+    tracing.init(name)
+
+    try:
+        while True:
+            for source, data in transport.recv(timeout=POLL_INTERVAL):
+                with tracing.span("sim.process", data.get("episode_key", ""), data.get("step")):
+                    reply = simulator.process_message(data)
+                if reply is not None:
+                    transport.send(source, reply)
+
+    except KeyboardInterrupt:
+        print(f"回放模拟器服务停止 ({name})")
+
+    finally:
+        simulator.frame_ring.close()
+        transport.close()
+        tracing.close()
+
+
+def main():
+    if NUM_SIM_WORKERS == 1:
+        run_worker(0)
+        return
+
+    workers = [multiprocessing.Process(target=run_worker, args=(i,)) for i in range(NUM_SIM_WORKERS)]
+    for worker in workers:
+        worker.start()
+
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.join()
+
+
+if __name__ == "__main__":
+    main()
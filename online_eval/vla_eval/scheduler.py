@@ -0,0 +1,50 @@
+from collections import OrderedDict
+from utils import get_glb_path
+
+
+class EpisodeScheduler:
+    """按场景调度episode
+
+    待运行的episode按glb路径分组 (组的顺序为测试集中首次出现的顺序),
+    工作进程空闲时优先取其已加载场景中的下一个episode, 这样模拟器不必重新加载场景.
+    """
+
+    def __init__(self, episode_keys):
+        self.glb_paths = {}  # (group, scene) -> glb路径
+        self.queues = OrderedDict()  # glb路径 -> 待运行的episode_key
+        self.worker_scenes = {}  # 工作进程 -> 已加载的glb路径
+        for episode_key in episode_keys:
+            self.queues.setdefault(self.episode_scene(episode_key), []).append(episode_key)
+
+    def episode_scene(self, episode_key):
+        """episode对应的glb路径, 无法解析时返回None (episode照常运行, 在setup_episode中报错)"""
+        parts = episode_key.rsplit('/', 1)[0].strip('/').split('/')
+        group, scene = parts[0], parts[1]
+        if (group, scene) not in self.glb_paths:
+            try:
+                self.glb_paths[(group, scene)] = get_glb_path(group, scene)
+            except Exception as e:
+                print(f"无法解析场景 {group}/{scene}: {str(e)}")
+                self.glb_paths[(group, scene)] = None
+        return self.glb_paths[(group, scene)]
+
+    def has_pending(self):
+        return bool(self.queues)
+
+    def num_scenes(self):
+        return len(self.queues)
+
+    def next_episode(self, worker):
+        """为空闲的工作进程选择下一个episode"""
+        scene = self.worker_scenes.get(worker)
+        if scene not in self.queues:
+            # 已加载的场景没有剩余episode时, 优先选择没有其他工作进程在运行的场景
+            busy = set(self.worker_scenes.values())
+            scene = next((s for s in self.queues if s not in busy), next(iter(self.queues)))
+
+        episode_keys = self.queues[scene]
+        episode_key = episode_keys.pop(0)
+        if not episode_keys:
+            del self.queues[scene]
+        self.worker_scenes[worker] = scene
+        return episode_key
@@ -5,7 +5,30 @@ from habitat_sim.utils import viz_utils as vut
 from habitat_sim import Simulator, AgentConfiguration, SimulatorConfiguration
 from magnum import Vector3
 import cv2
-from utils import load_position  # 从utils导入
+from utils import load_position, poses_to_states  # 从utils导入
+
+# 配置
+# 相机模式: "full" 按原分辨率渲染, 由模型端缩放并补边; "model" 直接按模型输入的有效分辨率渲染并补边
+SENSOR_MODE = os.environ.get("UAV_EVAL_SENSOR_MODE", "full")
+FULL_RESOLUTION = (720, 1280)
+MODEL_RESOLUTION = (224, 224)  # 模型输入分辨率 (ResizeImages)
+
+
+def letterbox_size(resolution=FULL_RESOLUTION, target=MODEL_RESOLUTION):
+    """按 resize_with_pad 的规则计算等比缩放后的尺寸 (高, 宽)"""
+    height, width = resolution
+    ratio = max(width / target[1], height / target[0])
+    return int(height / ratio), int(width / ratio)
+
+
+def letterbox(obs, target=MODEL_RESOLUTION):
+    """翻转, RGBA转BGR并补边到模型输入尺寸, 一次复制完成 (补边位置与 resize_with_pad 相同)"""
+    height, width = obs.shape[:2]
+    top = (target[0] - height) // 2
+    left = (target[1] - width) // 2
+    frame = np.zeros((target[0], target[1], 3), dtype=np.uint8)
+    frame[top:top + height, left:left + width] = obs[::-1, ::-1, 2::-1]
+    return frame
 
 
 def setup_simulator(glb_path):
@@ -17,7 +40,11 @@ def setup_simulator(glb_path):
     camera_sensor_spec = habitat_sim.CameraSensorSpec()
     camera_sensor_spec.uuid = "rgb"
     camera_sensor_spec.sensor_type = habitat_sim.SensorType.COLOR
-    camera_sensor_spec.resolution = [720, 1280]
+    # 两种模式的宽高比相同, 视场一致, 模型看到的画面范围不变
+    if SENSOR_MODE == "model":
+        camera_sensor_spec.resolution = list(letterbox_size())
+    else:
+        camera_sensor_spec.resolution = list(FULL_RESOLUTION)
     camera_sensor_spec.position = Vector3(0, 1.5, 0)
     camera_sensor_spec.orientation = Vector3(0, np.pi, 0)
 
@@ -30,20 +57,37 @@ def setup_simulator(glb_path):
     return Simulator(config)
 
 
-def get_img(coords_file, sim, agent):
-    """根据坐标文件获取图像"""
-    transform = load_position(file_path=coords_file)
-
+def render(sim, agent, position, rotation):
+    """将智能体放到给定位置和朝向并渲染一帧"""
     new_state = habitat_sim.AgentState()
-    new_state.position = transform["position"]
-    new_state.rotation = transform["rotation"]
+    new_state.position = position
+    new_state.rotation = rotation
 
     agent.set_state(new_state)
     obs = sim.get_sensor_observations()
 
     # 图像处理
     frame = obs["rgb"]
+    if SENSOR_MODE == "model":
+        return letterbox(frame)
+
     frame = np.flipud(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
     frame = frame[:, ::-1, :]
 
-    return frame
\ No newline at end of file
+    return frame
+
+
+def get_img(pose, sim, agent):
+    """根据位姿 [x, y, z, yaw] 获取图像 (也接受原有的坐标文件路径)"""
+    if isinstance(pose, str):
+        transform = load_position(file_path=pose)
+    else:
+        transform = load_position(pose=pose)
+    return render(sim, agent, transform["position"], transform["rotation"])
+
+
+def get_imgs(poses, sim, agent):
+    """批量渲染多个位姿 (N x 4), 位姿转换一次完成"""
+    positions, rotations = poses_to_states(poses)
+    return [render(sim, agent, Vector3(*position.tolist()), rotation.tolist())
+            for position, rotation in zip(positions, rotations)]
@@ -0,0 +1,108 @@
+import os
+import sys
+import csv
+import json
+import glob
+from collections import defaultdict
+import numpy as np
+from tracing import TRACE_DIR
+
+# 配置
+DEFAULT_TRACE_DIR = TRACE_DIR or os.path.join("shared_folder", "traces")
+PERCENTILES = [50, 95, 99]
+# 往返耗时减去对端处理耗时, 得到传输和排队的开销 (文件轮询, 等待批处理等)
+OVERHEAD_STAGES = {
+    "overhead.sim_hop": ("controller.sim_roundtrip", ["sim.process"]),
+    "overhead.model_hop": ("controller.model_roundtrip", ["model.prepare", "model.infer"]),
+}
+
+
+def load_events(trace_dir):
+    """读取目录下所有进程的事件文件"""
+    events = []
+    for file_path in sorted(glob.glob(os.path.join(trace_dir, "*.jsonl"))):
+        with open(file_path, 'r') as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return events
+
+
+def collect_durations(events):
+    """按 (阶段, episode_key, step) 汇总span耗时 (毫秒)
+
+    不属于任何episode的span (如文件搬运) 各自单独统计, 键中的step为事件序号
+    """
+    durations = defaultdict(float)
+    for i, event in enumerate(events):
+        if event.get("ph") != "X":
+            continue
+        args = event.get("args", {})
+        episode_key = args.get("episode_key", "")
+        step = args.get("step") if episode_key else i
+        durations[(event["name"], episode_key, step)] += event["dur"] / 1000
+
+    for stage, (roundtrip, parts) in OVERHEAD_STAGES.items():
+        for (name, episode_key, step), value in list(durations.items()):
+            if name != roundtrip:
+                continue
+            inner = sum(durations.get((part, episode_key, step), 0.0) for part in parts)
+            durations[(stage, episode_key, step)] = max(value - inner, 0.0)
+    return durations
+
+
+def summarize(values):
+    values = np.asarray(values)
+    row = {"count": len(values), "mean_ms": values.mean(), "total_ms": values.sum()}
+    for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        row[f"p{p}_ms"] = v
+    row["max_ms"] = values.max()
+    return row
+
+
+def write_csv(file_path, rows):
+    with open(file_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: round(v, 3) if isinstance(v, float) else v for k, v in row.items()})
+
+
+def main():
+    trace_dir = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_TRACE_DIR
+    events = load_events(trace_dir)
+    if not events:
+        print(f"没有找到追踪事件: {trace_dir}")
+        return
+
+    # 合并为Chrome trace (chrome://tracing 或 ui.perfetto.dev 打开)
+    trace_file = os.path.join(trace_dir, "trace.json")
+    with open(trace_file, 'w') as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    durations = collect_durations(events)
+    by_stage = defaultdict(list)
+    by_episode = defaultdict(list)
+    for (stage, episode_key, _), value in durations.items():
+        by_stage[stage].append(value)
+        if episode_key:
+            by_episode[(episode_key, stage)].append(value)
+
+    stage_rows = [dict(stage=stage, **summarize(values)) for stage, values in sorted(by_stage.items())]
+    episode_rows = [dict(episode_key=episode_key, stage=stage, **summarize(values))
+                    for (episode_key, stage), values in sorted(by_episode.items())]
+    write_csv(os.path.join(trace_dir, "stage_summary.csv"), stage_rows)
+    write_csv(os.path.join(trace_dir, "episode_summary.csv"), episode_rows)
+
+    print(f"{'stage':<28} {'count':>7} {'mean_ms':>9} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'max_ms':>9}")
+    for row in stage_rows:
+        print(f"{row['stage']:<28} {row['count']:>7} {row['mean_ms']:9.2f} {row['p50_ms']:9.2f} "
+              f"{row['p95_ms']:9.2f} {row['p99_ms']:9.2f} {row['max_ms']:9.2f}")
+    print(f"\nChrome trace: {trace_file}")
+    print(f"统计结果: stage_summary.csv, episode_summary.csv ({len(set(k for k, _ in by_episode))} 个episode)")
+
+
+if __name__ == "__main__":
+    main()
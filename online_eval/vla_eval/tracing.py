@@ -0,0 +1,99 @@
+import os
+import json
+import time
+from contextlib import contextmanager
+
+# 配置
+# 设为目录路径时开启追踪, 每个进程在该目录下写一个事件文件, 用 trace_report.py 合并和统计
+TRACE_DIR = os.environ.get("UAV_EVAL_TRACE", "")
+FLUSH_EVERY = 100  # 缓存的事件数达到该值时写入文件
+
+_tracer = None
+
+
+class Tracer:
+    """记录一个进程的追踪span (Chrome trace 的 "X" 事件, 每行一个json)
+
+    每个span带有 episode_key 和 step, 不同进程的span按二者关联.
+    同一进程中每个episode使用单独的tid, 在trace查看器中各占一行.
+    """
+
+    def __init__(self, process_name, trace_dir=TRACE_DIR):
+        self.process_name = process_name
+        self.pid = os.getpid()
+        self.tids = {}  # episode_key -> tid
+        self.events = []
+        os.makedirs(trace_dir, exist_ok=True)
+        self.file = open(os.path.join(trace_dir, f"{process_name}_{self.pid}.jsonl"), 'a')
+        self._metadata("process_name", 0, process_name)
+
+    def _metadata(self, name, tid, value):
+        self.events.append({"name": name, "ph": "M", "pid": self.pid, "tid": tid, "args": {"name": value}})
+
+    def _tid(self, episode_key):
+        if episode_key not in self.tids:
+            self.tids[episode_key] = len(self.tids) + 1
+            self._metadata("thread_name", self.tids[episode_key], episode_key or self.process_name)
+        return self.tids[episode_key]
+
+    def record(self, name, start, end, episode_key="", step=None, **args):
+        """记录一个已结束的span, start/end 为 time.time() 时间戳"""
+        self.events.append({
+            "name": name,
+            "cat": self.process_name,
+            "ph": "X",
+            "ts": start * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": self.pid,
+            "tid": self._tid(episode_key),
+            "args": dict(args, episode_key=episode_key, step=step),
+        })
+        if len(self.events) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        for event in self.events:
+            self.file.write(json.dumps(event) + "\n")
+        self.file.flush()
+        self.events = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def init(process_name):
+    """为当前进程开启追踪 (未设置 UAV_EVAL_TRACE 时不做任何事)"""
+    global _tracer
+    if TRACE_DIR and _tracer is None:
+        _tracer = Tracer(process_name)
+
+
+def enabled():
+    return _tracer is not None
+
+
+def record(name, start, end, episode_key="", step=None, **args):
+    if _tracer is not None:
+        _tracer.record(name, start, end, episode_key, step, **args)
+
+
+@contextmanager
+def span(name, episode_key="", step=None, **args):
+    """追踪一段代码的耗时, 未开启追踪时只有一次判断的开销"""
+    if _tracer is None:
+        yield
+        return
+
+    start = time.time()
+    try:
+        yield
+    finally:
+        _tracer.record(name, start, time.time(), episode_key, step, **args)
+
+
+def close():
+    global _tracer
+    if _tracer is not None:
+        _tracer.close()
+        _tracer = None
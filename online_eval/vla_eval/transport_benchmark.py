@@ -0,0 +1,85 @@
+import time
+import shutil
+import tempfile
+import multiprocessing
+import numpy as np
+from transport import create_transport
+
+# 配置
+BACKENDS = ["file", "socket"]
+NUM_ROUNDS = 100
+HOPS = ["controller->sim", "sim->controller", "controller->model", "model->controller"]
+
+
+def echo_worker(name, backend, shared_folder, ready):
+    """模拟 sim/model 服务: 收到消息后打上时间戳原样回复"""
+    transport = create_transport(name, backend, shared_folder)
+    ready.set()
+    try:
+        while True:
+            for source, data in transport.recv():
+                if data.get("action") == "stop":
+                    return
+                data["echo_time"] = time.time()
+                transport.send(source, data)
+    finally:
+        transport.close()
+
+
+def run_backend(backend, num_rounds=NUM_ROUNDS):
+    """测量单个后端每一跳的延迟 (毫秒)"""
+    shared_folder = tempfile.mkdtemp(prefix="transport_bench_")
+    latencies = {hop: [] for hop in HOPS}
+    controller = create_transport("controller", backend, shared_folder)
+    workers = []
+
+    try:
+        for name in ["sim", "model"]:
+            ready = multiprocessing.Event()
+            worker = multiprocessing.Process(target=echo_worker, args=(name, backend, shared_folder, ready))
+            worker.start()
+            ready.wait()
+            workers.append(worker)
+
+        for i in range(num_rounds):
+            for target in ["sim", "model"]:
+                controller.send(target, {"round": i, "send_time": time.time()})
+
+                replies = []
+                while not replies:
+                    replies = controller.recv(timeout=1.0)
+                recv_time = time.time()
+                _, data = replies[0]
+
+                latencies[f"controller->{target}"].append((data["echo_time"] - data["send_time"]) * 1000)
+                latencies[f"{target}->controller"].append((recv_time - data["echo_time"]) * 1000)
+
+        for target in ["sim", "model"]:
+            controller.send(target, {"action": "stop"})
+        for worker in workers:
+            worker.join(timeout=5)
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        controller.close()
+        shutil.rmtree(shared_folder, ignore_errors=True)
+
+    return latencies
+
+
+def main():
+    print(f"传输层基准测试: 每个后端 {NUM_ROUNDS} 轮 (controller -> sim -> controller -> model -> controller)")
+    print(f"{'backend':<8} {'hop':<20} {'mean_ms':>9} {'p50_ms':>9} {'p95_ms':>9} {'max_ms':>9}")
+    for backend in BACKENDS:
+        latencies = run_backend(backend)
+        for hop in HOPS:
+            values = np.array(latencies[hop])
+            print(f"{backend:<8} {hop:<20} {values.mean():9.3f} {np.percentile(values, 50):9.3f} "
+                  f"{np.percentile(values, 95):9.3f} {values.max():9.3f}")
+        step_ms = sum(np.mean(latencies[hop]) for hop in HOPS)
+        print(f"{backend:<8} {'step_total':<20} {step_ms:9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import threading
+import time
+from transport import SocketTransport
+
+NUM_MESSAGES = 50  # 超过 net.unix.max_dgram_qlen (默认10)
+
+
+def test_socket_burst_to_busy_receiver(tmp_path):
+    """接收方暂时不取消息时, 连续发送的消息全部送达且顺序不变"""
+    model = SocketTransport("model", str(tmp_path))
+    controller = SocketTransport("controller", str(tmp_path))
+    try:
+        # recv 取到消息后会把接收套接字切换为非阻塞, 之后的发送不应受影响
+        controller.send("model", {"step": -1})
+        model.recv(timeout=1.0)
+        model.recv(timeout=0.001)
+
+        sent = []
+        sender = threading.Thread(
+            target=lambda: sent.extend(model.send("controller", {"step": i}) for i in range(NUM_MESSAGES)))
+        sender.start()
+        time.sleep(0.2)  # 此时接收方队列已满, 发送方在等待
+
+        received = []
+        deadline = time.monotonic() + 10
+        while len(received) < NUM_MESSAGES and time.monotonic() < deadline:
+            received += controller.recv(timeout=0.1)
+        sender.join(timeout=10)
+
+        assert not sender.is_alive()
+        assert len(sent) == NUM_MESSAGES
+        assert received == [("model", {"step": i}) for i in range(NUM_MESSAGES)]
+    finally:
+        model.close()
+        controller.close()
@@ -5,20 +5,39 @@ import glob
 import numpy as np
 from magnum import Vector3, Quaternion, Rad
 from scipy.spatial.transform import Rotation
+import scene_index
+from scene_index import SCENE_DATASETS_BASE
+from posture_store import load_poses
+
+_glb_paths = {}  # 进程内缓存 (group, scene) -> glb路径
 
 
 def get_glb_path(group, scene):
-    """根据group和scene获取glb路径"""
+    """根据group和scene获取glb路径
+
+    优先查场景索引 (scene_index.py, 一次扫描后缓存在磁盘上), 索引中没有时按数据集目录规则查找,
+    结果在进程内缓存.
+    """
+    if (group, scene) not in _glb_paths:
+        glb_path = scene_index.lookup(group, scene)
+        if glb_path is None:
+            glb_path = resolve_glb_path(group, scene)
+        _glb_paths[(group, scene)] = glb_path
+    return _glb_paths[(group, scene)]
+
+
+def resolve_glb_path(group, scene):
+    """按数据集目录规则查找glb路径 (hm3d需要在数据集目录中搜索)"""
     # 处理 group 中的数字部分 (如 hm3d_14)
     group_parts = group.split('_')
     dataset_type = group_parts[0]
 
     if dataset_type == 'mp3d':
-        return f"/data1/liuy/scene_datasets/mp3d/{scene}/{scene}.glb"
+        return f"{SCENE_DATASETS_BASE}/mp3d/{scene}/{scene}.glb"
     elif dataset_type == 'gibson':
-        return f"/data1/liuy/scene_datasets/gibson/{scene}.glb"
+        return f"{SCENE_DATASETS_BASE}/gibson/{scene}.glb"
     elif dataset_type == 'hm3d':
-        base_path = f"/data1/liuy/scene_datasets/hm3d"
+        base_path = f"{SCENE_DATASETS_BASE}/hm3d"
 
         if not os.path.exists(base_path):
             raise FileNotFoundError(f"HM3D数据集路径不存在: {base_path}")
@@ -49,7 +68,7 @@ def get_glb_path(group, scene):
 
         return glb_file
     elif dataset_type == 'replica':
-        return f"/data1/liuy/scene_datasets/replica/{scene}/habitat/mesh_preseg_semantic.ply"
+        return f"{SCENE_DATASETS_BASE}/replica/{scene}/habitat/mesh_preseg_semantic.ply"
     else:
         raise ValueError(f"未知的group类型: {group}")
 
@@ -90,30 +109,14 @@ def is_success(current_coords, target_coords, pos_threshold=0.1, angle_threshold
 
 
 def load_posture(posture_path, start_idx, end_idx):
-    """从posture.json加载起始帧和结束帧的坐标"""
-    with open(posture_path, 'r') as f:
-        posture_data = json.load(f)
+    """加载起始帧和结束帧的坐标 [x, y, z, angle(弧度)], 有位姿存储时不再读取posture.json"""
+    posture_data = load_poses(posture_path)
 
     # 确保索引在有效范围内
     start_idx = max(0, min(start_idx, len(posture_data) - 1))
     end_idx = max(0, min(end_idx, len(posture_data) - 1))
 
-    start_frame = posture_data[start_idx]
-    end_frame = posture_data[end_idx]
-    start_frame[3] = start_frame[3]/180*np.pi
-    end_frame[3] = end_frame[3]/180*np.pi
-    # 确保坐标格式为 [x, y, z, angle]
-    if len(start_frame) == 4:
-        start_coords = start_frame
-    else:
-        start_coords = [start_frame[0], start_frame[1], start_frame[2], 0.0]
-
-    if len(end_frame) == 4:
-        end_coords = end_frame
-    else:
-        end_coords = [end_frame[0], end_frame[1], end_frame[2], 0.0]
-
-    return start_coords, end_coords
+    return posture_data[start_idx].tolist(), posture_data[end_idx].tolist()
 
 
 def parse_transform_matrix(numbers):
@@ -128,32 +131,36 @@ def parse_transform_matrix(numbers):
     }
 
 
-def load_position(file_path):
-    """从文件加载位置信息并转换为变换矩阵"""
-    with open(file_path, 'r') as f:
-        data = json.load(f)
-
-    action = data['action']
-    a = action[3]
-    x, y, z = action[:3]
-
-    # 精度处理
-    x = round(x, 6)
-    y = round(y, 6)
-    z = round(z, 2)
-    sin_a = round(np.sin(a), 6)
-    cos_a = round(np.cos(a), 6)
-
-    # 构建变换矩阵数据
-    data_str = [
-        cos_a, 0, sin_a, 0,
-        0, 1, 0, 0,
-        -sin_a, 0, cos_a, 0,
-        x, 0, y, 1,
-        1, 0, 0, 0,
-        0, 1, 0, 0,
-        0, 0, 1, 0,
-        0, z, 0, 1
-    ]
-
-    return parse_transform_matrix(data_str)
\ No newline at end of file
+def poses_to_states(poses):
+    """将位姿 [x, y, z, yaw] 批量转换为模拟器中智能体的位置和旋转
+
+    poses: 单个位姿或 N x 4 数组 (yaw为弧度, 绕竖直轴旋转)
+    返回 positions (N x 3, 模拟器坐标 [x, z + 1.5, y]) 和 rotations (N x 4 四元数, [w, x, y, z])
+    与 load_position 原先通过变换矩阵计算的结果一致 (包括坐标的精度处理)
+    """
+    poses = np.atleast_2d(np.asarray(poses, dtype=np.float64))
+    x = np.round(poses[:, 0], 6)
+    y = np.round(poses[:, 1], 6)
+    z = np.round(poses[:, 2], 2)
+    half_yaw = poses[:, 3] / 2
+    zeros = np.zeros(len(poses))
+
+    positions = np.stack([x, z + 1.5, y], axis=1)
+    rotations = np.stack([np.cos(half_yaw), zeros, np.sin(half_yaw), zeros], axis=1)
+    return positions, rotations
+
+
+def load_position(file_path=None, pose=None):
+    """加载位姿并转换为模拟器中的位置和旋转
+
+    pose: 位姿 [x, y, z, yaw]; 未给出时从 file_path 中读取 ({"action": [x, y, z, yaw]})
+    """
+    if pose is None:
+        with open(file_path, 'r') as f:
+            pose = json.load(f)['action']
+
+    positions, rotations = poses_to_states(pose[:4])
+    return {
+        "position": Vector3(*positions[0].tolist()),
+        "rotation": rotations[0].tolist()
+    }
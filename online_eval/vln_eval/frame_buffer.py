@@ -0,0 +1,108 @@
+import os
+import numpy as np
+from action_chunk import CHUNK_STEPS
+
+# 配置
+# 帧环形缓冲区所在目录, 优先使用内存文件系统 /dev/shm
+FRAME_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else "shared_folder"
+# 设为1时模拟器额外把每一帧保存为PNG (仅用于调试)
+SAVE_IMAGES = os.environ.get("UAV_EVAL_SAVE_IMAGES", "0") == "1"
+HEADER_SIZE = 4096  # 文件头: 每个槽位一个int64序号, 数据区按页对齐
+
+
+def ring_size(chunk_steps):
+    """每个模拟器进程的缓冲帧数
+
+    VLN在指令更新时以当前帧作为参考图像, 该帧要在下一次推理时仍然有效; 动作块模式下两次推理之间
+    模拟器写入 chunk_steps 帧, 因此至少需要 chunk_steps+1 个槽位 (再留一个余量).
+    """
+    return max(4, chunk_steps + 2)
+
+
+# 按 UAV_EVAL_CHUNK_STEPS 确定, 模拟器进程需要与控制器使用相同的设置
+FRAME_RING_SIZE = ring_size(CHUNK_STEPS)
+
+
+class FrameRing:
+    """模拟器写入端: 将RGB帧写入内存映射文件中的环形缓冲区
+
+    write() 返回一个可以放进消息里的帧句柄 (dict), 模型进程用 FrameReader 按句柄读取.
+    """
+
+    def __init__(self, name, frame_dir=FRAME_DIR, num_slots=FRAME_RING_SIZE):
+        self.name = name
+        self.frame_dir = frame_dir
+        self.num_slots = num_slots
+        self.path = None
+        self.shape = None
+        self.seqs = None
+        self.frames = None
+        self.next_seq = 1  # 序号0表示槽位尚未写入
+
+    def _open(self, shape):
+        """按帧尺寸创建缓冲区文件, 尺寸变化时换一个新文件 (读取端仍持有的旧映射不受影响)"""
+        self.close()
+        os.makedirs(self.frame_dir, exist_ok=True)
+        self.path = os.path.join(self.frame_dir, f"uav_eval_{self.name}_{os.getpid()}_{self.next_seq}.frames")
+        self.shape = tuple(shape)
+        with open(self.path, 'wb') as f:
+            f.truncate(HEADER_SIZE + self.num_slots * int(np.prod(self.shape)))
+        self.seqs = np.memmap(self.path, dtype=np.int64, mode='r+', shape=(self.num_slots,))
+        self.frames = np.memmap(self.path, dtype=np.uint8, mode='r+', offset=HEADER_SIZE,
+                                shape=(self.num_slots,) + self.shape)
+
+    def write(self, frame):
+        """写入一帧 (HxWx3 uint8 RGB), 返回帧句柄"""
+        if self.frames is None or tuple(frame.shape) != self.shape:
+            self._open(frame.shape)
+
+        seq = self.next_seq
+        self.next_seq += 1
+        slot = seq % self.num_slots
+        self.frames[slot] = frame
+        self.seqs[slot] = seq
+        return {"path": self.path, "slot": slot, "seq": seq, "shape": list(self.shape)}
+
+    def close(self):
+        if self.path is None:
+            return
+        self.seqs = None
+        self.frames = None
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+
+class FrameReader:
+    """模型读取端: 按帧句柄返回缓冲区中的帧 (只读NumPy视图, 不复制)"""
+
+    def __init__(self):
+        self.buffers = {}  # (路径, 帧尺寸) -> (序号数组, 帧数组)
+
+    def _buffer(self, handle):
+        key = (handle["path"], tuple(handle["shape"]))
+        if key not in self.buffers:
+            # 写入端换了新文件时, 丢弃已失效的旧映射
+            for old_key in [k for k in self.buffers if not os.path.exists(k[0])]:
+                del self.buffers[old_key]
+            shape = tuple(handle["shape"])
+            num_slots = (os.path.getsize(handle["path"]) - HEADER_SIZE) // int(np.prod(shape))
+            seqs = np.memmap(handle["path"], dtype=np.int64, mode='r', shape=(num_slots,))
+            frames = np.memmap(handle["path"], dtype=np.uint8, mode='r', offset=HEADER_SIZE,
+                               shape=(num_slots,) + shape)
+            self.buffers[key] = (seqs, frames)
+        return self.buffers[key]
+
+    def read(self, handle):
+        """返回句柄对应的帧, 帧已被覆盖或缓冲区不存在时返回None"""
+        try:
+            seqs, frames = self._buffer(handle)
+        except (OSError, ValueError) as e:
+            print(f"读取帧缓冲区失败: {str(e)}")
+            return None
+
+        slot = handle["slot"]
+        if seqs[slot] != handle["seq"]:
+            print(f"警告: 帧 {handle['seq']} 已被覆盖")
+            return None
+        return frames[slot]
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from action_chunk import ChunkExecutor, ACTION_HORIZON
+from frame_buffer import FrameRing, FrameReader, ring_size
+
+
+@pytest.mark.parametrize("chunk_steps", [4, 6, ACTION_HORIZON])
+def test_ref_frame_survives_chunk(tmp_path, chunk_steps):
+    """动作块模式下指令更新时记录的参考帧, 在执行完k个航点后的下一次推理时仍可读取"""
+    rng = np.random.default_rng(0)
+    ring = FrameRing("test", frame_dir=str(tmp_path), num_slots=ring_size(chunk_steps))
+    reader = FrameReader()
+    executor = ChunkExecutor(chunk_steps=chunk_steps)
+
+    # 推理时指令更新, 当前帧成为参考帧
+    ref_image = rng.integers(0, 256, (8, 8, 3), dtype=np.uint8)
+    ref_frame = ring.write(ref_image)
+    for _ in range(3):
+        executor.add_chunk(rng.normal(size=(ACTION_HORIZON, 4)))
+        # 控制器逐个执行航点, 模拟器每个航点写入一帧, 执行完k个航点后再推理
+        while True:
+            executor.next_waypoint()
+            current_frame = ring.write(rng.integers(0, 256, (8, 8, 3), dtype=np.uint8))
+            if executor.needs_replan():
+                break
+        assert current_frame["seq"] - ref_frame["seq"] == chunk_steps
+        # 下一次推理读取参考帧 (模型读取后复制缓存, 之后不再依赖缓冲区)
+        assert np.array_equal(reader.read(ref_frame), ref_image)
+        ref_image = np.array(reader.read(current_frame))
+        ref_frame = current_frame
+    ring.close()
@@ -1,130 +1,155 @@
 import os
-import json
 import time
+from collections import OrderedDict
 import numpy as np
 from PIL import Image
+from transport import create_transport, POLL_INTERVAL
+from frame_buffer import FrameReader
+from model_config import MODEL_CONFIG, CHECKPOINT_DIR
+import tracing
 
 
 # 初始化模型
 def init_model():
+    import dataclasses
     from openpi.training import config
     from openpi.policies import policy_config
 
-    config = config.get_config("pi0_uav_low_mem_finetune")
-    checkpoint_dir = "/data1/liuy/pi0_ck/pi0_uav_low_mem_finetune/15k_2/29999"
-    return policy_config.create_trained_policy(config, checkpoint_dir)
+    config = config.get_config(MODEL_CONFIG)
+    checkpoint_dir = CHECKPOINT_DIR
+    if PREFIX_CACHE_SIZE:
+        # 参考图像在一个episode内不变, 与指令一起放在前缀最前面, 其KV跨步复用
+        config = dataclasses.replace(config, model=dataclasses.replace(config.model, static_image_keys=("left_wrist_0_rgb",)))
+    # 启动时编译每个批大小, 第一批请求不会因为编译而等待; 编译结果按配置、checkpoint和jax版本缓存在磁盘上,
+    # 重启时直接读取
+    start_time = time.time()
+    policy = policy_config.create_trained_policy(config, checkpoint_dir, batch_buckets=BATCH_BUCKETS, precompile=True,
+                                                 compilation_cache_dir=COMPILATION_CACHE_DIR or None,
+                                                 prefix_cache_size=PREFIX_CACHE_SIZE)
+    print(f"模型加载和编译耗时 {time.time() - start_time:.1f}s")
+    return policy
 
 
 def infer(policy, inputs):
     return policy.infer(inputs)["actions"]
 
 
-policy = init_model()
+def infer_batch(policy, inputs_list, batch_size):
+    """一次模型调用推理多条输入, 不足 batch_size 的部分由 policy 填充"""
+    return [output["actions"] for output in policy.infer_batch(inputs_list, batch_size=batch_size)]
+
 
 # 配置
-SHARED_FOLDER = "shared_folder"
-MODEL_INPUT_DIR = os.path.join(SHARED_FOLDER, "model_input")
-MODEL_OUTPUT_DIR = os.path.join(SHARED_FOLDER, "model_output")
-INSTRUCTIONS_DIR = os.path.join(SHARED_FOLDER, "instructions")
-os.makedirs(MODEL_INPUT_DIR, exist_ok=True)
-os.makedirs(MODEL_OUTPUT_DIR, exist_ok=True)
-os.makedirs(INSTRUCTIONS_DIR, exist_ok=True)
+REF_IMAGE_CACHE_SIZE = 64  # 缓存的参考图像数量 (多个episode同时运行时各自使用自己的参考图像)
+# 批大小只取这些固定值, 避免JAX为每个新的批大小重新编译
+BATCH_BUCKETS = (1, 2, 4, 8)
+MAX_BATCH_SIZE = BATCH_BUCKETS[-1]
+BATCH_WINDOW = 0.02  # 收到第一条请求后继续等待其他episode请求的时间 (秒)
+# 编译结果的持久缓存目录, 设为空字符串时关闭
+COMPILATION_CACHE_DIR = os.environ.get("UAV_EVAL_COMPILATION_CACHE", "~/.cache/jax")
+# 参考图像+指令前缀的KV缓存条目数, 0为关闭. 开启后参考图像和指令不再关注当前帧, 注意力布局与训练时不同,
+# 未按此布局微调的checkpoint输出会有偏差 (用 openpi/scripts/benchmark_prefix_cache.py 测量)
+PREFIX_CACHE_SIZE = int(os.environ.get("UAV_EVAL_PREFIX_CACHE", "0"))
 
+policy = init_model()
 
-class ModelService:
-    def __init__(self):
-        self.current_episode = None
-        self.instruction = None
-        self.end_coords = None
-        self.ref_image_array = None
-        self.last_ref_image_path = None
-        self.last_instruction_mtime = 0  # 跟踪上次加载的时间戳
 
-    def load_instruction(self):
-        """加载当前指令并更新参考图像"""
-        instruction_file = os.path.join(INSTRUCTIONS_DIR, "current_instruction.json")
-        if not os.path.exists(instruction_file):
-            return
+def bucket_size(num_inputs):
+    """不小于 num_inputs 的最小批大小"""
+    for size in BATCH_BUCKETS:
+        if size >= num_inputs:
+            return size
+    return MAX_BATCH_SIZE
 
-        # 获取文件修改时间
-        current_mtime = os.path.getmtime(instruction_file)
 
-        # 检查文件是否已更新
-        if current_mtime <= self.last_instruction_mtime:
-            return
+class ModelService:
+    """按episode_key处理推理请求, 当前指令和参考图像随每条请求一起发送"""
 
-        self.last_instruction_mtime = current_mtime
+    def __init__(self):
+        self.ref_images = OrderedDict()  # 参考图像路径 -> 图像数组 (LRU)
+        self.frame_reader = FrameReader()  # 读取模拟器写入共享内存的帧
+
+    def cache_ref_image(self, key, ref_image_array):
+        self.ref_images[key] = ref_image_array
+        if len(self.ref_images) > REF_IMAGE_CACHE_SIZE:
+            self.ref_images.popitem(last=False)
+
+    def load_ref_frame(self, ref_frame):
+        """加载来自模拟器帧缓冲区的参考图像, 复制一份缓存, 之后缓冲区槽位被覆盖也不受影响"""
+        key = f"{ref_frame['path']}#{ref_frame['seq']}"
+        if key in self.ref_images:
+            self.ref_images.move_to_end(key)
+            return self.ref_images[key]
+
+        frame = self.frame_reader.read(ref_frame)
+        if frame is None:
+            print(f"警告: 参考帧不可用: {ref_frame['seq']}")
+            return None
+
+        ref_image_array = np.array(frame)
+        print(f"加载参考帧: {ref_frame['seq']}")
+        self.cache_ref_image(key, ref_image_array)
+        return ref_image_array
+
+    def load_ref_image(self, ref_image_path, ref_frame=None):
+        """加载参考图像, 已加载过的图像直接从缓存返回"""
+        if ref_frame:
+            return self.load_ref_frame(ref_frame)
+
+        if not ref_image_path:
+            print("警告: 缺少参考图像路径")
+            return None
+
+        if ref_image_path in self.ref_images:
+            self.ref_images.move_to_end(ref_image_path)
+            return self.ref_images[ref_image_path]
+
+        if not os.path.exists(ref_image_path):
+            print(f"警告: 参考图像不存在: {ref_image_path}")
+            return None
 
         try:
-            with open(instruction_file, 'r') as f:
-                data = json.load(f)
-                print(f"加载指令文件: {data.get('episode_key', 'unknown')}")
-
-            # 检查是否是新episode
-            if self.current_episode != data.get("episode_key"):
-                self.current_episode = data.get("episode_key")
-                self.instruction = data.get("instruction")
-                self.end_coords = data.get("end_coords")
-                self.last_ref_image_path = None
-                print(f"新episode: {self.current_episode}")
-            else:
-                # 检查指令是否更新
-                new_instruction = data.get("instruction")
-                if new_instruction and new_instruction != self.instruction:
-                    self.instruction = new_instruction
-                    print(f"指令更新: {self.instruction}")
-
-            # 获取参考图像路径
-            ref_image_path = data.get("ref_image_path", data.get("start_image_path"))
-
-            # 检查是否有新的参考图像路径
-            if ref_image_path and ref_image_path != self.last_ref_image_path:
-                self.last_ref_image_path = ref_image_path
-
-                # 加载参考图像
-                if os.path.exists(ref_image_path):
-                    try:
-                        ref_img = Image.open(ref_image_path).convert('RGB')
-                        self.ref_image_array = np.asarray(ref_img, dtype=np.uint8)
-                        print(f"更新参考图像: {os.path.basename(ref_image_path)}")
-                    except Exception as e:
-                        print(f"加载参考图像失败: {str(e)}")
-                        self.ref_image_array = None
-                else:
-                    print(f"警告: 参考图像不存在: {ref_image_path}")
-                    self.ref_image_array = None
+            ref_img = Image.open(ref_image_path).convert('RGB')
+            ref_image_array = np.asarray(ref_img, dtype=np.uint8)
+            print(f"加载参考图像: {os.path.basename(ref_image_path)}")
         except Exception as e:
-            print(f"加载指令文件失败: {str(e)}")
+            print(f"加载参考图像失败: {str(e)}")
+            return None
 
-    def process_file(self, file_path):
-        try:
-            # 在每次处理前加载最新指令
-            self.load_instruction()
+        self.cache_ref_image(ref_image_path, ref_image_array)
+        return ref_image_array
 
-            # 如果没有有效指令，跳过处理
-            if not self.instruction:
-                print("警告: 没有有效指令，跳过处理")
-                return False
+    def load_image(self, frame, image_path):
+        """读取当前图像: 优先按帧句柄从共享内存读取 (不复制), 否则读取调试PNG"""
+        if frame:
+            return self.frame_reader.read(frame)
+
+        if not image_path or not os.path.exists(image_path):
+            print(f"图像文件不存在: {image_path}")
+            return None
 
-            with open(file_path, 'r') as f:
-                data = json.load(f)
+        img = Image.open(image_path).convert('RGB')
+        return np.asarray(img, dtype=np.uint8)
 
+    def prepare_example(self, data):
+        """将一条控制器消息转换为模型输入, 消息无效时返回None"""
+        try:
             episode_key = data.get("episode_key", "")
             image_path = data.get("image_path", "")
             coordinates = data.get("coordinates", [])
+            instruction = data.get("instruction")
+
+            # 如果没有有效指令，跳过处理
+            if not instruction:
+                print(f"警告: 没有有效指令，跳过处理 ({episode_key})")
+                return None
 
-            # 检查是否匹配当前episode
-            if episode_key != self.current_episode:
-                print(f"忽略文件: 不属于当前episode ({episode_key} vs {self.current_episode})")
-                return False
+            ref_image_array = self.load_ref_image(data.get("ref_image_path"), data.get("ref_frame"))
 
             # 获取输入图像
-            if not os.path.exists(image_path):
-                print(f"图像文件不存在: {image_path}")
-                return False
-
-            img = Image.open(image_path).convert('RGB')
-            img_array = np.asarray(img, dtype=np.uint8)
+            img_array = self.load_image(data.get("frame"), image_path)
+            if img_array is None:
+                return None
 
             # 确保coordinates有4个元素
             if len(coordinates) < 4:
@@ -135,63 +160,115 @@ class ModelService:
             # 准备模型输入
             example = {
                 "observation/image": img_array,
-                "observation/ref_image": self.ref_image_array,
+                "observation/ref_image": ref_image_array,
                 "observation/state": state,
-                "task": self.instruction
+                "task": instruction
             }
 
-            # 执行推理
-            output_all = infer(policy, example)
-            output = output_all[9]
-            new_coords = output[:4].tolist()
-
-            # 保存模型输出
-            timestamp = time.time()
-            output_file = os.path.join(MODEL_OUTPUT_DIR, f"model_output_{timestamp}.json")
-            with open(output_file, 'w') as f:
-                json.dump({
-                    "episode_key": self.current_episode,
-                    "coordinates": new_coords
-                }, f)
-
-            print(f"推理完成 - 新坐标: {new_coords}")
-            return True
+            return example
 
         except Exception as e:
-            print(f"处理文件 {file_path} 出错: {str(e)}")
-            return False
-        finally:
-            # 清理输入文件
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            print(f"处理消息出错: {str(e)}")
+            return None
+
+    def make_reply(self, episode_key, output_all):
+        """coordinates 为动作块的最后一个航点 (逐步模式), waypoints 为整个动作块 (动作块模式)"""
+        waypoints = np.asarray(output_all)[:10, :4]  # action_horizon=10
+        new_coords = waypoints[-1].tolist()
+        print(f"推理完成 ({episode_key}) - 新坐标: {new_coords}")
+        return {
+            "episode_key": episode_key,
+            "coordinates": new_coords,
+            "waypoints": waypoints.tolist()
+        }
+
+    def process_batch(self, messages):
+        """一次批量推理处理多条消息 (来自不同episode), 返回 [(来源, 回复)]"""
+        requests = []
+        for source, data in messages:
+            episode_key = data.get("episode_key", "")
+            with tracing.span("model.prepare", episode_key, data.get("step")):
+                example = self.prepare_example(data)
+            if example is not None:
+                requests.append((source, episode_key, data.get("step"), example))
+
+        replies = []
+        for start in range(0, len(requests), MAX_BATCH_SIZE):
+            chunk = requests[start:start + MAX_BATCH_SIZE]
+            batch_size = bucket_size(len(chunk))
+            infer_start = time.time()
+            try:
+                outputs = infer_batch(policy, [example for _, _, _, example in chunk], batch_size)
+            except Exception as e:
+                # 某条输入无法与其他输入合并 (如缺少参考图像) 时逐条推理, 不影响其他episode
+                print(f"批量推理出错, 改为逐条推理: {str(e)}")
+                outputs = []
+                for _, episode_key, step, example in chunk:
+                    try:
+                        with tracing.span("model.infer", episode_key, step, batch_size=1, num_requests=1):
+                            outputs.append(infer(policy, example))
+                    except Exception as e:
+                        print(f"推理出错 ({episode_key}): {str(e)}")
+                        outputs.append(None)
+            else:
+                # 同一批中的每个episode各记录一个span, 便于按episode统计
+                infer_end = time.time()
+                for _, episode_key, step, _ in chunk:
+                    tracing.record("model.infer", infer_start, infer_end, episode_key, step,
+                                   batch_size=batch_size, num_requests=len(chunk))
+
+            for (source, episode_key, _, _), output_all in zip(chunk, outputs):
+                if output_all is not None:
+                    replies.append((source, self.make_reply(episode_key, output_all)))
+        return replies
+
+
+def collect_batch(transport):
+    """等待第一条请求, 然后在 BATCH_WINDOW 内继续收集, 直到达到 MAX_BATCH_SIZE"""
+    messages = transport.recv(timeout=POLL_INTERVAL)
+    if not messages:
+        return messages
+
+    deadline = time.monotonic() + BATCH_WINDOW
+    while len(messages) < MAX_BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        messages += transport.recv(timeout=remaining)
+    return messages
+
+
+def send_reply(transport, target, reply):
+    """发送一条回复, 失败时 (如控制器已退出) 只记录错误, 服务继续运行"""
+    try:
+        transport.send(target, reply)
+    except OSError as e:
+        print(f"回复 {target} 失败 ({reply.get('episode_key', '')}): {str(e)}")
 
 
 def main():
     print("模型推理服务启动...")
     model_service = ModelService()
+    transport = create_transport("model")
+    tracing.init("model")
+    first_request_reported = False
 
     try:
         while True:
-            # 定期检查指令更新
-            model_service.load_instruction()
-
-            # 检查输入目录
-            processed = False
-            for file_name in os.listdir(MODEL_INPUT_DIR):
-                if not file_name.endswith('.json'):
-                    continue
-
-                file_path = os.path.join(MODEL_INPUT_DIR, file_name)
-                if model_service.process_file(file_path):
-                    processed = True
-
-            # 如果没有处理任何文件，等待一会儿
-            if not processed:
-                time.sleep(0.1)
+            # 等待控制器消息并合并为一批 (无消息时最多阻塞 POLL_INTERVAL)
+            for source, reply in model_service.process_batch(collect_batch(transport)):
+                send_reply(transport, source, reply)
+            if not first_request_reported and "first_infer_ms" in policy.startup_timing:
+                print(f"首次推理耗时 {policy.startup_timing['first_infer_ms']:.0f}ms")
+                first_request_reported = True
 
     except KeyboardInterrupt:
         print("模型推理服务停止")
 
+    finally:
+        transport.close()
+        tracing.close()
+
 
 if __name__ == "__main__":
 
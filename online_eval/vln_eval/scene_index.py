@@ -0,0 +1,131 @@
+import os
+import json
+
+# 配置
+SCENE_DATASETS_BASE = "/data1/liuy/scene_datasets"
+# 场景索引文件 (group/scene -> glb路径), 不存在或数据集目录有变化时自动重建
+SCENE_MANIFEST_FILE = os.environ.get("UAV_EVAL_SCENE_MANIFEST", "scene_manifest.json")
+REPLICA_MESH = os.path.join("habitat", "mesh_preseg_semantic.ply")
+
+_manifest = None
+
+
+def _scan_dirs(path):
+    with os.scandir(path) as entries:
+        return sorted(entry.name for entry in entries if entry.is_dir())
+
+
+def _scan_files(path, suffix):
+    with os.scandir(path) as entries:
+        return sorted(entry.name for entry in entries if entry.is_file() and entry.name.endswith(suffix))
+
+
+def build_manifest(base=SCENE_DATASETS_BASE):
+    """扫描 mp3d / gibson / hm3d / replica 数据集, 建立场景索引
+
+    返回 {"scenes": {"数据集/场景": glb路径}, "dir_mtimes": {目录: mtime}},
+    dir_mtimes 记录扫描过的所有目录, 任一目录变化时索引失效.
+    """
+    scenes = {}
+    dir_mtimes = {}
+
+    def scanned(path):
+        dir_mtimes[path] = os.stat(path).st_mtime
+
+    mp3d_root = os.path.join(base, "mp3d")
+    if os.path.isdir(mp3d_root):
+        scanned(mp3d_root)
+        for scene in _scan_dirs(mp3d_root):
+            glb_file = os.path.join(mp3d_root, scene, f"{scene}.glb")
+            if os.path.exists(glb_file):
+                scenes[f"mp3d/{scene}"] = glb_file
+
+    gibson_root = os.path.join(base, "gibson")
+    if os.path.isdir(gibson_root):
+        scanned(gibson_root)
+        for file_name in _scan_files(gibson_root, ".glb"):
+            scenes[f"gibson/{file_name[:-len('.glb')]}"] = os.path.join(gibson_root, file_name)
+
+    # hm3d 的场景文件夹名为 "编号-场景名", 场景文件优先使用 {场景名}.basis.glb
+    hm3d_root = os.path.join(base, "hm3d")
+    if os.path.isdir(hm3d_root):
+        scanned(hm3d_root)
+        for folder in _scan_dirs(hm3d_root):
+            folder_path = os.path.join(hm3d_root, folder)
+            scanned(folder_path)
+            for file_name in _scan_files(folder_path, ".glb"):
+                if file_name.endswith(".semantic.glb"):
+                    continue
+                if file_name.endswith(".basis.glb"):
+                    scenes[f"hm3d/{file_name[:-len('.basis.glb')]}"] = os.path.join(folder_path, file_name)
+                else:
+                    scenes.setdefault(f"hm3d/{file_name[:-len('.glb')]}", os.path.join(folder_path, file_name))
+
+    replica_root = os.path.join(base, "replica")
+    if os.path.isdir(replica_root):
+        scanned(replica_root)
+        for scene in _scan_dirs(replica_root):
+            mesh_file = os.path.join(replica_root, scene, REPLICA_MESH)
+            if os.path.exists(mesh_file):
+                scenes[f"replica/{scene}"] = mesh_file
+
+    return {"base": base, "scenes": scenes, "dir_mtimes": dir_mtimes}
+
+
+def is_valid(manifest, base=SCENE_DATASETS_BASE):
+    """索引对应同一数据集根目录, 且扫描过的目录都没有变化"""
+    if manifest.get("base") != base:
+        return False
+    for path, mtime in manifest["dir_mtimes"].items():
+        try:
+            if os.stat(path).st_mtime != mtime:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def save_manifest(manifest, manifest_file=SCENE_MANIFEST_FILE):
+    tmp_file = manifest_file + ".tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_file, manifest_file)
+
+
+def load_manifest(manifest_file=SCENE_MANIFEST_FILE, base=SCENE_DATASETS_BASE):
+    """读取场景索引, 索引不存在或已失效时重新扫描并保存"""
+    manifest = None
+    if os.path.exists(manifest_file):
+        try:
+            with open(manifest_file, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"读取场景索引失败: {str(e)}")
+
+    if manifest is None or not is_valid(manifest, base):
+        print(f"建立场景索引: {base}")
+        manifest = build_manifest(base)
+        try:
+            save_manifest(manifest, manifest_file)
+        except OSError as e:
+            print(f"保存场景索引失败: {str(e)}")
+    return manifest
+
+
+def lookup(group, scene):
+    """在场景索引中查找glb路径, 找不到时返回None (每个进程只读取一次索引)"""
+    global _manifest
+    if _manifest is None:
+        _manifest = load_manifest()
+    dataset_type = group.split('_')[0]
+    return _manifest["scenes"].get(f"{dataset_type}/{scene}")
+
+
+if __name__ == "__main__":
+    manifest = build_manifest()
+    save_manifest(manifest)
+    counts = {}
+    for key in manifest["scenes"]:
+        dataset_type = key.split('/')[0]
+        counts[dataset_type] = counts.get(dataset_type, 0) + 1
+    print(f"场景索引已保存到 {SCENE_MANIFEST_FILE}: {counts}, 共记录 {len(manifest['dir_mtimes'])} 个目录")
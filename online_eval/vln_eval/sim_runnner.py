@@ -1,126 +1,188 @@
 import os
-import json
 import time
+import multiprocessing
+from collections import OrderedDict
 import cv2
 import numpy as np
 from test_sim import setup_simulator, get_img
+from transport import create_transport, sim_worker_name, NUM_SIM_WORKERS, POLL_INTERVAL
+from frame_buffer import FrameRing, SAVE_IMAGES
+import tracing
 from habitat_sim import Simulator
 from magnum import Vector3
 
 # 配置
 SHARED_FOLDER = "shared_folder"
-SIM_INPUT_DIR = os.path.join(SHARED_FOLDER, "sim_input")
-SIM_OUTPUT_DIR = os.path.join(SHARED_FOLDER, "sim_output")
 IMAGE_STORAGE = os.path.join(SHARED_FOLDER, "images")
-os.makedirs(SIM_INPUT_DIR, exist_ok=True)
-os.makedirs(SIM_OUTPUT_DIR, exist_ok=True)
 os.makedirs(IMAGE_STORAGE, exist_ok=True)
+# 每个模拟器进程除当前场景外最多保留的已加载场景数 (LRU); 默认0即切换场景时关闭旧场景
+# 每个Simulator都占用独立的显存和纹理, 开启前请确认显存足够容纳 SCENE_CACHE_SIZE+1 个场景
+SCENE_CACHE_SIZE = int(os.environ.get("UAV_EVAL_SCENE_CACHE_SIZE", "0"))
+
+
+class SceneCache:
+    """按glb路径缓存已加载的Simulator (LRU)
+
+    除当前场景外最多保留 max_cached 个场景, 加载新场景前先关闭最久未使用的场景,
+    因此同时存在的Simulator不超过 max_cached+1 个. max_cached=0 时切换场景即关闭旧场景.
+    """
+
+    def __init__(self, max_cached=SCENE_CACHE_SIZE):
+        self.max_cached = max_cached
+        self.sims = OrderedDict()  # glb路径 -> Simulator
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, glb_path):
+        """返回glb路径对应的Simulator, 未缓存时加载"""
+        if glb_path in self.sims:
+            self.hits += 1
+            self.sims.move_to_end(glb_path)
+            print(f"复用已加载的场景: {glb_path}")
+            return self.sims[glb_path]
+
+        self.misses += 1
+        # 先关闭多余的场景再加载, 避免新旧场景同时占用显存
+        while len(self.sims) > self.max_cached:
+            self.evict()
+        print(f"初始化模拟器: {glb_path}")
+        sim = setup_simulator(glb_path)
+        self.sims[glb_path] = sim
+        print(self.stats())
+        return sim
+
+    def evict(self):
+        glb_path, sim = self.sims.popitem(last=False)
+        sim.close()
+        self.evictions += 1
+        print(f"关闭场景: {glb_path}")
+
+    def stats(self):
+        return (f"场景缓存: {len(self.sims)}/{self.max_cached + 1} 个场景, "
+                f"命中 {self.hits}, 未命中 {self.misses}, 淘汰 {self.evictions}")
+
+    def close(self):
+        while self.sims:
+            _, sim = self.sims.popitem(last=False)
+            sim.close()
 
 
 class SimulatorService:
-    def __init__(self):
+    def __init__(self, name="sim"):
         self.sim = None
         self.agent = None
-        self.current_glb_path = None
+        self.scene_cache = SceneCache()
+        self.frame_ring = FrameRing(name)  # 渲染结果通过共享内存交给模型, 不再经过PNG
 
-    def process_file(self, file_path):
+    def process_message(self, data):
+        """处理一条控制器消息, 返回需要回复给控制器的消息 (无回复时返回None)"""
         try:
-            # 检查终止信号
-            if "terminate.json" in file_path:
-                print("收到终止信号，关闭模拟器")
-                if self.sim:
-                    self.sim.close()
-                    self.sim = None
-                os.remove(file_path)
-                return True
-
-            with open(file_path, 'r') as f:
-                data = json.load(f)
+            # 检查终止信号 (episode结束, 保留已加载的场景供下一个episode复用)
+            if data.get("action") == "terminate":
+                print(f"收到终止信号: {data.get('episode_key', '')}")
+                return None
 
             episode_key = data.get("episode_key", "")
+            step = data.get("step")
             coords = data.get("coordinates", [])
             glb_path = data.get("glb_path", None)
             is_new_scene = data.get("is_new_scene", False)
 
-            # 处理场景设置
+            # 处理场景设置 (已加载的场景从缓存中取出, 只重置智能体状态)
             if is_new_scene and glb_path:
-                if self.sim:
-                    self.sim.close()
-                print(f"初始化模拟器: {glb_path}")
-                self.sim = setup_simulator(glb_path)
-                self.agent = self.sim.initialize_agent(0)
-                self.current_glb_path = glb_path
+                with tracing.span("sim.scene_setup", episode_key, step, glb_path=glb_path):
+                    self.sim = self.scene_cache.get(glb_path)
+                    self.agent = self.sim.initialize_agent(0)
             elif not self.sim:
                 print("错误: 模拟器未初始化")
-                return False
+                return None
 
             # 渲染图像
             timestamp = time.time()
-            safe_episode_key = episode_key.replace('/', '_').replace(':', '_').replace(' ', '_')
-            image_filename = f"image_{safe_episode_key}_{timestamp}.png"
-            image_path = os.path.join(IMAGE_STORAGE, image_filename)
 
-            # 创建临时文件存储坐标
-            temp_coords_file = f"temp_coords_{timestamp}.json"
-            with open(temp_coords_file, 'w') as f:
-                json.dump({"action": coords}, f)
+            # 获取图像 (位姿直接传入, 不再经过临时坐标文件)
+            with tracing.span("sim.render", episode_key, step):
+                frame = get_img(coords, self.sim, self.agent)
+
+            # 写入帧缓冲区 (get_img返回BGR, 模型使用RGB)
+            with tracing.span("sim.frame_write", episode_key, step):
+                frame_handle = self.frame_ring.write(frame[:, :, ::-1])
+
+            # 保存图像 (仅调试时)
+            image_path = None
+            if SAVE_IMAGES:
+                safe_episode_key = episode_key.replace('/', '_').replace(':', '_').replace(' ', '_')
+                image_path = os.path.join(IMAGE_STORAGE, f"image_{safe_episode_key}_{timestamp}.png")
+                with tracing.span("sim.png_write", episode_key, step):
+                    cv2.imwrite(image_path, frame)
+
+            print(f"已生成图像: 帧 {frame_handle['seq']} ({episode_key})")
+            return {
+                "episode_key": episode_key,
+                "coordinates": coords,
+                "frame": frame_handle,
+                "image_path": image_path
+            }
 
-            # 获取图像
-            frame = get_img(temp_coords_file, self.sim, self.agent)
+        except Exception as e:
+            print(f"处理消息出错: {str(e)}")
+            return None
 
-            # 保存图像
-            cv2.imwrite(image_path, frame)
 
-            # 删除临时文件
-            os.remove(temp_coords_file)
+def send_reply(transport, target, reply):
+    """发送一条回复, 失败时 (如控制器已退出) 只记录错误, 服务继续运行"""
+    try:
+        transport.send(target, reply)
+    except OSError as e:
+        print(f"回复 {target} 失败 ({reply.get('episode_key', '')}): {str(e)}")
 
-            # 保存输出
-            output_file = os.path.join(SIM_OUTPUT_DIR, f"sim_output_{timestamp}.json")
-            with open(output_file, 'w') as f:
-                json.dump({
-                    "episode_key": episode_key,
-                    "coordinates": coords,
-                    "image_path": image_path
-                }, f)
 
-            print(f"已生成图像: {image_path}")
-            return True
+def run_worker(worker_id):
+    """运行一个模拟器工作进程, 每个进程持有自己的Simulator"""
+    name = sim_worker_name(worker_id)
+    print(f"模拟器服务启动 ({name})...")
+    simulator = SimulatorService(name)
+    transport = create_transport(name)
+    tracing.init(name)
 
-        except Exception as e:
-            print(f"处理文件 {file_path} 出错: {str(e)}")
-            return False
-        finally:
-            # 清理输入文件 (不包括终止信号文件)
-            if os.path.exists(file_path) and "terminate.json" not in file_path:
-                os.remove(file_path)
+    try:
+        while True:
+            # 等待控制器消息 (无消息时最多阻塞 POLL_INTERVAL)
+            for source, data in transport.recv(timeout=POLL_INTERVAL):
+                with tracing.span("sim.process", data.get("episode_key", ""), data.get("step")):
+                    reply = simulator.process_message(data)
+                if reply is not None:
+                    send_reply(transport, source, reply)
 
+    except KeyboardInterrupt:
+        print(f"模拟器服务停止 ({name})")
 
-def main():
-    print("模拟器服务启动...")
-    simulator = SimulatorService()
+    finally:
+        print(simulator.scene_cache.stats())
+        simulator.scene_cache.close()
+        simulator.frame_ring.close()
+        transport.close()
+        tracing.close()
 
-    try:
-        while True:
-            # 检查输入目录
-            processed = False
-            for file_name in os.listdir(SIM_INPUT_DIR):
-                if not file_name.endswith('.json'):
-                    continue
 
-                file_path = os.path.join(SIM_INPUT_DIR, file_name)
-                if simulator.process_file(file_path):
-                    processed = True
+def main():
+    if NUM_SIM_WORKERS == 1:
+        run_worker(0)
+        return
 
-            # 如果没有处理任何文件，等待一会儿
-            if not processed:
-                time.sleep(0.1)
+    # 每个工作进程独立加载场景, 使用spawn避免继承父进程的渲染上下文
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=run_worker, args=(i,)) for i in range(NUM_SIM_WORKERS)]
+    for worker in workers:
+        worker.start()
 
+    try:
+        for worker in workers:
+            worker.join()
     except KeyboardInterrupt:
-        print("模拟器服务停止")
-
-    finally:
-        if simulator.sim:
-            simulator.sim.close()
+        for worker in workers:
+            worker.join()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,179 @@
+import os
+import json
+import numpy as np
+
+# 配置
+# 轨迹输出格式: json (每个episode一个json文件) 或 npz (按批追加的列式存储, 指标脚本一次读入整个运行)
+TRAJECTORY_FORMAT = os.environ.get("UAV_EVAL_TRAJECTORY_FORMAT", "json")
+TRAJECTORY_BATCH = int(os.environ.get("UAV_EVAL_TRAJECTORY_BATCH", "64"))  # 每个npz块的episode数
+STORE_DIR = "columnar"  # 轨迹输出目录下的列式存储子目录
+INDEX_FILE = "index.json"
+TERMINATION_REASONS = ["success", "max_steps", "no_more_instructions", "timeout"]
+
+
+def episode_file_name(episode_key):
+    """episode对应的json轨迹文件名"""
+    return episode_key.replace('/', '_').replace(':', '_').replace(' ', '_') + ".json"
+
+
+def _write_atomic(file_path, write):
+    tmp_file = file_path + ".tmp"
+    with open(tmp_file, 'wb') as f:
+        write(f)
+    os.replace(tmp_file, file_path)
+
+
+def _load_index(store_dir):
+    index_path = os.path.join(store_dir, INDEX_FILE)
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path, 'r') as f:
+        return json.load(f)
+
+
+def _ragged(arrays):
+    """不等长的 (n, 4) 数组 -> (拼接后的float32数组, 偏移 (len+1,))"""
+    lengths = [len(array) for array in arrays]
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths)
+    rows = [np.asarray(array, dtype=np.float32).reshape(-1, 4) for array in arrays]
+    return np.concatenate(rows) if rows else np.zeros((0, 4), dtype=np.float32), offsets
+
+
+def _gather(values, offsets, order):
+    """按 order 重排不等长数组, 返回 (拼接后的数组, 新偏移)"""
+    starts, lengths = offsets[order], offsets[order + 1] - offsets[order]
+    new_offsets = np.zeros(len(order) + 1, dtype=np.int64)
+    new_offsets[1:] = np.cumsum(lengths)
+    rows = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+    return values[rows], new_offsets
+
+
+class TrajectoryWriter:
+    """按批追加episode轨迹的列式存储
+
+    每批写成一个npz块 (位姿为float32, 不等长轨迹按偏移拼接), 再更新 index.json; 两者都先写临时文件再重命名,
+    进程被中断时最多丢失未写出的一批, 重新运行时这些episode不在存储中, 会被重新评测.
+    resume 为False时清空已有存储.
+    """
+
+    def __init__(self, output_dir, batch_size=TRAJECTORY_BATCH, resume=True):
+        self.store_dir = os.path.join(output_dir, STORE_DIR)
+        self.batch_size = batch_size
+        self.pending = []
+        os.makedirs(self.store_dir, exist_ok=True)
+        if not resume:
+            for filename in os.listdir(self.store_dir):
+                os.remove(os.path.join(self.store_dir, filename))
+        self.index = _load_index(self.store_dir) or {
+            "termination_reasons": TERMINATION_REASONS, "chunks": [], "episode_keys": []}
+
+    def stored_keys(self):
+        """已写入存储的episode"""
+        return set(self.index["episode_keys"])
+
+    def append(self, episode_key, trajectory, success, steps, model_calls, termination_reason,
+               instruction_index=0, waypoints=None):
+        self.pending.append({
+            "episode_key": episode_key,
+            "trajectory": trajectory,
+            "waypoints": waypoints if waypoints is not None else [],
+            "success": success,
+            "steps": steps,
+            "model_calls": model_calls,
+            "termination_reason": TERMINATION_REASONS.index(termination_reason),
+            "instruction_index": instruction_index,
+        })
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+
+        poses, offsets = _ragged([episode["trajectory"] for episode in self.pending])
+        waypoints, waypoint_offsets = _ragged([episode["waypoints"] for episode in self.pending])
+        columns = {
+            "episode_key": np.array([episode["episode_key"] for episode in self.pending]),
+            "success": np.array([episode["success"] for episode in self.pending], dtype=bool),
+            "steps": np.array([episode["steps"] for episode in self.pending], dtype=np.int32),
+            "model_calls": np.array([episode["model_calls"] for episode in self.pending], dtype=np.int32),
+            "termination_reason": np.array([episode["termination_reason"] for episode in self.pending], dtype=np.int8),
+            "instruction_index": np.array([episode["instruction_index"] for episode in self.pending], dtype=np.int32),
+            "poses": poses,
+            "offsets": offsets,
+            "waypoints": waypoints,
+            "waypoint_offsets": waypoint_offsets,
+        }
+        chunk_file = f"chunk_{len(self.index['chunks']):06d}.npz"
+        _write_atomic(os.path.join(self.store_dir, chunk_file), lambda f: np.savez(f, **columns))
+
+        self.index["chunks"].append({"file": chunk_file, "num_episodes": len(self.pending), "num_poses": len(poses)})
+        self.index["episode_keys"].extend(episode["episode_key"] for episode in self.pending)
+        _write_atomic(os.path.join(self.store_dir, INDEX_FILE),
+                      lambda f: f.write(json.dumps(self.index).encode('utf-8')))
+        self.pending = []
+
+    def close(self):
+        self.flush()
+
+
+class TrajectoryRun:
+    """一次运行的所有episode, 每列为一个数组; 第i个episode的轨迹为 poses[offsets[i]:offsets[i+1]]"""
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.columns["episode_key"])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def trajectory(self, i):
+        return self.columns["poses"][self.columns["offsets"][i]:self.columns["offsets"][i + 1]]
+
+    def episodes(self, mask=None):
+        """[(episode_key, 轨迹列表)], 轨迹转为float64列表, 与json格式读入的数据一致"""
+        indices = range(len(self)) if mask is None else np.flatnonzero(mask)
+        return [(str(self.columns["episode_key"][i]), self.trajectory(i).astype(np.float64).tolist())
+                for i in indices]
+
+
+def load_run(trajectories_dir):
+    """读取轨迹目录下的列式存储, 不存在时返回None
+
+    所有块拼接成一个 TrajectoryRun; 同一episode被写入多次时保留最后一次, 顺序与json轨迹文件的文件名顺序相同.
+    """
+    store_dir = os.path.join(trajectories_dir, STORE_DIR)
+    index = _load_index(store_dir)
+    if index is None:
+        return None
+
+    chunks = []
+    for chunk in index["chunks"]:
+        with np.load(os.path.join(store_dir, chunk["file"])) as data:
+            chunks.append({name: data[name] for name in data.files})
+    if not chunks:
+        return None
+
+    columns = {}
+    for name in ["episode_key", "success", "steps", "model_calls", "termination_reason", "instruction_index"]:
+        columns[name] = np.concatenate([chunk[name] for chunk in chunks])
+    for values, offsets in [("poses", "offsets"), ("waypoints", "waypoint_offsets")]:
+        columns[values] = np.concatenate([chunk[values] for chunk in chunks])
+        # 各块的偏移从0开始, 加上之前所有块的行数
+        bases = np.cumsum([0] + [len(chunk[values]) for chunk in chunks[:-1]])
+        columns[offsets] = np.concatenate([chunk[offsets][:-1] + base for chunk, base in zip(chunks, bases)]
+                                          + [[len(columns[values])]])
+
+    # 保留每个episode的最后一条记录, 按json文件名排序
+    keys = columns["episode_key"]
+    last = {str(key): i for i, key in enumerate(keys)}
+    order = np.array(sorted(last.values(), key=lambda i: episode_file_name(str(keys[i]))), dtype=np.int64)
+    for name in ["episode_key", "success", "steps", "model_calls", "termination_reason", "instruction_index"]:
+        columns[name] = columns[name][order]
+    columns["poses"], columns["offsets"] = _gather(columns["poses"], columns["offsets"], order)
+    columns["waypoints"], columns["waypoint_offsets"] = _gather(columns["waypoints"], columns["waypoint_offsets"], order)
+    columns["termination_reason"] = np.array(index["termination_reasons"])[columns["termination_reason"]]
+    return TrajectoryRun(columns)
@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import socket
+import shutil
+import itertools
+import tracing
+
+# 配置
+SHARED_FOLDER = "shared_folder"
+# 传输后端: "file" 为原有的共享文件夹轮询协议, "socket" 为Unix域套接字 (消息到达即唤醒, 无轮询延迟)
+TRANSPORT_BACKEND = os.environ.get("UAV_EVAL_TRANSPORT", "file")
+# 模拟器工作进程数量, 控制器同时运行相同数量的episode
+NUM_SIM_WORKERS = int(os.environ.get("UAV_EVAL_SIM_WORKERS", "1"))
+POLL_INTERVAL = 0.1  # 文件后端空闲时的轮询间隔 (秒)
+SEND_TIMEOUT = 30.0  # 套接字后端等待接收方就绪 (启动或取走排队的消息) 的最长时间 (秒)
+SEND_RETRY_MAX = 0.05  # 套接字后端重试发送的最长间隔 (秒), 从1ms开始倍增
+MAX_MESSAGE_SIZE = 1 << 18
+
+
+def sim_worker_name(worker_id):
+    """模拟器工作进程的端点名称, 0号进程沿用原有名称 sim"""
+    return "sim" if worker_id == 0 else f"sim_{worker_id}"
+
+
+def create_transport(name, backend=None, shared_folder=SHARED_FOLDER):
+    """创建传输端点
+
+    name: 端点名称 (controller / model / sim_worker_name(i))
+    backend: 传输后端, 默认使用 TRANSPORT_BACKEND
+    """
+    backend = backend or TRANSPORT_BACKEND
+    if backend == "file":
+        return FileTransport(name, shared_folder)
+    elif backend == "socket":
+        return SocketTransport(name, shared_folder)
+    else:
+        raise ValueError(f"未知的传输后端: {backend}")
+
+
+class FileTransport:
+    """基于共享文件夹的传输 (原有协议)
+
+    每条消息是一个json文件. 控制器写入 {目标}_input (如 sim_input / model_input),
+    模拟器和模型写入 sim_output / model_output, 再由控制器 (或 file_monitor.py) 搬运到 controller_input.
+    """
+
+    def __init__(self, name, shared_folder=SHARED_FOLDER):
+        self.name = name
+        self.shared_folder = shared_folder
+        self.controller_input = os.path.join(shared_folder, "controller_input")
+        self.outboxes = {
+            "sim": os.path.join(shared_folder, "sim_output"),
+            "model": os.path.join(shared_folder, "model_output"),
+        }
+        self.counter = itertools.count()
+
+        for dir_path in [self._inbox(name)] + list(self.outboxes.values()):
+            os.makedirs(dir_path, exist_ok=True)
+
+    def _inbox(self, name):
+        if name == "controller":
+            return self.controller_input
+        return os.path.join(self.shared_folder, f"{name}_input")
+
+    def _write(self, dir_path, file_name, message):
+        """先写临时文件再重命名, 接收方不会读到写了一半的json"""
+        file_path = os.path.join(dir_path, file_name)
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(message, f)
+        os.replace(tmp_path, file_path)
+
+    def send(self, target, message):
+        """发送消息到目标端点"""
+        timestamp = f"{time.time():.6f}_{next(self.counter):06d}"
+        if target == "controller":
+            # 各工作进程共用一个output目录, 文件名中带上端点名称以免冲突
+            outbox = self.outboxes[self.name.split('_')[0]]
+            self._write(outbox, f"{self.name}_output_{timestamp}.json", message)
+        else:
+            # 终止信号与普通消息同样按时间戳命名, 保证同一目标按发送顺序处理
+            inbox = self._inbox(target)
+            os.makedirs(inbox, exist_ok=True)
+            self._write(inbox, f"{target}_input_{timestamp}.json", message)
+
+    def _move_outputs(self):
+        """将模拟器/模型输出移动到控制器输入 (添加来源前缀)"""
+        start = time.time()
+        moved = 0
+        for source, src_dir in self.outboxes.items():
+            for file_name in os.listdir(src_dir):
+                if not file_name.endswith('.json'):
+                    continue
+
+                src_path = os.path.join(src_dir, file_name)
+                dst_path = os.path.join(self.controller_input, f"{source}_{file_name}")
+                try:
+                    shutil.move(src_path, dst_path)
+                    moved += 1
+                except Exception as e:
+                    print(f"移动文件失败: {str(e)}")
+
+        if moved:
+            tracing.record("transport.move_outputs", start, time.time(), files=moved)
+
+    def _read_inbox(self):
+        """读取并删除收件目录中的全部消息"""
+        messages = []
+        inbox = self._inbox(self.name)
+        for file_name in sorted(os.listdir(inbox)):
+            if not file_name.endswith('.json'):
+                continue
+
+            file_path = os.path.join(inbox, file_name)
+            try:
+                with open(file_path, 'r') as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"读取文件 {file_name} 出错: {str(e)}")
+                continue
+            finally:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
+            source = file_name.split('_')[0] if self.name == "controller" else "controller"
+            messages.append((source, data))
+        return messages
+
+    def recv(self, timeout=POLL_INTERVAL):
+        """接收消息, 返回 [(来源, 消息)], 超时返回空列表"""
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.name == "controller":
+                self._move_outputs()
+            messages = self._read_inbox()
+            remaining = deadline - time.monotonic()
+            if messages or remaining <= 0:
+                return messages
+            time.sleep(min(POLL_INTERVAL, remaining))
+
+    def reset(self):
+        """清空本端点尚未处理的消息"""
+        dirs = [self._inbox(self.name)]
+        if self.name == "controller":
+            dirs += list(self.outboxes.values())
+        for dir_path in dirs:
+            for item in os.listdir(dir_path):
+                item_path = os.path.join(dir_path, item)
+                if os.path.isfile(item_path):
+                    os.remove(item_path)
+
+    def close(self):
+        pass
+
+
+class SocketTransport:
+    """基于Unix域数据报套接字的传输
+
+    每个端点绑定 shared_folder/sockets/{name}.sock, 消息为一个json数据报.
+    接收方阻塞在 recv 上, 消息到达即被唤醒. 发送使用单独的阻塞套接字: 接收方队列已满
+    (net.unix.max_dgram_qlen) 时等待接收方取走消息, 而不是丢弃消息或抛出异常.
+    """
+
+    def __init__(self, name, shared_folder=SHARED_FOLDER):
+        self.name = name
+        self.socket_dir = os.path.join(shared_folder, "sockets")
+        os.makedirs(self.socket_dir, exist_ok=True)
+
+        self.address = self._address(name)
+        if os.path.exists(self.address):
+            os.remove(self.address)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(self.address)
+        # recv 会切换 self.sock 的阻塞模式, 发送不受其影响
+        self.send_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+
+    def _address(self, name):
+        return os.path.join(self.socket_dir, f"{name}.sock")
+
+    def send(self, target, message):
+        """发送消息到目标端点
+
+        接收方尚未启动时按退避间隔重试, 接收方队列已满时阻塞等待, 总共最多 SEND_TIMEOUT.
+        """
+        payload = json.dumps({"source": self.name, "message": message}).encode('utf-8')
+        deadline = time.monotonic() + SEND_TIMEOUT
+        delay = 0.001
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                self.send_sock.settimeout(max(remaining, 0.001))
+                self.send_sock.sendto(payload, self._address(target))
+                return
+            except (FileNotFoundError, ConnectionRefusedError, BlockingIOError, socket.timeout) as e:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(f"发送到 {target} 超时: {str(e)}")
+                time.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+                delay = min(delay * 2, SEND_RETRY_MAX)
+
+    def _unpack(self, data):
+        envelope = json.loads(data.decode('utf-8'))
+        return envelope["source"], envelope["message"]
+
+    def recv(self, timeout=POLL_INTERVAL):
+        """接收消息, 返回 [(来源, 消息)], 超时返回空列表"""
+        self.sock.settimeout(timeout)
+        try:
+            messages = [self._unpack(self.sock.recv(MAX_MESSAGE_SIZE))]
+        except (socket.timeout, BlockingIOError):
+            return []
+
+        # 取走已经排队的其余消息
+        self.sock.setblocking(False)
+        while True:
+            try:
+                messages.append(self._unpack(self.sock.recv(MAX_MESSAGE_SIZE)))
+            except BlockingIOError:
+                break
+        return messages
+
+    def reset(self):
+        """清空本端点尚未处理的消息"""
+        while self.recv(timeout=0.001):
+            pass
+
+    def close(self):
+        self.sock.close()
+        self.send_sock.close()
+        if os.path.exists(self.address):
+            os.remove(self.address)
@@ -1,37 +1,42 @@
 import os
 import json
 import time
-import shutil
 import math
 import numpy as np
-from utils import get_glb_path, is_success, load_posture, normalize_angle
+from utils import get_glb_path, is_success, normalize_angle
+from posture_store import load_poses
+from transport import create_transport, sim_worker_name, NUM_SIM_WORKERS, POLL_INTERVAL
+from scheduler import EpisodeScheduler
+from journal import ResultJournal, write_results, run_identity, RESUME
+import tracing
+from action_chunk import ChunkExecutor, chunk_mode, step_grid, ACTION_HORIZON, CHUNK_STEPS, CHUNK_ENSEMBLE
+from trajectory_store import TrajectoryWriter, episode_file_name, TRAJECTORY_FORMAT
 
 # 配置参数
 MAX_INFERENCE_STEPS = 60
+EPISODE_TIMEOUT = 300  # 单个episode的超时时间 (秒)
 SHARED_FOLDER = "shared_folder"
 TEST_VLN_FILE = "test_vln_unseen.json"
 VLA_INS_BASE = "./vla_ins"
 POSTURE_BASE = "./without_screenshot"
 TRAJECTORY_OUTPUT = os.path.join(SHARED_FOLDER, "trajectories")
-CONTROLLER_INPUT = os.path.join(SHARED_FOLDER, "controller_input")
-SIM_INPUT_DIR = os.path.join(SHARED_FOLDER, "sim_input")
-SIM_OUTPUT_DIR = os.path.join(SHARED_FOLDER, "sim_output")
-MODEL_INPUT_DIR = os.path.join(SHARED_FOLDER, "model_input")
-MODEL_OUTPUT_DIR = os.path.join(SHARED_FOLDER, "model_output")
-INSTRUCTIONS_DIR = os.path.join(SHARED_FOLDER, "instructions")
 IMAGE_STORAGE = os.path.join(SHARED_FOLDER, "images")
 INDOOR_UAV_BASE = "/data1/liux/Indoor_UAV"
 
 # 确保目录存在
-for dir_path in [CONTROLLER_INPUT, SIM_INPUT_DIR, SIM_OUTPUT_DIR,
-                 MODEL_INPUT_DIR, MODEL_OUTPUT_DIR, TRAJECTORY_OUTPUT,
-                 INSTRUCTIONS_DIR, IMAGE_STORAGE]:
+for dir_path in [TRAJECTORY_OUTPUT, IMAGE_STORAGE]:
     os.makedirs(dir_path, exist_ok=True)
 
 
 class EpisodeController:
-    def __init__(self, episode_key, instruction_sequence):
+    def __init__(self, episode_key, instruction_sequence, transport, sim_worker="sim", writer=None):
         self.episode_key = episode_key
+        self.transport = transport
+        self.writer = writer  # 列式轨迹存储 (TrajectoryWriter), 为None时每个episode写一个json文件
+        self.sim_worker = sim_worker  # 负责本episode的模拟器工作进程
+        self.start_time = None
+        self.sim_sent_time = None  # 最近一次发送到模拟器/模型的时间, 用于追踪往返耗时
+        self.model_sent_time = None
         self.instruction_sequence = instruction_sequence
         self.current_instruction_index = 0
         self.trajectory = []
@@ -42,8 +47,15 @@ class EpisodeController:
         self.glb_path = None
         self.instruction = None
         self.start_image_path = None
+        # 动作块模式下 step_count 为执行的航点数, 步数上限相应放大, 使飞行距离上限与逐步模式相同
+        self.executor = ChunkExecutor() if chunk_mode() else None
+        self.max_steps = MAX_INFERENCE_STEPS * ACTION_HORIZON if chunk_mode() else MAX_INFERENCE_STEPS
+        self.model_calls = 0
         self.last_inference_coords = None
         self.current_image_path = None  # 当前图像路径
+        self.current_frame = None  # 当前图像在模拟器帧缓冲区中的句柄
+        self.ref_image_path = None  # 当前参考图像路径 (指令更新时替换为当前图像)
+        self.ref_frame = None  # 当前参考图像的帧句柄 (参考图像为起始图像时为None)
         self.should_terminate = False  # 新增终止标志
 
         # 解析路径
@@ -55,25 +67,19 @@ class EpisodeController:
 
     def setup_episode(self):
         """设置新episode的初始状态"""
+        setup_start = time.time()
         print(f"\n=== 开始测试: {self.episode_key} ===")
         print(f"指令序列长度: {len(self.instruction_sequence)}")
         print(f"初始指令: {self.instruction_sequence[0]}")
 
         # 加载posture数据
         posture_path = os.path.join(POSTURE_BASE, self.group, self.scene, self.traj, "posture.json")
-        with open(posture_path, 'r') as f:
-            posture_data = json.load(f)
+        posture_data = load_poses(posture_path)  # 角度已转换为弧度
 
         # 使用第一个坐标作为起始坐标
-        self.start_coords = posture_data[0]
+        self.start_coords = posture_data[0].tolist()
         # 使用最后一个坐标作为结束坐标
-        self.end_coords = posture_data[-1]
-
-        # 角度转换（度转弧度）
-        if len(self.start_coords) >= 4:
-            self.start_coords[3] = self.start_coords[3] * np.pi / 180.0
-        if len(self.end_coords) >= 4:
-            self.end_coords[3] = self.end_coords[3] * np.pi / 180.0
+        self.end_coords = posture_data[-1].tolist()
 
         # 获取glb路径
         self.glb_path = get_glb_path(self.group, self.scene)
@@ -92,47 +98,44 @@ class EpisodeController:
         # 设置初始参考点
         self.last_inference_coords = self.start_coords.copy()
 
-        # 保存当前指令
+        # 设置当前指令和参考图像
         self.instruction = self.instruction_sequence[0]
-        instruction_file = os.path.join(INSTRUCTIONS_DIR, "current_instruction.json")
-        with open(instruction_file, 'w') as f:
-            json.dump({
-                "episode_key": self.episode_key,
-                "instruction": self.instruction,
-                "end_coords": self.end_coords,
-                "glb_path": self.glb_path,
-                "start_coords": self.start_coords,
-                "start_image_path": self.start_image_path,
-                "ref_image_path": self.start_image_path
-            }, f)
+        self.ref_image_path = self.start_image_path
 
         # 发送起始坐标到模拟器
+        self.start_time = time.time()
+        tracing.record("controller.setup_episode", setup_start, self.start_time, self.episode_key)
         self.send_to_simulator(self.start_coords, True)
 
     def send_to_simulator(self, coords, is_new_scene=False):
         """发送坐标到模拟器"""
-        timestamp = time.time()
-        sim_input_file = os.path.join(SIM_INPUT_DIR, f"sim_input_{timestamp}.json")
-        with open(sim_input_file, 'w') as f:
-            json.dump({
-                "episode_key": self.episode_key,
-                "coordinates": coords,
-                "glb_path": self.glb_path if is_new_scene else None,
-                "is_new_scene": is_new_scene
-            }, f)
+        self.sim_sent_time = time.time()
+        self.transport.send(self.sim_worker, {
+            "episode_key": self.episode_key,
+            "step": self.step_count,
+            "coordinates": coords,
+            "glb_path": self.glb_path if is_new_scene else None,
+            "is_new_scene": is_new_scene
+        })
         print(f"发送坐标到模拟器: {coords}")
 
-    def send_to_model(self, image_path, coords):
-        """发送图像和坐标到模型"""
-        timestamp = time.time()
-        model_input_file = os.path.join(MODEL_INPUT_DIR, f"model_input_{timestamp}.json")
-        with open(model_input_file, 'w') as f:
-            json.dump({
-                "episode_key": self.episode_key,
-                "image_path": image_path,
-                "coordinates": coords
-            }, f)
-        print(f"发送图像到模型: {os.path.basename(image_path)}")
+    def send_to_model(self, frame, image_path, coords):
+        """发送图像和坐标到模型 (当前指令和参考图像随请求发送, 模型按episode_key区分)
+
+        frame 为模拟器帧缓冲区中的帧句柄, image_path 仅在模拟器保存调试图像时存在
+        """
+        self.model_sent_time = time.time()
+        self.transport.send("model", {
+            "episode_key": self.episode_key,
+            "step": self.step_count,
+            "frame": frame,
+            "image_path": image_path,
+            "coordinates": coords,
+            "instruction": self.instruction,
+            "ref_image_path": self.ref_image_path,
+            "ref_frame": self.ref_frame
+        })
+        print(f"发送图像到模型: 步骤 {self.step_count}")
 
     def check_update_condition(self, new_coords):
         """检查是否需要更新指令和参考图像 - 比较新坐标与上一次推理的坐标"""
@@ -161,9 +164,11 @@ class EpisodeController:
         """处理模拟器输出"""
         if sim_data.get("episode_key") != self.episode_key:
             return False
+        tracing.record("controller.sim_roundtrip", self.sim_sent_time, time.time(), self.episode_key, self.step_count)
 
-        # 保存当前图像路径
-        self.current_image_path = sim_data["image_path"]
+        # 保存当前图像
+        self.current_frame = sim_data.get("frame")
+        self.current_image_path = sim_data.get("image_path")
 
         # 获取当前坐标
         current_coords = sim_data["coordinates"]
@@ -177,23 +182,37 @@ class EpisodeController:
             self.terminate_episode()
             return False
 
-        if self.step_count >= MAX_INFERENCE_STEPS:
-            print(f"达到最大推理步数 ({MAX_INFERENCE_STEPS})")
+        if self.step_count >= self.max_steps:
+            print(f"达到最大推理步数 ({self.max_steps})")
             self.terminate_episode()
             return False
 
+        # 动作块模式下继续执行当前动作块的航点, 执行完k个航点后再推理
+        if self.executor is not None and not self.executor.needs_replan():
+            new_coords = self.executor.next_waypoint()
+            self.step_count += 1
+            print(f"执行航点 {self.step_count}/{self.max_steps} - 新坐标: {new_coords}")
+            self.send_to_simulator(new_coords)
+            return True
+
         # 发送新图像到模型
-        self.send_to_model(sim_data["image_path"], current_coords)
+        self.send_to_model(self.current_frame, self.current_image_path, current_coords)
         return True
 
     def process_model_output(self, model_data):
         """处理模型输出 - 这里进行比较并更新"""
         if model_data.get("episode_key") != self.episode_key:
             return False
+        tracing.record("controller.model_roundtrip", self.model_sent_time, time.time(), self.episode_key, self.step_count)
 
-        new_coords = model_data["coordinates"]
+        new_coords = model_data["coordinates"]  # 动作块的最后一个航点
+        self.model_calls += 1
         self.step_count += 1
-        print(f"推理步骤 {self.step_count}/{MAX_INFERENCE_STEPS} - 新坐标: {new_coords}")
+        print(f"推理步骤 {self.step_count}/{self.max_steps} - 新坐标: {new_coords}")
+
+        # 逐步模式下上一次推理的坐标即当前位姿; 动作块模式下只执行了前k个航点, 改为与当前位姿比较
+        if self.executor is not None:
+            self.last_inference_coords = self.trajectory[-1]
 
         # 检查是否需要更新指令和参考图像
         if self.check_update_condition(new_coords):
@@ -212,29 +231,25 @@ class EpisodeController:
             # 更新指令
             self.instruction = self.instruction_sequence[self.current_instruction_index]
 
-            # 确保当前图像路径有效
-            if not self.current_image_path:
+            # 确保当前图像有效
+            if not self.current_frame and not self.current_image_path:
                 self.current_image_path = self.start_image_path
 
-            # 更新指令文件
-            instruction_file = os.path.join(INSTRUCTIONS_DIR, "current_instruction.json")
-            with open(instruction_file, 'w') as f:
-                json.dump({
-                    "episode_key": self.episode_key,
-                    "instruction": self.instruction,
-                    "end_coords": self.end_coords,
-                    "glb_path": self.glb_path,
-                    "start_coords": self.start_coords,
-                    "start_image_path": self.start_image_path,
-                    "ref_image_path": self.current_image_path  # 使用当前图像作为参考图像
-                }, f)
+            # 使用当前图像作为参考图像
+            self.ref_frame = self.current_frame
+            self.ref_image_path = self.current_image_path
 
             print(f"更新指令: {self.instruction}")
-            print(f"更新参考图像: {os.path.basename(self.current_image_path)}")
+            print(f"更新参考图像: 步骤 {self.step_count}")
 
         # 更新上一次推理的坐标
         self.last_inference_coords = new_coords.copy()
 
+        # 动作块模式下从新动作块的第一个航点开始执行
+        if self.executor is not None:
+            self.executor.add_chunk(model_data["waypoints"])
+            new_coords = self.executor.next_waypoint()
+
         # 发送新坐标到模拟器
         self.send_to_simulator(new_coords)
         return True
@@ -242,70 +257,61 @@ class EpisodeController:
     def terminate_episode(self):
         """终止当前episode并保存结果"""
         # 保存轨迹
-        safe_episode_key = self.episode_key.replace('/', '_').replace(':', '_').replace(' ', '_')
-        trajectory_file = os.path.join(TRAJECTORY_OUTPUT, f"{safe_episode_key}.json")
-
-        with open(trajectory_file, 'w') as f:
-            json.dump({
-                "episode_key": self.episode_key,
-                "success": self.success,
-                "steps": self.step_count,
-                "trajectory": self.trajectory,
-                "instructions": self.instruction_sequence,
-                "current_instruction_index": self.current_instruction_index,
-                "termination_reason": "success" if self.success else "max_steps" if self.step_count >= MAX_INFERENCE_STEPS else "no_more_instructions"
-            }, f, indent=2)
+        trajectory_data = {
+            "episode_key": self.episode_key,
+            "success": self.success,
+            "steps": self.step_count,
+            "model_calls": self.model_calls,
+            "trajectory": self.trajectory,
+            "instructions": self.instruction_sequence,
+            "current_instruction_index": self.current_instruction_index,
+            "termination_reason": "success" if self.success else "max_steps" if self.step_count >= self.max_steps else "no_more_instructions"
+        }
+        # 动作块模式下轨迹按动作块长度抽样, 与逐步模式的粒度一致 (指标脚本按相邻点判断停止), 完整航点另存
+        if self.executor is not None:
+            trajectory_data["trajectory"] = step_grid(self.trajectory)
+            trajectory_data["waypoints"] = self.trajectory
+
+        if self.writer is not None:
+            self.writer.append(self.episode_key, trajectory_data["trajectory"], self.success, self.step_count,
+                               self.model_calls, trajectory_data["termination_reason"], self.current_instruction_index,
+                               trajectory_data.get("waypoints"))
+        else:
+            # 先写临时文件再重命名, 实时统计 (metric_stream.py) 不会读到写了一半的文件
+            trajectory_file = os.path.join(TRAJECTORY_OUTPUT, episode_file_name(self.episode_key))
+            with open(trajectory_file + ".tmp", 'w') as f:
+                json.dump(trajectory_data, f, indent=2)
+            os.replace(trajectory_file + ".tmp", trajectory_file)
 
         print(
             f"测试完成. 成功: {self.success}, 步数: {self.step_count}, 最后指令索引: {self.current_instruction_index}")
 
         # 发送终止信号
-        terminate_file = os.path.join(SIM_INPUT_DIR, "terminate.json")
-        with open(terminate_file, 'w') as f:
-            json.dump({
-                "episode_key": self.episode_key,
-                "action": "terminate"
-            }, f)
+        self.transport.send(self.sim_worker, {
+            "episode_key": self.episode_key,
+            "action": "terminate"
+        })
 
         # 设置终止标志
         self.should_terminate = True
+        tracing.record("controller.episode", self.start_time, time.time(), self.episode_key, self.step_count,
+                       success=self.success)
 
+    def check_finished(self):
+        """检查episode是否结束, 未正常结束但已超时的episode在此终止"""
+        if self.should_terminate:
+            return True
 
-class FileMover:
-    """负责在目录间移动文件的组件"""
-
-    def __init__(self):
-        self.active = True
-
-    def move_sim_output_to_model_input(self):
-        """将模拟器输出移动到模型输入"""
-        for file_name in os.listdir(SIM_OUTPUT_DIR):
-            if not file_name.endswith('.json'):
-                continue
-
-            src_path = os.path.join(SIM_OUTPUT_DIR, file_name)
-            dst_path = os.path.join(CONTROLLER_INPUT, f"sim_{file_name}")
-
-            try:
-                shutil.move(src_path, dst_path)
-                print(f"移动模拟器输出: {file_name} -> {os.path.basename(dst_path)}")
-            except Exception as e:
-                print(f"移动文件失败: {str(e)}")
-
-    def move_model_output_to_sim_input(self):
-        """将模型输出移动到模拟器输入"""
-        for file_name in os.listdir(MODEL_OUTPUT_DIR):
-            if not file_name.endswith('.json'):
-                continue
+        if self.success or self.step_count >= self.max_steps:
+            self.terminate_episode()
+            return True
 
-            src_path = os.path.join(MODEL_OUTPUT_DIR, file_name)
-            dst_path = os.path.join(CONTROLLER_INPUT, f"model_{file_name}")
+        if time.time() - self.start_time > EPISODE_TIMEOUT:
+            print(f"episode超时，终止测试: {self.episode_key}")
+            self.terminate_episode()
+            return True
 
-            try:
-                shutil.move(src_path, dst_path)
-                print(f"移动模型输出: {file_name} -> {os.path.basename(dst_path)}")
-            except Exception as e:
-                print(f"移动文件失败: {str(e)}")
+        return False
 
 
 def main():
@@ -313,99 +319,100 @@ def main():
     with open(TEST_VLN_FILE, 'r') as f:
         test_vln = json.load(f)
 
-    # 初始化文件搬运工
-    file_mover = FileMover()
+    # 结果日志, 记录本次运行的任务、测试集、模型和动作块设置; 与已有日志不一致时不恢复, 直接退出
+    try:
+        journal = ResultJournal(TRAJECTORY_OUTPUT, run_identity("vln", TEST_VLN_FILE, chunk_steps=CHUNK_STEPS,
+                                                                chunk_ensemble=CHUNK_ENSEMBLE))
+    except ValueError as e:
+        print(str(e))
+        return
 
-    # 运行所有episode
-    results = {}
-    episode_keys = list(test_vln.keys())
+    # 初始化传输端点 (文件后端的目录搬运也在其中完成), 清空上次运行残留的消息
+    transport = create_transport("controller")
+    transport.reset()
+    tracing.init("controller")
 
-    for i, episode_key in enumerate(episode_keys):
-        print(f"\n{'=' * 40}")
-        print(f"开始测试 {i + 1}/{len(episode_keys)}: {episode_key}")
-
-        # 初始化当前episode
-        controller = EpisodeController(episode_key, test_vln[episode_key])
-        controller.setup_episode()
-
-        # 清空目录
-        for dir_path in [CONTROLLER_INPUT, SIM_OUTPUT_DIR, MODEL_OUTPUT_DIR]:
-            for item in os.listdir(dir_path):
-                item_path = os.path.join(dir_path, item)
-                if os.path.isfile(item_path):
-                    os.remove(item_path)
-
-        # 运行episode
-        start_time = time.time()
-        while True:
-            # 检查终止标志
-            if controller.should_terminate:
-                print("检测到终止标志，结束当前episode")
-                break
-
-            # 移动文件
-            file_mover.move_sim_output_to_model_input()
-            file_mover.move_model_output_to_sim_input()
-
-            # 处理控制器输入
-            processed = False
-            for file_name in os.listdir(CONTROLLER_INPUT):
-                if not file_name.endswith('.json'):
-                    continue
-
-                file_path = os.path.join(CONTROLLER_INPUT, file_name)
-
-                try:
-                    with open(file_path, 'r') as f:
-                        data = json.load(f)
-
-                    # 处理模拟器输出
-                    if file_name.startswith('sim_'):
-                        if controller.process_sim_output(data):
-                            processed = True
-
-                    # 处理模型输出
-                    elif file_name.startswith('model_'):
-                        if controller.process_model_output(data):
-                            processed = True
-
-                    # 删除处理过的文件
-                    os.remove(file_path)
-
-                except Exception as e:
-                    print(f"处理文件 {file_name} 出错: {str(e)}")
-                    continue
-
-            # 检查终止条件
-            if controller.success or controller.step_count >= MAX_INFERENCE_STEPS or controller.should_terminate:
-                if not controller.should_terminate:
-                    controller.terminate_episode()
-                time.sleep(0.2)
-                break
-
-            # 超时检查 (5分钟)
-            if time.time() - start_time > 300:  # 5分钟
-                print("episode超时，终止测试")
-                controller.terminate_episode()
-                time.sleep(0.2)
-                break
-
-            # 如果没有处理任何文件，等待一会儿
-            if not processed:
-                time.sleep(0.1)
-
-        # 记录结果
-        results[episode_key] = {
-            "success": controller.success,
-            "steps": controller.step_count,
-            "final_instruction_index": controller.current_instruction_index,
-            "termination_reason": "success" if controller.success else "max_steps" if controller.step_count >= MAX_INFERENCE_STEPS else "no_more_instructions"
-        }
+    # 每个模拟器工作进程同一时刻只运行一个episode
+    free_workers = [sim_worker_name(i) for i in range(NUM_SIM_WORKERS)]
+    print(f"模拟器工作进程数: {NUM_SIM_WORKERS}")
 
-    # 保存最终结果
+    # 运行所有episode (日志中已完成的episode直接跳过)
+    episode_keys = list(test_vln.keys())
     results_file = os.path.join(TRAJECTORY_OUTPUT, "final_results.json")
-    with open(results_file, 'w') as f:
-        json.dump(results, f, indent=2)
+    results = {episode_key: result for episode_key, result in journal.load().items() if episode_key in test_vln}
+    # 列式存储中最后一批未写出的episode需要重新评测
+    writer = TrajectoryWriter(TRAJECTORY_OUTPUT, resume=RESUME) if TRAJECTORY_FORMAT == "npz" else None
+    if writer is not None:
+        stored = writer.stored_keys()
+        results = {episode_key: result for episode_key, result in results.items() if episode_key in stored}
+    if results:
+        print(f"从日志恢复: 跳过已完成的 {len(results)}/{len(episode_keys)} 个episode")
+    # 同一场景的episode连续运行, 模拟器可以复用已加载的场景
+    scheduler = EpisodeScheduler([episode_key for episode_key in episode_keys if episode_key not in results])
+    print(f"场景数: {scheduler.num_scenes()}")
+    active = {}  # episode_key -> EpisodeController
+    started = len(results)
+
+    while scheduler.has_pending() or active:
+        # 为空闲的模拟器分配新episode
+        while scheduler.has_pending() and free_workers:
+            sim_worker = free_workers.pop(0)
+            episode_key = scheduler.next_episode(sim_worker)
+            started += 1
+            print(f"\n{'=' * 40}")
+            print(f"开始测试 {started}/{len(episode_keys)}: {episode_key}")
+
+            controller = EpisodeController(episode_key, test_vln[episode_key], transport, sim_worker, writer)
+            controller.setup_episode()
+            active[episode_key] = controller
+
+        # 处理控制器输入 (无消息时最多阻塞 POLL_INTERVAL), 按episode_key分发
+        for source, data in transport.recv(timeout=POLL_INTERVAL):
+            controller = active.get(data.get("episode_key"))
+            if controller is None or controller.should_terminate:
+                continue
+
+            try:
+                # 处理模拟器输出
+                if source.startswith('sim'):
+                    controller.process_sim_output(data)
+
+                # 处理模型输出
+                elif source.startswith('model'):
+                    controller.process_model_output(data)
+
+            except Exception as e:
+                print(f"处理{source}消息出错: {str(e)}")
+
+        # 检查终止条件, 结束的episode释放其模拟器
+        for episode_key, controller in list(active.items()):
+            if not controller.check_finished():
+                continue
+
+            # 记录结果
+            results[episode_key] = {
+                "success": controller.success,
+                "steps": controller.step_count,
+                "model_calls": controller.model_calls,
+                "chunk_steps": CHUNK_STEPS,
+                "chunk_ensemble": CHUNK_ENSEMBLE,
+                "final_instruction_index": controller.current_instruction_index,
+                "termination_reason": "success" if controller.success else "max_steps" if controller.step_count >= controller.max_steps else "no_more_instructions"
+            }
+            del active[episode_key]
+            free_workers.append(controller.sim_worker)
+
+            # 写入日志并更新 final_results.json, 中断后重新运行时从这里继续
+            journal.append(episode_key, results[episode_key])
+            write_results(results_file, results, episode_keys)
+
+    if writer is not None:
+        writer.close()
+    transport.close()
+    tracing.close()
+
+    # 保存最终结果 (按测试集顺序)
+    write_results(results_file, results, episode_keys)
 
     print("\n所有测试完成!")
 
@@ -0,0 +1,102 @@
+"""Measure the throughput gained by dropping absent images from Pi0's prefix.
+
+Compares a Pi0 model that encodes every image slot and masks out the absent ones at attention time with the same model
+that drops them up front (see `Pi0Config.absent_image_keys`). Both share the same randomly initialized weights and run
+on the same inputs, with the absent images masked out as the data transforms do. Reports training step (loss and
+gradients) and inference throughput, and the largest difference between the two models' outputs.
+"""
+
+import dataclasses
+import logging
+import time
+
+import flax.nnx as nnx
+import jax
+import jax.numpy as jnp
+import numpy as np
+import tyro
+
+import openpi.models.pi0 as _pi0
+import openpi.training.config as _config
+
+
+@dataclasses.dataclass
+class Args:
+    # Training config of a Pi0 model.
+    config: str = "pi0_uav_low_mem_finetune"
+    # Image slots that the data transforms always mask out.
+    absent_image_keys: tuple[str, ...] = ("right_wrist_0_rgb",)
+    batch_size: int = 8
+    # Number of timed calls of each function.
+    num_iters: int = 10
+    # Number of flow matching steps.
+    num_steps: int = 10
+    seed: int = 0
+
+
+def make_train_step(model: _pi0.Pi0):
+    """Loss and gradients of all parameters, as in a training step."""
+    graphdef, params, rest = nnx.split(model, nnx.Param, ...)
+
+    def loss_fn(params, rng, observation, actions):
+        model = nnx.merge(graphdef, params, rest)
+        return jnp.mean(model.compute_loss(rng, observation, actions, train=True))
+
+    value_and_grad = jax.jit(jax.value_and_grad(loss_fn))
+    return lambda rng, observation, actions: value_and_grad(params, rng, observation, actions)
+
+
+def make_sample_actions(model: _pi0.Pi0, num_steps: int):
+    graphdef, state = nnx.split(model)
+
+    @jax.jit
+    def sample_actions(state, rng, observation):
+        return nnx.merge(graphdef, state).sample_actions(rng, observation, num_steps=num_steps)
+
+    return lambda rng, observation: sample_actions(state, rng, observation)
+
+
+def benchmark(fn, *args, num_iters: int):
+    """Returns the result of the last call and the mean time per call in milliseconds, after a warmup call."""
+    result = jax.block_until_ready(fn(*args))
+    start_time = time.monotonic()
+    for _ in range(num_iters):
+        result = jax.block_until_ready(fn(*args))
+    return result, (time.monotonic() - start_time) * 1000 / num_iters
+
+
+def main(args: Args) -> None:
+    model_config = _config.get_config(args.config).model
+    if not isinstance(model_config, _pi0.Pi0Config):
+        raise ValueError(f"Only Pi0 models are supported, got {type(model_config).__name__}.")
+    full_config = dataclasses.replace(model_config, absent_image_keys=())
+    absent_config = dataclasses.replace(model_config, absent_image_keys=args.absent_image_keys)
+
+    rng = jax.random.key(args.seed)
+    full_model = full_config.create(rng)
+    absent_model = absent_config.load(nnx.state(full_model).to_pure_dict())
+
+    obs, actions = full_config.fake_obs(args.batch_size), full_config.fake_act(args.batch_size)
+    image_masks = dict(obs.image_masks)
+    for name in args.absent_image_keys:
+        image_masks[name] = jnp.zeros(args.batch_size, dtype=jnp.bool_)
+    obs = obs.replace(image_masks=image_masks)
+
+    results = {}
+    for name, model in [("full", full_model), ("absent", absent_model)]:
+        (loss, _), train_ms = benchmark(make_train_step(model), rng, obs, actions, num_iters=args.num_iters)
+        sampled, infer_ms = benchmark(make_sample_actions(model, args.num_steps), rng, obs, num_iters=args.num_iters)
+        results[name] = (loss, sampled)
+        logging.info(
+            f"{name:>6}: train step {train_ms:8.1f}ms ({args.batch_size * 1000 / train_ms:6.1f} samples/s), "
+            f"inference {infer_ms:8.1f}ms ({args.batch_size * 1000 / infer_ms:6.1f} samples/s)"
+        )
+
+    (full_loss, full_actions), (absent_loss, absent_actions) = results["full"], results["absent"]
+    logging.info(f"|loss difference|: {float(jnp.abs(full_loss - absent_loss)):.3g}")
+    logging.info(f"Max |action difference|: {float(np.max(np.abs(full_actions - absent_actions))):.3g}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, force=True)
+    main(tyro.cli(Args))
@@ -0,0 +1,133 @@
+"""Measure the latency and correctness of Pi0's static prefix cache.
+
+Runs the observations of one simulated episode (fixed static images and prompt, a new live frame on every call) through
+three paths that share the same weights:
+
+- `default`: the model's own prefix layout, in which all prefix tokens attend to each other.
+- `uncached`: the static prefix layout (see `Pi0Config.static_image_keys`), running the whole prefix on every call.
+- `cached`: the static prefix layout, filling the static KV cache once and only running the live images on every call.
+
+`cached` must match `uncached` up to numerical noise. Its difference to `default` is what the layout costs for a
+checkpoint that was not trained with it.
+"""
+
+import dataclasses
+import logging
+import time
+
+import flax.nnx as nnx
+import jax
+import jax.numpy as jnp
+import numpy as np
+import tyro
+
+import openpi.models.model as _model
+import openpi.models.pi0 as _pi0
+from openpi.shared import download
+from openpi.shared import nnx_utils
+import openpi.training.config as _config
+
+
+@dataclasses.dataclass
+class Args:
+    # Training config of a Pi0 model.
+    config: str = "pi0_uav_low_mem_finetune"
+    # Checkpoint directory. If not provided, the model is randomly initialized.
+    checkpoint_dir: str | None = None
+    # Images that stay the same over an episode.
+    static_image_keys: tuple[str, ...] = ("left_wrist_0_rgb",)
+    # Number of calls in the episode.
+    num_calls: int = 10
+    # Number of flow matching steps.
+    num_steps: int = 10
+    batch_size: int = 1
+    seed: int = 0
+
+
+def make_episode(model_config: _pi0.Pi0Config, args: Args) -> list[_model.Observation]:
+    """Random static images and prompt, and a new random live frame and state for every call."""
+    rng = np.random.default_rng(args.seed)
+    obs = model_config.fake_obs(args.batch_size)
+
+    def random_like(x: jax.Array) -> jax.Array:
+        return jnp.asarray(rng.uniform(-1, 1, x.shape), dtype=x.dtype)
+
+    static_images = {name: random_like(obs.images[name]) for name in args.static_image_keys}
+    tokenized_prompt = jnp.asarray(rng.integers(0, 1000, obs.tokenized_prompt.shape), dtype=jnp.int32)
+    # Use half of the tokens, the rest is padding.
+    tokenized_prompt_mask = jnp.broadcast_to(
+        jnp.arange(model_config.max_token_len) < model_config.max_token_len // 2, obs.tokenized_prompt_mask.shape
+    )
+    return [
+        obs.replace(
+            images={name: static_images.get(name, random_like(image)) for name, image in obs.images.items()},
+            state=random_like(obs.state),
+            tokenized_prompt=tokenized_prompt,
+            tokenized_prompt_mask=tokenized_prompt_mask,
+        )
+        for _ in range(args.num_calls)
+    ]
+
+
+def timed(fn, *args, **kwargs) -> tuple[jax.Array, float]:
+    start_time = time.monotonic()
+    result = jax.block_until_ready(fn(*args, **kwargs))
+    return result, (time.monotonic() - start_time) * 1000
+
+
+def main(args: Args) -> None:
+    model_config = _config.get_config(args.config).model
+    if not isinstance(model_config, _pi0.Pi0Config):
+        raise ValueError(f"Prefix caching is only supported for Pi0 models, got {type(model_config).__name__}.")
+    static_config = dataclasses.replace(model_config, static_image_keys=args.static_image_keys)
+
+    if args.checkpoint_dir is not None:
+        checkpoint_dir = download.maybe_download(args.checkpoint_dir)
+        params = _model.restore_params(checkpoint_dir / "params", dtype=jnp.bfloat16)
+    else:
+        params = nnx.state(model_config.create(jax.random.key(args.seed))).to_pure_dict()
+    default_model = model_config.load(params)
+    static_model = static_config.load(params)
+
+    default_sample = nnx_utils.module_jit(default_model.sample_actions)
+    static_sample = nnx_utils.module_jit(static_model.sample_actions)
+    fill_static_cache = nnx_utils.module_jit(static_model.fill_static_cache)
+
+    rng = jax.random.key(args.seed)
+    episode = make_episode(static_config, args)
+    # Compile every path before timing.
+    static_cache = fill_static_cache(episode[0])
+    jax.block_until_ready(
+        [
+            default_sample(rng, episode[0], num_steps=args.num_steps),
+            static_sample(rng, episode[0], num_steps=args.num_steps),
+            static_sample(rng, episode[0], num_steps=args.num_steps, static_cache=static_cache),
+        ]
+    )
+
+    # The static cache is filled once per episode.
+    static_cache, fill_ms = timed(fill_static_cache, episode[0])
+    timings = {"default": [], "uncached": [], "cached": []}
+    cached_vs_uncached = []
+    cached_vs_default = []
+    for obs in episode:
+        default_actions, ms = timed(default_sample, rng, obs, num_steps=args.num_steps)
+        timings["default"].append(ms)
+        uncached_actions, ms = timed(static_sample, rng, obs, num_steps=args.num_steps)
+        timings["uncached"].append(ms)
+        cached_actions, ms = timed(static_sample, rng, obs, num_steps=args.num_steps, static_cache=static_cache)
+        timings["cached"].append(ms)
+        cached_vs_uncached.append(float(jnp.max(jnp.abs(cached_actions - uncached_actions))))
+        cached_vs_default.append(float(jnp.max(jnp.abs(cached_actions - default_actions))))
+
+    logging.info(f"{args.num_calls} calls, batch size {args.batch_size}, {args.num_steps} flow matching steps")
+    for name, values in timings.items():
+        logging.info(f"{name:>9}: mean {np.mean(values):8.1f}ms, median {np.median(values):8.1f}ms")
+    logging.info(f"Filling the static cache: {fill_ms:.1f}ms once per episode")
+    logging.info(f"Max |cached - uncached|: {max(cached_vs_uncached):.3g}")
+    logging.info(f"Max |cached - default|: {max(cached_vs_default):.3g}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, force=True)
+    main(tyro.cli(Args))
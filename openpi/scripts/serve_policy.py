@@ -2,6 +2,7 @@ import dataclasses
 import enum
 import logging
 import socket
+import time
 
 import tyro
 
@@ -48,6 +49,14 @@ class Args:
 
     # Port to serve the policy on.
     port: int = 8000
+    # Maximum number of requests (from all connections) that are batched into one inference call.
+    max_batch_size: int = 1
+    # How long to wait for more requests after the first request of a batch arrived.
+    max_wait_ms: float = 0.0
+    # Compile the model before serving, so that the first request does not wait for the compilation.
+    precompile: bool = True
+    # Directory in which compiled models are persisted across restarts. Set to None to disable.
+    compilation_cache_dir: str | None = "~/.cache/jax"
     # Record the policy's behavior for debugging.
     record: bool = False
 
@@ -76,29 +85,64 @@ DEFAULT_CHECKPOINT: dict[EnvMode, Checkpoint] = {
 }
 
 
-def create_default_policy(env: EnvMode, *, default_prompt: str | None = None) -> _policy.Policy:
+def create_default_policy(
+    env: EnvMode,
+    *,
+    default_prompt: str | None = None,
+    batch_buckets: tuple[int, ...] = (),
+    precompile: bool = False,
+    compilation_cache_dir: str | None = None,
+) -> _policy.Policy:
     """Create a default policy for the given environment."""
     if checkpoint := DEFAULT_CHECKPOINT.get(env):
         return _policy_config.create_trained_policy(
-            _config.get_config(checkpoint.config), checkpoint.dir, default_prompt=default_prompt
+            _config.get_config(checkpoint.config),
+            checkpoint.dir,
+            default_prompt=default_prompt,
+            batch_buckets=batch_buckets,
+            precompile=precompile,
+            compilation_cache_dir=compilation_cache_dir,
         )
     raise ValueError(f"Unsupported environment mode: {env}")
 
 
+def batch_buckets(max_batch_size: int) -> tuple[int, ...]:
+    """Powers of two up to `max_batch_size` (inclusive), or no buckets if batching is disabled."""
+    if max_batch_size <= 1:
+        return ()
+    buckets = [1]
+    while buckets[-1] * 2 < max_batch_size:
+        buckets.append(buckets[-1] * 2)
+    return (*buckets, max_batch_size)
+
+
 def create_policy(args: Args) -> _policy.Policy:
     """Create a policy from the given arguments."""
     match args.policy:
         case Checkpoint():
             return _policy_config.create_trained_policy(
-                _config.get_config(args.policy.config), args.policy.dir, default_prompt=args.default_prompt
+                _config.get_config(args.policy.config),
+                args.policy.dir,
+                default_prompt=args.default_prompt,
+                batch_buckets=batch_buckets(args.max_batch_size),
+                precompile=args.precompile,
+                compilation_cache_dir=args.compilation_cache_dir,
             )
         case Default():
-            return create_default_policy(args.env, default_prompt=args.default_prompt)
+            return create_default_policy(
+                args.env,
+                default_prompt=args.default_prompt,
+                batch_buckets=batch_buckets(args.max_batch_size),
+                precompile=args.precompile,
+                compilation_cache_dir=args.compilation_cache_dir,
+            )
 
 
 def main(args: Args) -> None:
+    start_time = time.monotonic()
     policy = create_policy(args)
     policy_metadata = policy.metadata
+    logging.info("Policy ready to serve after %.1fs", time.monotonic() - start_time)
 
     # Record the policy's behavior.
     if args.record:
@@ -113,6 +157,8 @@ def main(args: Args) -> None:
         host="0.0.0.0",
         port=args.port,
         metadata=policy_metadata,
+        max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms,
     )
     server.serve_forever()
 
@@ -1,5 +1,9 @@
+import dataclasses
+
 from flax import nnx
 import jax
+import jax.numpy as jnp
+import numpy as np
 import pytest
 
 from openpi.models import model as _model
@@ -24,6 +28,61 @@ def test_pi0_model():
     assert actions.shape == (batch_size, model.action_horizon, model.action_dim)
 
 
+def test_pi0_static_prefix_cache():
+    key = jax.random.key(0)
+    config = pi0.Pi0Config(
+        paligemma_variant="dummy",
+        action_expert_variant="dummy",
+        max_token_len=16,
+        static_image_keys=("left_wrist_0_rgb",),
+    )
+    model = config.create(key)
+    sample_actions = nnx_utils.module_jit(model.sample_actions)
+
+    def make_obs(seed):
+        rng = np.random.default_rng(seed)
+        obs = config.fake_obs(2)
+        images = dict(obs.images)
+        images["base_0_rgb"] = jnp.asarray(rng.uniform(-1, 1, images["base_0_rgb"].shape), dtype=jnp.float32)
+        return obs.replace(images=images, tokenized_prompt_mask=jnp.arange(16) < jnp.array([[5], [9]]))
+
+    # The static cache of one observation can be used for a later observation with different live images.
+    static_cache = nnx_utils.module_jit(model.fill_static_cache)(make_obs(0))
+    obs = make_obs(1)
+    actions = sample_actions(key, obs, num_steps=3)
+    cached_actions = sample_actions(key, obs, num_steps=3, static_cache=static_cache)
+    np.testing.assert_allclose(cached_actions, actions, atol=1e-3)
+
+
+def test_pi0_absent_images():
+    key = jax.random.key(0)
+    # In float32, so that the comparison is not dominated by bfloat16 rounding.
+    config = pi0.Pi0Config(paligemma_variant="dummy", action_expert_variant="dummy", max_token_len=16, dtype="float32")
+    model = config.create(key)
+    absent_config = dataclasses.replace(config, absent_image_keys=("right_wrist_0_rgb",))
+    absent_model = absent_config.load(nnx.state(model).to_pure_dict())
+
+    batch_size = 2
+    obs, act = config.fake_obs(batch_size), config.fake_act(batch_size)
+    # The data transforms mask out the absent image.
+    obs = obs.replace(image_masks={**obs.image_masks, "right_wrist_0_rgb": jnp.zeros(batch_size, dtype=bool)})
+
+    # The absent image is not part of the prefix.
+    prefix_tokens, _, _ = model.embed_prefix(obs)
+    absent_prefix_tokens, _, _ = absent_model.embed_prefix(obs)
+    num_image_tokens = (prefix_tokens.shape[1] - config.max_token_len) // len(obs.images)
+    assert absent_prefix_tokens.shape[1] == prefix_tokens.shape[1] - num_image_tokens
+
+    # Dropping the masked image gives the same results as masking it at attention time.
+    loss = nnx_utils.module_jit(model.compute_loss)(key, obs, act)
+    absent_loss = nnx_utils.module_jit(absent_model.compute_loss)(key, obs, act)
+    np.testing.assert_allclose(absent_loss, loss, atol=1e-4)
+
+    actions = nnx_utils.module_jit(model.sample_actions)(key, obs, num_steps=3)
+    absent_actions = nnx_utils.module_jit(absent_model.sample_actions)(key, obs, num_steps=3)
+    np.testing.assert_allclose(absent_actions, actions, atol=1e-4)
+
+
 def test_pi0_lora_model():
     key = jax.random.key(0)
     config = pi0.Pi0Config(paligemma_variant="gemma_2b_lora")
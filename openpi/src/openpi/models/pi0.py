@@ -1,5 +1,6 @@
 import dataclasses
 import logging
+from typing import TypeAlias
 
 import einops
 import flax.nnx as nnx
@@ -16,6 +17,9 @@ import openpi.shared.nnx_utils as nnx_utils
 
 logger = logging.getLogger("openpi")
 
+# KV cache of the static prefix and its input mask, see `Pi0.fill_static_cache`.
+StaticCache: TypeAlias = tuple[_gemma.KVCache, at.Bool[at.Array, "b s"]]
+
 
 def make_attn_mask(input_mask, mask_ar):
     """Adapted from big_vision.
@@ -75,6 +79,15 @@ class Pi0Config(_model.BaseModelConfig):
     action_horizon: int = 50
     max_token_len: int = 48
 
+    # Images that stay the same over many consecutive calls, e.g. a reference image. If set, these images and the
+    # prompt are placed first in the prefix and do not attend to the other images, so that their KV cache can be reused
+    # across calls (see `Pi0.fill_static_cache`). This changes the attention pattern of the prefix, so the model should
+    # be trained with the same setting.
+    static_image_keys: tuple[str, ...] = ()
+    # Images that are always masked out by the data transforms, e.g. a camera the robot does not have. They are dropped
+    # before the image encoder instead of being encoded and masked at attention time, which gives the same result.
+    absent_image_keys: tuple[str, ...] = ()
+
     @property
     @override
     def model_type(self) -> _model.ModelType:
@@ -170,16 +183,57 @@ class Pi0(_model.BaseModel):
         self.action_time_mlp_in = nnx.Linear(2 * action_expert_config.width, action_expert_config.width, rngs=rngs)
         self.action_time_mlp_out = nnx.Linear(action_expert_config.width, action_expert_config.width, rngs=rngs)
         self.action_out_proj = nnx.Linear(action_expert_config.width, config.action_dim, rngs=rngs)
+        self.static_image_keys = config.static_image_keys
+        self.absent_image_keys = config.absent_image_keys
 
     @at.typecheck
     def embed_prefix(
         self, obs: _model.Observation
     ) -> tuple[at.Float[at.Array, "b s emb"], at.Bool[at.Array, "b s"], at.Bool[at.Array, " s"]]:
+        if not self.static_image_keys:
+            return self._embed_prefix_parts(obs, self._image_names(obs), embed_prompt=True)
+
+        static_tokens, static_mask, static_ar_mask = self.embed_static_prefix(obs)
+        live_tokens, live_mask, live_ar_mask = self.embed_live_prefix(obs)
+        return (
+            jnp.concatenate([static_tokens, live_tokens], axis=1),
+            jnp.concatenate([static_mask, live_mask], axis=1),
+            jnp.concatenate([static_ar_mask, live_ar_mask], axis=0),
+        )
+
+    @at.typecheck
+    def embed_static_prefix(
+        self, obs: _model.Observation
+    ) -> tuple[at.Float[at.Array, "b s emb"], at.Bool[at.Array, "b s"], at.Bool[at.Array, " s"]]:
+        """The images in `static_image_keys` and the prompt, which only attend to each other."""
+        return self._embed_prefix_parts(obs, self.static_image_keys, embed_prompt=True)
+
+    @at.typecheck
+    def embed_live_prefix(
+        self, obs: _model.Observation
+    ) -> tuple[at.Float[at.Array, "b s emb"], at.Bool[at.Array, "b s"], at.Bool[at.Array, " s"]]:
+        """The images that are not static. They attend to the static prefix, but the static prefix does not attend
+        to them."""
+        names = [name for name in self._image_names(obs) if name not in self.static_image_keys]
+        tokens, input_mask, ar_mask = self._embed_prefix_parts(obs, names, embed_prompt=False)
+        return tokens, input_mask, ar_mask.at[0].set(True)
+
+    def _image_names(self, obs: _model.Observation) -> list[str]:
+        return [name for name in obs.images if name not in self.absent_image_keys]
+
+    def _preprocess(
+        self, rng: at.KeyArrayLike | None, observation: _model.Observation, *, train: bool
+    ) -> _model.Observation:
+        # absent images are not augmented either
+        image_keys = [key for key in _model.IMAGE_KEYS if key not in self.absent_image_keys]
+        return _model.preprocess_observation(rng, observation, train=train, image_keys=image_keys)
+
+    def _embed_prefix_parts(self, obs: _model.Observation, image_names, *, embed_prompt: bool):
         input_mask = []
         ar_mask = []
         tokens = []
         # embed images
-        for name in obs.images:
+        for name in image_names:
             image_tokens, _ = self.PaliGemma.img(obs.images[name], train=False)
 
             tokens.append(image_tokens)
@@ -194,7 +248,7 @@ class Pi0(_model.BaseModel):
             ar_mask += [False] * image_tokens.shape[1]
 
         # add language (aka tokenized inputs)
-        if obs.tokenized_prompt is not None:
+        if embed_prompt and obs.tokenized_prompt is not None:
             tokenized_inputs = self.PaliGemma.llm(obs.tokenized_prompt, method="embed")
             tokens.append(tokenized_inputs)
             input_mask.append(obs.tokenized_prompt_mask)
@@ -242,7 +296,7 @@ class Pi0(_model.BaseModel):
         self, rng: at.KeyArrayLike, observation: _model.Observation, actions: _model.Actions, *, train: bool = False
     ) -> at.Float[at.Array, "*b ah"]:
         preprocess_rng, noise_rng, time_rng = jax.random.split(rng, 3)
-        observation = _model.preprocess_observation(preprocess_rng, observation, train=train)
+        observation = self._preprocess(preprocess_rng, observation, train=train)
 
         batch_shape = actions.shape[:-2]
         noise = jax.random.normal(noise_rng, actions.shape)
@@ -265,6 +319,19 @@ class Pi0(_model.BaseModel):
 
         return jnp.mean(jnp.square(v_t - u_t), axis=-1)
 
+    def fill_static_cache(self, observation: _model.Observation) -> StaticCache:
+        """Run the static part of the prefix (see `Pi0Config.static_image_keys`) through the language model.
+
+        The result can be passed to `sample_actions` for any later observation with the same static images and prompt,
+        which then only runs the remaining images.
+        """
+        observation = self._preprocess(None, observation, train=False)
+        tokens, input_mask, ar_mask = self.embed_static_prefix(observation)
+        attn_mask = make_attn_mask(input_mask, ar_mask)
+        positions = jnp.cumsum(input_mask, axis=1) - 1
+        _, kv_cache = self.PaliGemma.llm([tokens, None], mask=attn_mask, positions=positions)
+        return kv_cache, input_mask
+
     @override
     def sample_actions(
         self,
@@ -272,8 +339,9 @@ class Pi0(_model.BaseModel):
         observation: _model.Observation,
         *,
         num_steps: int | at.Int[at.Array, ""] = 10,
+        static_cache: StaticCache | None = None,
     ) -> _model.Actions:
-        observation = _model.preprocess_observation(None, observation, train=False)
+        observation = self._preprocess(None, observation, train=False)
         # note that we use the convention more common in diffusion literature, where t=1 is noise and t=0 is the target
         # distribution. yes, this is the opposite of the pi0 paper, and I'm sorry.
         dt = -1.0 / num_steps
@@ -281,10 +349,24 @@ class Pi0(_model.BaseModel):
         noise = jax.random.normal(rng, (batch_size, self.action_horizon, self.action_dim))
 
         # first fill KV cache with a forward pass of the prefix
-        prefix_tokens, prefix_mask, prefix_ar_mask = self.embed_prefix(observation)
-        prefix_attn_mask = make_attn_mask(prefix_mask, prefix_ar_mask)
-        positions = jnp.cumsum(prefix_mask, axis=1) - 1
-        _, kv_cache = self.PaliGemma.llm([prefix_tokens, None], mask=prefix_attn_mask, positions=positions)
+        if static_cache is None:
+            prefix_tokens, prefix_mask, prefix_ar_mask = self.embed_prefix(observation)
+            prefix_attn_mask = make_attn_mask(prefix_mask, prefix_ar_mask)
+            positions = jnp.cumsum(prefix_mask, axis=1) - 1
+            _, kv_cache = self.PaliGemma.llm([prefix_tokens, None], mask=prefix_attn_mask, positions=positions)
+        else:
+            # only the live images are run, on top of the cached static prefix. This gives the same KV cache as the
+            # forward pass above, since the static prefix does not attend to the live images.
+            static_kv_cache, static_mask = static_cache
+            live_tokens, live_mask, live_ar_mask = self.embed_live_prefix(observation)
+            static_attn_mask = einops.repeat(static_mask, "b p -> b s p", s=live_tokens.shape[1])
+            static_attn_mask = jnp.logical_and(static_attn_mask, live_mask[:, :, None])
+            live_attn_mask = jnp.concatenate([static_attn_mask, make_attn_mask(live_mask, live_ar_mask)], axis=-1)
+            positions = jnp.sum(static_mask, axis=-1)[:, None] + jnp.cumsum(live_mask, axis=1) - 1
+            _, kv_cache = self.PaliGemma.llm(
+                [live_tokens, None], mask=live_attn_mask, positions=positions, kv_cache=static_kv_cache
+            )
+            prefix_mask = jnp.concatenate([static_mask, live_mask], axis=1)
 
         def step(carry):
             x_t, time = carry
@@ -303,7 +385,7 @@ class Pi0(_model.BaseModel):
             assert full_attn_mask.shape == (
                 batch_size,
                 suffix_tokens.shape[1],
-                prefix_tokens.shape[1] + suffix_tokens.shape[1],
+                prefix_mask.shape[1] + suffix_tokens.shape[1],
             )
             # `positions` is shape (b, suffix_len) indicating the positions of the suffix tokens
             positions = jnp.sum(prefix_mask, axis=-1)[:, None] + jnp.cumsum(suffix_mask, axis=-1) - 1
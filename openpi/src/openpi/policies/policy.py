@@ -1,4 +1,6 @@
+import collections
 from collections.abc import Sequence
+import hashlib
 import logging
 import pathlib
 import time
@@ -30,6 +32,9 @@ class Policy(BasePolicy):
         output_transforms: Sequence[_transforms.DataTransformFn] = (),
         sample_kwargs: dict[str, Any] | None = None,
         metadata: dict[str, Any] | None = None,
+        batch_buckets: Sequence[int] = (),
+        model_config: _model.BaseModelConfig | None = None,
+        prefix_cache_size: int = 0,
     ):
         self._sample_actions = nnx_utils.module_jit(model.sample_actions)
         self._input_transform = _transforms.compose(transforms)
@@ -37,31 +42,198 @@ class Policy(BasePolicy):
         self._rng = rng or jax.random.key(0)
         self._sample_kwargs = sample_kwargs or {}
         self._metadata = metadata or {}
+        # KV caches of the static prefix (see `Pi0Config.static_image_keys`) of the most recent observations, keyed by
+        # their static images and prompt, so that consecutive calls with the same ones only run the live images.
+        self._static_image_keys = tuple(getattr(model, "static_image_keys", ()))
+        if prefix_cache_size and not self._static_image_keys:
+            logging.warning("The model has no static images, prefix caching is disabled.")
+        self._prefix_cache_size = prefix_cache_size if self._static_image_keys else 0
+        self._prefix_cache: collections.OrderedDict[str, Any] = collections.OrderedDict()
+        if self._prefix_cache_size:
+            self._fill_static_cache = nnx_utils.module_jit(model.fill_static_cache)  # type: ignore[attr-defined]
+        # Batch sizes that `infer_batch` pads to. If the model config is known, every bucket (or the batch size of 1
+        # used by `infer` if there are none) is compiled up front so that no request pays for a compilation.
+        self._batch_buckets = tuple(sorted(set(batch_buckets)))
+        self._startup_timing: dict[str, float] = {}
+        if model_config is not None:
+            start_time = time.monotonic()
+            for batch_size in self._batch_buckets or (1,):
+                self._precompile(model_config, batch_size)
+            if self._prefix_cache_size:
+                observation_spec, _ = model_config.inputs_spec(batch_size=1)
+                with at.disable_typechecking():
+                    lowered = self._fill_static_cache.lower(observation_spec)  # type: ignore[attr-defined]
+                lowered.compile()
+            self._startup_timing["compile_ms"] = (time.monotonic() - start_time) * 1000
 
     @override
     def infer(self, obs: dict) -> dict:  # type: ignore[misc]
         # Make a copy since transformations may modify the inputs in place.
         inputs = jax.tree.map(lambda x: x, obs)
-        inputs = self._input_transform(inputs)
+        example = self._input_transform(inputs)
         # Make a batch and convert to jax.Array.
-        inputs = jax.tree.map(lambda x: jnp.asarray(x)[np.newaxis, ...], inputs)
+        inputs = jax.tree.map(lambda x: jnp.asarray(x)[np.newaxis, ...], example)
 
         start_time = time.monotonic()
+        sample_kwargs, num_cached = self._prefix_kwargs([example])
         self._rng, sample_rng = jax.random.split(self._rng)
         outputs = {
             "state": inputs["state"],
-            "actions": self._sample_actions(sample_rng, _model.Observation.from_dict(inputs), **self._sample_kwargs),
+            "actions": self._sample_actions(sample_rng, _model.Observation.from_dict(inputs), **sample_kwargs),
         }
         # Unbatch and convert to np.ndarray.        # Unbatch and convert to np.ndarray.
         outputs = jax.tree.map(lambda x: np.asarray(x[0, ...]), outputs)
         model_time = time.monotonic() - start_time
+        self._record_first_request(model_time)
 
         outputs = self._output_transform(outputs)
         outputs["policy_timing"] = {
             "infer_ms": model_time * 1000,
         }
+        if self._prefix_cache_size:
+            outputs["policy_timing"]["prefix_cache_hits"] = num_cached
         return outputs
 
+    def infer_batch(self, obs_list: Sequence[dict], *, batch_size: int | None = None) -> list[dict]:
+        """Run inference on several observations with a single `sample_actions` call.
+
+        The batch is padded up to `batch_size` by repeating the last observation, so callers can restrict the jitted
+        model to a fixed set of batch shapes. Results for the padding are dropped. If `batch_size` is not given, the
+        smallest configured bucket that fits is used, and observations beyond the largest bucket are split across
+        several calls.
+        """
+        if not obs_list:
+            return []
+        num_obs = len(obs_list)
+        if batch_size is None:
+            if self._batch_buckets and num_obs > self._batch_buckets[-1]:
+                max_size = self._batch_buckets[-1]
+                return [
+                    result
+                    for start in range(0, num_obs, max_size)
+                    for result in self.infer_batch(obs_list[start : start + max_size])
+                ]
+            batch_size = self.bucket_size(num_obs)
+        if batch_size < num_obs:
+            raise ValueError(f"batch_size ({batch_size}) is smaller than the number of observations ({num_obs}).")
+
+        # Make a copy since transformations may modify the inputs in place.
+        inputs = []
+        input_times = []
+        for obs in obs_list:
+            start_time = time.monotonic()
+            inputs.append(self._input_transform(jax.tree.map(lambda x: x, obs)))
+            input_times.append(time.monotonic() - start_time)
+        examples = inputs + [inputs[-1]] * (batch_size - num_obs)
+        # Stack into a batch and convert to jax.Array.
+        inputs = jax.tree.map(lambda *xs: jnp.asarray(np.stack([np.asarray(x) for x in xs])), *examples)
+
+        start_time = time.monotonic()
+        sample_kwargs, num_cached = self._prefix_kwargs(examples)
+        self._rng, sample_rng = jax.random.split(self._rng)
+        outputs = {
+            "state": inputs["state"],
+            "actions": self._sample_actions(sample_rng, _model.Observation.from_dict(inputs), **sample_kwargs),
+        }
+        outputs = jax.tree.map(np.asarray, outputs)
+        model_time = time.monotonic() - start_time
+        self._record_first_request(model_time)
+
+        results = []
+        for i in range(num_obs):
+            start_time = time.monotonic()
+            result = self._output_transform(jax.tree.map(lambda x, i=i: x[i, ...], outputs))
+            result["policy_timing"] = {
+                "infer_ms": model_time * 1000,
+                "input_ms": input_times[i] * 1000,
+                "output_ms": (time.monotonic() - start_time) * 1000,
+                "batch_size": batch_size,
+                "num_obs": num_obs,
+            }
+            if self._prefix_cache_size:
+                result["policy_timing"]["prefix_cache_hits"] = num_cached
+            results.append(result)
+        return results
+
+    def bucket_size(self, num_obs: int) -> int:
+        """The smallest configured batch bucket that fits `num_obs` observations."""
+        for size in self._batch_buckets:
+            if size >= num_obs:
+                return size
+        return num_obs
+
+    @property
+    def startup_timing(self) -> dict[str, float]:
+        """Startup timing of the policy, in milliseconds.
+
+        `compile_ms` is the time spent compiling when the policy was created, `startup_ms` the total time to create it
+        (set by `policy_config.create_trained_policy`), and `first_infer_ms` the model time of the first request.
+        """
+        return self._startup_timing
+
+    def _precompile(self, model_config: _model.BaseModelConfig, batch_size: int) -> None:
+        """Compile `sample_actions` ahead of time for one batch size, against the shapes of `model_config.inputs_spec`.
+
+        Nothing runs on the device. Later calls with matching inputs reuse the executable, and it is also written to
+        JAX's persistent compilation cache if one is enabled (see `policy_config.create_trained_policy`).
+        """
+        start_time = time.monotonic()
+        observation_spec, _ = model_config.inputs_spec(batch_size=batch_size)
+        sample_kwargs = self._sample_kwargs
+        lower = self._sample_actions.lower  # type: ignore[attr-defined]
+        # Lowering rebuilds the observation with placeholder leaves that are not arrays.
+        with at.disable_typechecking():
+            if self._prefix_cache_size:
+                static_cache = jax.eval_shape(self._fill_static_cache, observation_spec)
+                sample_kwargs = {**sample_kwargs, "static_cache": static_cache}
+            lowered = lower(self._rng, observation_spec, **sample_kwargs)
+        lowered.compile()
+        logging.info(f"Compiled sample_actions for batch size {batch_size} in {time.monotonic() - start_time:.1f}s")
+
+    def _prefix_kwargs(self, examples: Sequence[dict]) -> tuple[dict[str, Any], int]:
+        """The kwargs for `sample_actions`, including the static prefix of each (transformed, unbatched) example if
+        prefix caching is enabled. Also returns how many of the examples were found in the cache."""
+        if not self._prefix_cache_size:
+            return self._sample_kwargs, 0
+
+        entries = []
+        num_cached = 0
+        for example in examples:
+            key = self._prefix_key(example)
+            if key in self._prefix_cache:
+                self._prefix_cache.move_to_end(key)
+                num_cached += 1
+            else:
+                batch = jax.tree.map(lambda x: jnp.asarray(x)[np.newaxis, ...], example)
+                self._prefix_cache[key] = self._fill_static_cache(_model.Observation.from_dict(batch))
+                if len(self._prefix_cache) > self._prefix_cache_size:
+                    self._prefix_cache.popitem(last=False)
+            entries.append(self._prefix_cache[key])
+
+        (k, v), mask = entries[0]
+        if len(entries) > 1:
+            # The KV cache is (layers, batch, ...) and the mask is (batch, ...).
+            k = jnp.concatenate([entry[0][0] for entry in entries], axis=1)
+            v = jnp.concatenate([entry[0][1] for entry in entries], axis=1)
+            mask = jnp.concatenate([entry[1] for entry in entries], axis=0)
+        return {**self._sample_kwargs, "static_cache": ((k, v), mask)}, num_cached
+
+    def _prefix_key(self, example: dict) -> str:
+        """Identifies the static prefix of a (transformed, unbatched) example: its static images and its prompt."""
+        digest = hashlib.blake2b(digest_size=16)
+        for name in self._static_image_keys:
+            digest.update(np.asarray(example["image"][name]).tobytes())
+            digest.update(np.asarray(example["image_mask"].get(name, True)).tobytes())
+        for name in ("tokenized_prompt", "tokenized_prompt_mask"):
+            if name in example:
+                digest.update(np.asarray(example[name]).tobytes())
+        return digest.hexdigest()
+
+    def _record_first_request(self, model_time: float) -> None:
+        if "first_infer_ms" not in self._startup_timing:
+            self._startup_timing["first_infer_ms"] = model_time * 1000
+            logging.info(f"First request took {model_time * 1000:.0f}ms in sample_actions")
+
     @property
     def metadata(self) -> dict[str, Any]:
         return self._metadata
@@ -81,7 +253,24 @@ class PolicyRecorder(_base_policy.BasePolicy):
     @override
     def infer(self, obs: dict) -> dict:  # type: ignore[misc]
         results = self._policy.infer(obs)
+        self._record(obs, results)
+        return results
+
+    def infer_batch(self, obs_list: Sequence[dict], *, batch_size: int | None = None) -> list[dict]:
+        """Forwards to the wrapped policy's `infer_batch`, recording one step per observation.
 
+        Falls back to one `infer` call per observation if the wrapped policy does not batch.
+        """
+        infer_batch = getattr(self._policy, "infer_batch", None)
+        if infer_batch is not None:
+            results = infer_batch(obs_list, batch_size=batch_size)
+        else:
+            results = [self._policy.infer(obs) for obs in obs_list]
+        for obs, result in zip(obs_list, results, strict=True):
+            self._record(obs, result)
+        return results
+
+    def _record(self, obs: dict, results: dict) -> None:
         data = {"inputs": obs, "outputs": results}
         data = flax.traverse_util.flatten_dict(data, sep="/")
 
@@ -89,4 +278,3 @@ class PolicyRecorder(_base_policy.BasePolicy):
         self._record_step += 1
 
         np.save(output_path, np.asarray(data))
-        return results
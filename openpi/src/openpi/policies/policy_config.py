@@ -1,9 +1,13 @@
 from collections.abc import Sequence
 import dataclasses
+import hashlib
 import logging
 import pathlib
+import time
 from typing import Any
 
+import jax
+from jax.experimental.compilation_cache import compilation_cache
 import jax.numpy as jnp
 
 import openpi.models.model as _model
@@ -27,6 +31,23 @@ class PolicyConfig:
     sample_kwargs: dict[str, Any] | None = None
 
 
+def compilation_cache_path(
+    cache_dir: pathlib.Path | str, config_name: str, checkpoint_dir: pathlib.Path | str
+) -> pathlib.Path:
+    """The persistent compilation cache of one policy, keyed by training config, checkpoint and jax version."""
+    key = hashlib.sha256(f"{config_name}:{checkpoint_dir}:{jax.__version__}".encode()).hexdigest()[:16]
+    return pathlib.Path(cache_dir).expanduser() / f"{config_name}_{key}"
+
+
+def enable_compilation_cache(cache_path: pathlib.Path) -> None:
+    """Write compiled executables to `cache_path`, and reuse the ones a previous process wrote there."""
+    cache_path.mkdir(parents=True, exist_ok=True)
+    jax.config.update("jax_compilation_cache_dir", str(cache_path))
+    # The cache directory is only read on the first compilation, so a cache that is already in use must be reset.
+    compilation_cache.reset_cache()
+    logging.info(f"Using compilation cache: {cache_path}")
+
+
 def create_trained_policy(
     train_config: _config.TrainConfig,
     checkpoint_dir: pathlib.Path | str,
@@ -35,6 +56,10 @@ def create_trained_policy(
     sample_kwargs: dict[str, Any] | None = None,
     default_prompt: str | None = None,
     norm_stats: dict[str, transforms.NormStats] | None = None,
+    batch_buckets: Sequence[int] = (),
+    precompile: bool = False,
+    compilation_cache_dir: pathlib.Path | str | None = None,
+    prefix_cache_size: int = 0,
 ) -> _policy.Policy:
     """Create a policy from a trained checkpoint.
 
@@ -48,12 +73,24 @@ def create_trained_policy(
             data if it doesn't already exist.
         norm_stats: The norm stats to use for the policy. If not provided, the norm stats will be loaded
             from the checkpoint directory.
+        batch_buckets: Batch sizes that `Policy.infer_batch` pads to. Each of them is compiled when the policy is
+            created.
+        precompile: Compile `sample_actions` when the policy is created even if there are no batch buckets, so that
+            the first request does not wait for the compilation.
+        compilation_cache_dir: If provided, compiled executables are persisted in a subdirectory keyed by config,
+            checkpoint and jax version, so that later processes load them instead of compiling again.
+        prefix_cache_size: Number of static prefixes (static images and prompt, see `Pi0Config.static_image_keys`)
+            whose KV cache is kept across calls. Only used by models with static images.
     """
+    start_time = time.monotonic()
     repack_transforms = repack_transforms or transforms.Group()
     checkpoint_dir = download.maybe_download(str(checkpoint_dir))
+    if compilation_cache_dir is not None:
+        enable_compilation_cache(compilation_cache_path(compilation_cache_dir, train_config.name, checkpoint_dir))
 
     logging.info("Loading model...")
     model = train_config.model.load(_model.restore_params(checkpoint_dir / "params", dtype=jnp.bfloat16))
+    logging.info(f"Loaded model in {time.monotonic() - start_time:.1f}s")
 
     data_config = train_config.data.create(train_config.assets_dirs, train_config.model)
     if norm_stats is None:
@@ -63,7 +100,7 @@ def create_trained_policy(
             raise ValueError("Asset id is required to load norm stats.")
         norm_stats = _checkpoints.load_norm_stats(checkpoint_dir / "assets", data_config.asset_id)
 
-    return _policy.Policy(
+    policy = _policy.Policy(
         model,
         transforms=[
             *repack_transforms.inputs,
@@ -80,4 +117,10 @@ def create_trained_policy(
         ],
         sample_kwargs=sample_kwargs,
         metadata=train_config.policy_metadata,
+        batch_buckets=batch_buckets,
+        model_config=train_config.model if precompile or batch_buckets else None,
+        prefix_cache_size=prefix_cache_size,
     )
+    policy.startup_timing["startup_ms"] = (time.monotonic() - start_time) * 1000
+    logging.info(f"Created policy in {time.monotonic() - start_time:.1f}s")
+    return policy
@@ -1,10 +1,58 @@
+import jax
+import jax.numpy as jnp
+import numpy as np
 from openpi_client import action_chunk_broker
 import pytest
 
+from openpi.models import model as _model
+from openpi.models import pi0
 from openpi.policies import aloha_policy
+from openpi.policies import policy as _policy
 from openpi.policies import policy_config as _policy_config
 from openpi.training import config as _config
 
+# Batch sizes that `_StateModel.sample_actions` was traced (i.e. compiled) for.
+_traced_batch_sizes = []
+
+
+class _StateModel(_model.BaseModel):
+    """Predicts the state repeated over the action horizon, so every batch element can be told apart."""
+
+    def __init__(self, config: pi0.Pi0Config):
+        super().__init__(config.action_dim, config.action_horizon, config.max_token_len)
+
+    def compute_loss(self, rng, observation, actions, *, train=False):
+        return jnp.zeros(actions.shape[:-1])
+
+    def sample_actions(self, rng, observation):
+        batch_size = observation.state.shape[0]
+        _traced_batch_sizes.append(batch_size)
+        return jnp.broadcast_to(observation.state[:, None, :], (batch_size, self.action_horizon, self.action_dim))
+
+
+class _PrefixModel(_StateModel):
+    """Adds the value of the static reference image to the state. The static cache holds that value."""
+
+    static_image_keys = ("left_wrist_0_rgb",)
+
+    def fill_static_cache(self, observation):
+        ref = observation.images["left_wrist_0_rgb"][:, 0, 0, 0]
+        kv = ref[None, :, None, None, None]
+        return (kv, kv), jnp.ones((ref.shape[0], 1), dtype=bool)
+
+    def sample_actions(self, rng, observation, *, static_cache=None):
+        if static_cache is None:
+            ref = observation.images["left_wrist_0_rgb"][:, 0, 0, 0]
+        else:
+            ref = static_cache[0][0][0, :, 0, 0, 0]
+        return super().sample_actions(rng, observation) + ref[:, None, None]
+
+
+def _make_example(config: pi0.Pi0Config, value: float) -> dict:
+    example = jax.tree.map(lambda x: np.asarray(x[0]), config.fake_obs().to_dict())
+    example["state"] = np.full(config.action_dim, value, dtype=np.float32)
+    return example
+
 
 @pytest.mark.manual
 def test_infer():
@@ -32,3 +80,92 @@ def test_broker():
     for _ in range(config.model.action_horizon):
         outputs = broker.infer(example)
         assert outputs["actions"].shape == (14,)
+
+
+def test_infer_batch_buckets():
+    config = pi0.Pi0Config(action_dim=4, action_horizon=3, max_token_len=8)
+    _traced_batch_sizes.clear()
+    policy = _policy.Policy(_StateModel(config), batch_buckets=(4, 1, 2), model_config=config)
+    # Every bucket is compiled when the policy is created.
+    assert _traced_batch_sizes == [1, 2, 4]
+
+    examples = [_make_example(config, i) for i in range(7)]
+    for num_obs, batch_size in [(1, 1), (2, 2), (3, 4), (4, 4), (7, 4)]:
+        results = policy.infer_batch(examples[:num_obs])
+        assert len(results) == num_obs
+        for i, result in enumerate(results):
+            np.testing.assert_array_equal(result["actions"], np.full((config.action_horizon, config.action_dim), i))
+            assert result["policy_timing"]["batch_size"] == batch_size
+
+    # Padded batches give the same result as unbatched inference, and no request triggers a new compilation.
+    np.testing.assert_array_equal(policy.infer_batch(examples[:3])[2]["actions"], policy.infer(examples[2])["actions"])
+    assert _traced_batch_sizes == [1, 2, 4]
+
+    with pytest.raises(ValueError, match="smaller than"):
+        policy.infer_batch(examples[:3], batch_size=2)
+
+
+def test_recorder_infer_batch(tmp_path):
+    config = pi0.Pi0Config(action_dim=4, action_horizon=3, max_token_len=8)
+    policy = _policy.Policy(_StateModel(config), batch_buckets=(1, 2, 4), model_config=config)
+    recorder = _policy.PolicyRecorder(policy, str(tmp_path))
+
+    # Batches go through the wrapped policy's `infer_batch`, and every observation is recorded as its own step.
+    results = recorder.infer_batch([_make_example(config, i) for i in range(3)])
+    for i, result in enumerate(results):
+        np.testing.assert_array_equal(result["actions"], np.full((config.action_horizon, config.action_dim), i))
+        assert result["policy_timing"]["batch_size"] == 4
+    recorder.infer(_make_example(config, 3))
+    assert sorted(path.name for path in tmp_path.iterdir()) == [f"step_{i}.npy" for i in range(4)]
+    record = np.load(tmp_path / "step_2.npy", allow_pickle=True).item()
+    np.testing.assert_array_equal(record["outputs/actions"], results[2]["actions"])
+
+
+def test_precompile_without_buckets():
+    config = pi0.Pi0Config(action_dim=4, action_horizon=3, max_token_len=8)
+    _traced_batch_sizes.clear()
+    policy = _policy.Policy(_StateModel(config), model_config=config)
+    # `infer` is compiled for a single observation when the policy is created.
+    assert _traced_batch_sizes == [1]
+    assert set(policy.startup_timing) == {"compile_ms"}
+
+    result = policy.infer(_make_example(config, 2))
+    np.testing.assert_array_equal(result["actions"], np.full((config.action_horizon, config.action_dim), 2))
+    assert _traced_batch_sizes == [1]
+    assert policy.startup_timing["first_infer_ms"] == result["policy_timing"]["infer_ms"]
+
+
+def test_compilation_cache_path(tmp_path):
+    path = _policy_config.compilation_cache_path(tmp_path, "pi0_aloha_sim", "checkpoints/1000")
+    assert path.parent == tmp_path
+    assert path == _policy_config.compilation_cache_path(tmp_path, "pi0_aloha_sim", "checkpoints/1000")
+    assert path != _policy_config.compilation_cache_path(tmp_path, "pi0_aloha_sim", "checkpoints/2000")
+    assert path != _policy_config.compilation_cache_path(tmp_path, "pi0_libero", "checkpoints/1000")
+
+
+def test_prefix_cache():
+    config = pi0.Pi0Config(action_dim=4, action_horizon=3, max_token_len=8)
+    policy = _policy.Policy(_PrefixModel(config), prefix_cache_size=2, model_config=config)
+    uncached_policy = _policy.Policy(_PrefixModel(config))
+
+    def example(value, ref):
+        result = _make_example(config, value)
+        result["image"]["left_wrist_0_rgb"] = np.full_like(result["image"]["left_wrist_0_rgb"], ref)
+        return result
+
+    # Observations with the same reference image and prompt share one cache entry.
+    examples = [example(0, 10), example(1, 20), example(2, 10)]
+    results = policy.infer_batch(examples, batch_size=4)
+    for result, uncached in zip(results, uncached_policy.infer_batch(examples), strict=True):
+        np.testing.assert_array_equal(result["actions"], uncached["actions"])
+    # The second observation with ref 10 and the padding are cache hits.
+    assert results[0]["policy_timing"]["prefix_cache_hits"] == 2
+
+    result = policy.infer(example(3, 20))
+    np.testing.assert_array_equal(result["actions"], np.full((config.action_horizon, config.action_dim), 23))
+    assert result["policy_timing"]["prefix_cache_hits"] == 1
+
+    # The least recently used entry (ref 10) is evicted.
+    assert policy.infer(example(4, 30))["policy_timing"]["prefix_cache_hits"] == 0
+    assert policy.infer(example(5, 10))["policy_timing"]["prefix_cache_hits"] == 0
+    assert policy.infer(example(6, 30))["policy_timing"]["prefix_cache_hits"] == 1
@@ -1,5 +1,8 @@
 import asyncio
+import concurrent.futures
+import dataclasses
 import http
+import json
 import logging
 import time
 import traceback
@@ -12,10 +15,146 @@ import websockets.frames
 logger = logging.getLogger(__name__)
 
 
+@dataclasses.dataclass
+class BatchStats:
+    """Running statistics of the request batcher."""
+
+    num_requests: int = 0
+    num_batches: int = 0
+    max_batch_size: int = 0
+    max_queue_depth: int = 0
+    total_queue_ms: float = 0.0
+    total_infer_ms: float = 0.0
+
+    def record(self, queue_ms: list[float], queue_depth: int, infer_ms: float) -> None:
+        """Record one batch, given the queueing time of each of its requests."""
+        self.num_requests += len(queue_ms)
+        self.num_batches += 1
+        self.max_batch_size = max(self.max_batch_size, len(queue_ms))
+        self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+        self.total_queue_ms += sum(queue_ms)
+        self.total_infer_ms += infer_ms
+
+    def summary(self) -> dict:
+        return {
+            "num_requests": self.num_requests,
+            "num_batches": self.num_batches,
+            "mean_batch_size": self.num_requests / max(self.num_batches, 1),
+            "max_batch_size": self.max_batch_size,
+            "max_queue_depth": self.max_queue_depth,
+            "mean_queue_ms": self.total_queue_ms / max(self.num_requests, 1),
+            "mean_infer_ms": self.total_infer_ms / max(self.num_batches, 1),
+        }
+
+
+@dataclasses.dataclass
+class _Request:
+    obs: dict
+    future: asyncio.Future
+    enqueue_time: float
+
+
+class RequestBatcher:
+    """Coalesces requests from all connections into batches and runs inference on a dedicated thread.
+
+    A batch is dispatched as soon as `max_batch_size` requests are waiting, or `max_wait_ms` after its first request
+    arrived. Requests that arrive while a batch is running are queued for the next one, so batches grow with load
+    even when `max_wait_ms` is 0. Policies with an `infer_batch` method get one call per batch; other policies are
+    called once per request, still off the event loop.
+    """
+
+    def __init__(self, policy: _base_policy.BasePolicy, *, max_batch_size: int = 1, max_wait_ms: float = 0.0) -> None:
+        self._policy = policy
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_ms / 1000
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="policy_infer")
+        self._queue: asyncio.Queue[_Request] | None = None
+        self._task: asyncio.Task | None = None
+        self.stats = BatchStats()
+
+    def start(self) -> None:
+        """Start the batching loop. Must be called from within the server's event loop."""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._executor.shutdown(wait=True)
+
+    async def infer(self, obs: dict) -> tuple[dict, dict]:
+        """Queue one observation. Returns the policy output and this request's timing and batching stats."""
+        if self._queue is None:
+            raise RuntimeError("RequestBatcher.start() has not been called.")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_Request(obs, future, time.monotonic()))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = batch[0].enqueue_time + self._max_wait
+            while len(batch) < self._max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Requests that are still waiting after this batch was formed.
+            queue_depth = self._queue.qsize()
+
+            dispatch_time = time.monotonic()
+            results = await loop.run_in_executor(self._executor, self._infer_batch, [request.obs for request in batch])
+            infer_ms = (time.monotonic() - dispatch_time) * 1000
+
+            queue_ms = [(dispatch_time - request.enqueue_time) * 1000 for request in batch]
+            self.stats.record(queue_ms, queue_depth, infer_ms)
+
+            for request, result, request_queue_ms in zip(batch, results, queue_ms, strict=True):
+                if request.future.done():
+                    # The connection went away while the request was queued.
+                    continue
+                if isinstance(result, BaseException):
+                    request.future.set_exception(result)
+                else:
+                    timing = {
+                        "infer_ms": infer_ms,
+                        "queue_ms": request_queue_ms,
+                        "batch_size": len(batch),
+                        "queue_depth": queue_depth,
+                    }
+                    request.future.set_result((result, timing))
+
+    def _infer_batch(self, obs_list: list[dict]) -> list[dict | BaseException]:
+        """Runs on the executor thread. Failures are returned per request so one bad observation fails only itself."""
+        infer_batch = getattr(self._policy, "infer_batch", None)
+        if infer_batch is not None and len(obs_list) > 1:
+            try:
+                return infer_batch(obs_list)
+            except Exception:
+                logger.exception("Batched inference failed, falling back to per-request inference.")
+
+        results = []
+        for obs in obs_list:
+            try:
+                results.append(self._policy.infer(obs))
+            except Exception as e:
+                results.append(e)
+        return results
+
+
 class WebsocketPolicyServer:
     """Serves a policy using the websocket protocol. See websocket_client_policy.py for a client implementation.
 
-    Currently only implements the `load` and `infer` methods.
+    Currently only implements the `load` and `infer` methods. Inference runs on a dedicated thread, and requests from
+    all connections are batched together (see `RequestBatcher`). Batching statistics are served at `/stats`.
     """
 
     def __init__(
@@ -24,26 +163,38 @@ class WebsocketPolicyServer:
         host: str = "0.0.0.0",
         port: int | None = None,
         metadata: dict | None = None,
+        *,
+        max_batch_size: int = 1,
+        max_wait_ms: float = 0.0,
     ) -> None:
         self._policy = policy
         self._host = host
         self._port = port
         self._metadata = metadata or {}
+        self._batcher = RequestBatcher(policy, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
         logging.getLogger("websockets.server").setLevel(logging.INFO)
 
+    @property
+    def stats(self) -> BatchStats:
+        return self._batcher.stats
+
     def serve_forever(self) -> None:
         asyncio.run(self.run())
 
     async def run(self):
-        async with _server.serve(
-            self._handler,
-            self._host,
-            self._port,
-            compression=None,
-            max_size=None,
-            process_request=_health_check,
-        ) as server:
-            await server.serve_forever()
+        self._batcher.start()
+        try:
+            async with _server.serve(
+                self._handler,
+                self._host,
+                self._port,
+                compression=None,
+                max_size=None,
+                process_request=self._process_request,
+            ) as server:
+                await server.serve_forever()
+        finally:
+            await self._batcher.stop()
 
     async def _handler(self, websocket: _server.ServerConnection):
         logger.info(f"Connection from {websocket.remote_address} opened")
@@ -57,13 +208,9 @@ class WebsocketPolicyServer:
                 start_time = time.monotonic()
                 obs = msgpack_numpy.unpackb(await websocket.recv())
 
-                infer_time = time.monotonic()
-                action = self._policy.infer(obs)
-                infer_time = time.monotonic() - infer_time
+                action, server_timing = await self._batcher.infer(obs)
 
-                action["server_timing"] = {
-                    "infer_ms": infer_time * 1000,
-                }
+                action["server_timing"] = server_timing
                 if prev_total_time is not None:
                     # We can only record the last total time since we also want to include the send time.
                     action["server_timing"]["prev_total_ms"] = prev_total_time * 1000
@@ -82,6 +229,13 @@ class WebsocketPolicyServer:
                 )
                 raise
 
+    def _process_request(
+        self, connection: _server.ServerConnection, request: _server.Request
+    ) -> _server.Response | None:
+        if request.path == "/stats":
+            return connection.respond(http.HTTPStatus.OK, json.dumps(self.stats.summary()) + "\n")
+        return _health_check(connection, request)
+
 
 def _health_check(connection: _server.ServerConnection, request: _server.Request) -> _server.Response | None:
     if request.path == "/healthz":
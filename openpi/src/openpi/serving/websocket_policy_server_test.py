@@ -0,0 +1,137 @@
+import asyncio
+import socket
+import threading
+import time
+import urllib.request
+
+import numpy as np
+from openpi_client import websocket_client_policy
+
+from openpi.serving import websocket_policy_server as _server
+
+
+class _EchoPolicy:
+    """Returns each observation's value. Inference takes `delay` seconds per call and blocks its thread."""
+
+    def __init__(self, delay: float = 0.05, fail_value: int | None = None):
+        self.delay = delay
+        self.fail_value = fail_value
+        self.batch_sizes = []
+
+    def infer(self, obs: dict) -> dict:
+        self.batch_sizes.append(1)
+        time.sleep(self.delay)
+        if obs["value"] == self.fail_value:
+            raise ValueError("bad observation")
+        return {"actions": np.asarray(obs["value"])}
+
+    def infer_batch(self, obs_list: list[dict]) -> list[dict]:
+        self.batch_sizes.append(len(obs_list))
+        time.sleep(self.delay)
+        if any(obs["value"] == self.fail_value for obs in obs_list):
+            raise ValueError("bad observation")
+        return [{"actions": np.asarray(obs["value"])} for obs in obs_list]
+
+
+async def _infer_all(batcher: _server.RequestBatcher, values: list[int]) -> list:
+    batcher.start()
+    try:
+        return await asyncio.gather(*[batcher.infer({"value": v}) for v in values], return_exceptions=True)
+    finally:
+        await batcher.stop()
+
+
+def test_batcher_coalesces_requests():
+    policy = _EchoPolicy()
+    batcher = _server.RequestBatcher(policy, max_batch_size=4, max_wait_ms=20)
+    results = asyncio.run(_infer_all(batcher, list(range(10))))
+
+    # Each request gets its own result back.
+    assert [int(result["actions"]) for result, _ in results] == list(range(10))
+    assert policy.batch_sizes == [4, 4, 2]
+    assert [timing["batch_size"] for _, timing in results] == [4] * 8 + [2] * 2
+    assert results[0][1]["queue_depth"] == 6
+
+    stats = batcher.stats.summary()
+    assert stats["num_requests"] == 10
+    assert stats["num_batches"] == 3
+    assert stats["max_batch_size"] == 4
+
+
+def test_batcher_does_not_block_event_loop():
+    async def run():
+        batcher = _server.RequestBatcher(_EchoPolicy(delay=0.2))
+        batcher.start()
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        await batcher.infer({"value": 1})
+        ticker.cancel()
+        await batcher.stop()
+        return ticks
+
+    # The event loop keeps running while inference blocks the executor thread.
+    assert asyncio.run(run()) >= 10
+
+
+def test_batcher_isolates_failures():
+    policy = _EchoPolicy(delay=0.0, fail_value=2)
+    batcher = _server.RequestBatcher(policy, max_batch_size=4)
+    results = asyncio.run(_infer_all(batcher, [1, 2, 3]))
+
+    # The failed batch is retried per request, so only the bad observation fails.
+    assert isinstance(results[1], ValueError)
+    assert int(results[0][0]["actions"]) == 1
+    assert int(results[2][0]["actions"]) == 3
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_server(port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(f"http://localhost:{port}/healthz"):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.01)
+
+
+def test_server_batches_across_connections():
+    policy = _EchoPolicy(delay=0.1)
+    port = _free_port()
+    server = _server.WebsocketPolicyServer(policy, host="localhost", port=port, max_batch_size=4, max_wait_ms=200)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _wait_for_server(port)
+
+    clients = [websocket_client_policy.WebsocketClientPolicy("localhost", port) for _ in range(4)]
+    results = [None] * len(clients)
+
+    def infer(i):
+        results[i] = clients[i].infer({"value": i})
+
+    threads = [threading.Thread(target=infer, args=(i,)) for i in range(len(clients))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert [int(result["actions"]) for result in results] == [0, 1, 2, 3]
+    assert all(result["server_timing"]["batch_size"] == 4 for result in results)
+    assert set(results[0]["server_timing"]) >= {"infer_ms", "queue_ms", "batch_size", "queue_depth"}
+
+    with urllib.request.urlopen(f"http://localhost:{port}/stats") as response:
+        assert response.read().decode().startswith("{")
+    assert server.stats.num_batches == 1
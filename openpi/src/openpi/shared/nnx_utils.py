@@ -24,6 +24,9 @@ def module_jit(meth: Callable[P, R], *jit_args, **jit_kwargs) -> Callable[P, R]:
     `module_jit` acts exactly like the original method, except that the state of the module is frozen to whatever it was
     when `module_jit` was called. Mutations to the module within `meth` are still allowed, but they will be discarded
     after the method call completes.
+
+    Like a `jax.jit` function, the returned function has a `lower` method for ahead-of-time compilation. It takes the
+    same arguments as the method, which may be `jax.ShapeDtypeStruct`s.
     """
     if not (inspect.ismethod(meth) and isinstance(meth.__self__, nnx.Module)):
         raise ValueError("module_jit must only be used on bound methods of nnx.Modules.")
@@ -40,6 +43,10 @@ def module_jit(meth: Callable[P, R], *jit_args, **jit_kwargs) -> Callable[P, R]:
     def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
         return jitted_fn(state, *args, **kwargs)
 
+    def lower(*args: P.args, **kwargs: P.kwargs) -> jax.stages.Lowered:
+        return jitted_fn.lower(state, *args, **kwargs)
+
+    wrapper.lower = lower  # type: ignore[attr-defined]
     return wrapper
 
 
@@ -544,7 +544,8 @@ _CONFIGS = [
         # Here you define the model config -- In this example we use pi0 as the model
         # architecture and perform *full* finetuning. in the examples below we show how to modify
         # this to perform *low-memory* (LORA) finetuning and use pi0-FAST as an alternative architecture.
-        model=pi0.Pi0Config(),
+        # LiberoInputs always masks out the right wrist image, so the model skips it entirely.
+        model=pi0.Pi0Config(absent_image_keys=("right_wrist_0_rgb",)),
         # Here you define the dataset you are training on. In this example we use the Libero
         # dataset. For your own dataset, you can change the repo_id to point to your dataset.
         # Also modify the DataConfig to use the new config you made for your dataset above.
@@ -567,7 +568,11 @@ _CONFIGS = [
     TrainConfig(
         name="pi0_libero_low_mem_finetune",
         # Here is an example of loading a pi0 model for LoRA fine-tuning.
-        model=pi0.Pi0Config(paligemma_variant="gemma_2b_lora", action_expert_variant="gemma_300m_lora"),
+        model=pi0.Pi0Config(
+            paligemma_variant="gemma_2b_lora",
+            action_expert_variant="gemma_300m_lora",
+            absent_image_keys=("right_wrist_0_rgb",),
+        ),
         data=LeRobotLiberoDataConfig(
             repo_id="physical-intelligence/libero",
             base_config=DataConfig(prompt_from_task=True),
@@ -586,7 +591,7 @@ _CONFIGS = [
     ),
 TrainConfig(
         name="pi0_uav_low_mem_finetune",
-        model=pi0.Pi0Config(paligemma_variant="gemma_2b_lora", action_expert_variant="gemma_300m_lora",action_horizon=10,max_token_len=240),
+        model=pi0.Pi0Config(paligemma_variant="gemma_2b_lora", action_expert_variant="gemma_300m_lora",action_horizon=10,max_token_len=240,absent_image_keys=("right_wrist_0_rgb",)),
         data=LeRobotLiberoDataConfig(
             repo_id="/data1/liuy/pi0_15k",
             base_config=DataConfig(prompt_from_task=True),
@@ -602,7 +607,7 @@ TrainConfig(
     ),
 TrainConfig(
         name="pi0_uav_low_mem_finetune_vln",
-        model=pi0.Pi0Config(paligemma_variant="gemma_2b_lora", action_expert_variant="gemma_300m_lora",action_horizon=10),
+        model=pi0.Pi0Config(paligemma_variant="gemma_2b_lora", action_expert_variant="gemma_300m_lora",action_horizon=10,absent_image_keys=("right_wrist_0_rgb",)),
         data=LeRobotLiberoDataConfig(
             repo_id="/data1/liuy/vln_dataset/indoor_1",
             base_config=DataConfig(prompt_from_task=True),